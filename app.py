@@ -5,15 +5,27 @@ Application Flask principale.
 
 import os
 import secrets
-from typing import Any
+import weakref
+from typing import Any, cast
 
-from flask import Flask, Response, jsonify, render_template, request
+from flask import Flask, Response, abort, jsonify, render_template, request
 from flask_compress import Compress
 from werkzeug.exceptions import RequestEntityTooLarge
 
-from core.story_engine import get_story_engine
+from config.settings import Settings, install_sighup_reload, on_reload, reload_settings
+from core.json_codec import CodecJSONProvider
+from core.story_engine import get_story_engine, get_story_stats
+from core.story_save import (
+    get_leaderboard_cache_stats,
+    get_pool_stats,
+    get_state_cache_stats,
+    get_telemetry_stats,
+)
 from routes.pages import register_pages
-from routes.story import story_bp
+from routes.story import get_story_rate_limit_stats, story_bp
+
+# Clients admis sur /health/stats une fois activé.
+_LOOPBACK_ADDRS = {"127.0.0.1", "::1"}
 
 
 def _read_env_int(name: str, default: int, minimum: int = 1) -> int:
@@ -41,9 +53,27 @@ def _is_debug_enabled() -> bool:
     return not _is_production()
 
 
+def _follow_settings_reload(app: Flask) -> None:
+    app_ref = weakref.ref(app)
+
+    def _apply(settings: Settings) -> None:
+        target = app_ref()
+        if target is not None:
+            target.extensions["luna_settings"] = settings
+            target.config["MAX_CONTENT_LENGTH"] = settings.max_content_length_bytes
+
+    on_reload(_apply)
+
+
 def create_app() -> Flask:
     app = Flask(__name__)
+    # jsonify / request.get_json via le codec partagé (orjson si installé)
+    app.json = CodecJSONProvider(app)
     is_production = _is_production()
+    # Réglages typés relus une fois ici et partagés avec core/story_save.py
+    # (même objet) ; SIGHUP les relit (config/settings.py).
+    settings = reload_settings()
+    app.extensions["luna_settings"] = settings
 
     # Configuration
     secret_key = os.environ.get("SECRET_KEY")
@@ -55,11 +85,9 @@ def create_app() -> Flask:
     app.config["SESSION_COOKIE_HTTPONLY"] = True
     app.config["SESSION_COOKIE_SAMESITE"] = "Lax"
     app.config["SESSION_COOKIE_SECURE"] = is_production
-    app.config["MAX_CONTENT_LENGTH"] = _read_env_int(
-        "APP_MAX_CONTENT_LENGTH_BYTES",
-        1 * 1024 * 1024,
-        minimum=1024,
-    )  # 1 MB max by default
+    app.config["MAX_CONTENT_LENGTH"] = settings.max_content_length_bytes
+    _follow_settings_reload(app)
+    install_sighup_reload()
 
     @app.after_request
     def apply_security_headers(response: Response) -> Response:
@@ -112,6 +140,29 @@ def create_app() -> Flask:
         """Healthcheck simple pour les plateformes de deploiement."""
         return jsonify({"status": "ok"}), 200
 
+    @app.get("/health/stats")
+    def health_stats():
+        """
+        Compteurs internes (pool, caches, limite de débit, télémétrie) :
+        404 sauf avec ``APP_STATS_ENDPOINT=1`` et depuis la boucle locale.
+        """
+        settings = cast(Settings, app.extensions["luna_settings"])
+        if not settings.stats_endpoint or request.remote_addr not in _LOOPBACK_ADDRS:
+            abort(404)
+        return (
+            jsonify(
+                {
+                    "db_pool": get_pool_stats(),
+                    "leaderboard_cache": get_leaderboard_cache_stats(),
+                    "state_cache": get_state_cache_stats(),
+                    "rate_limit": get_story_rate_limit_stats(),
+                    "story": get_story_stats(),
+                    "telemetry": get_telemetry_stats(),
+                }
+            ),
+            200,
+        )
+
     # Pages d'erreur thématiques
     @app.errorhandler(404)
     def not_found(e: Any):
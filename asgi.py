@@ -0,0 +1,21 @@
+"""
+LUNA — Hors Connexion
+Point d'entrée ASGI : l'application Flask derrière ``core/asgi_bridge.py``
+(admission, lecture du corps) et ``a2wsgi`` (pip install -e .[asgi]).
+
+    uvicorn asgi:app --host 0.0.0.0 --port 5001
+    gunicorn -c gunicorn.asgi.conf.py asgi:app
+"""
+
+from app import app as flask_app
+from config.settings import get_settings
+from core.asgi_bridge import AsgiBridge
+
+_settings = get_settings()
+
+app = AsgiBridge(
+    flask_app.wsgi_app,
+    max_threads=_settings.asgi_threads,
+    max_pending=_settings.asgi_max_pending,
+    max_body_bytes=_settings.max_content_length_bytes,
+)
@@ -0,0 +1,251 @@
+"""
+Réglages de l'application — LUNA Hors Connexion.
+
+Lus une seule fois depuis l'environnement puis servis comme attributs d'un
+objet figé : les chemins chauds (limite de débit, caches) ne reparsent plus
+``os.environ`` à chaque requête et une valeur invalide n'est signalée qu'une
+fois, au chargement.
+
+``create_app()`` relit les réglages du processus (``reload_settings``) : une
+seule source, partagée par l'application et ``core/story_save.py``. Il
+installe aussi ``SIGHUP`` : le signal relit l'environnement, complété par le
+fichier ``APP_SETTINGS_FILE`` (lignes ``CLE=valeur``, prioritaire sur
+l'environnement du processus — seul moyen de changer une valeur sans
+redémarrer), puis pousse les nouveaux réglages aux applications et modules
+abonnés via ``on_reload``. Le gestionnaire du signal ne fait que réveiller un
+thread dédié : les abonnés prennent des verrous (cache d'états) et peuvent
+vider la télémétrie, ce qui ne doit pas s'exécuter dans le thread
+interrompu.
+"""
+
+import logging
+import os
+import signal
+import threading
+from collections.abc import Callable, Mapping
+from dataclasses import dataclass
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_DB_PATH = os.path.join(os.path.dirname(__file__), "..", "data", "luna_saves.db")
+
+_FALSY = {"0", "false", "no", "off"}
+
+
+@dataclass(frozen=True)
+class Settings:
+    """Réglages typés ; les défauts sont ceux d'un environnement vide."""
+
+    # Limite de débit des POST /api/story/*
+    rate_limit_window_seconds: int = 60
+    rate_limit_max_posts: int = 60
+    # Taille maximale d'une requête HTTP (octets)
+    max_content_length_bytes: int = 1 * 1024 * 1024
+    # Base SQLite des sauvegardes (lue au démarrage uniquement)
+    db_path: str = DEFAULT_DB_PATH
+    # Caches de core/story_save.py
+    state_cache_size: int = 2048
+    # 0 : écriture immédiate. Avec un routage non collant, une lecture sur
+    # un autre worker attend la fin du bail (jusqu'à 2 × ce délai).
+    state_write_behind_ms: int = 0
+    leaderboard_cache_ttl_seconds: float = 30.0
+    # Télémétrie : écriture asynchrone par lots
+    telemetry_async: bool = True
+    telemetry_queue_size: int = 10_000
+    telemetry_batch_size: int = 200
+    telemetry_flush_ms: int = 500
+    # Budget propre aux POST de télémétrie, par IP et par fenêtre de limite
+    telemetry_rate_limit_max_posts: int = 240
+    # Passerelle ASGI (asgi.py) : threads WSGI et file d'attente, au démarrage
+    asgi_threads: int = 32
+    asgi_max_pending: int = 128
+    # GET /health/stats (compteurs internes) : désactivé par défaut, et
+    # réservé à la boucle locale une fois activé
+    stats_endpoint: bool = False
+
+
+def _int(env: Mapping[str, str], name: str, default: int, minimum: int) -> int:
+    raw = env.get(name)
+    if raw is None:
+        return default
+    try:
+        return max(minimum, int(raw))
+    except ValueError:
+        logger.warning(
+            "Invalid %s value %r, falling back to default=%s", name, raw, default
+        )
+        return default
+
+
+def _float(env: Mapping[str, str], name: str, default: float) -> float:
+    raw = env.get(name)
+    if raw is None:
+        return default
+    try:
+        return max(0.0, float(raw))
+    except ValueError:
+        logger.warning(
+            "Invalid %s value %r, falling back to default=%s", name, raw, default
+        )
+        return default
+
+
+def read_settings_file(path: str) -> dict[str, str]:
+    """Lit un fichier ``CLE=valeur`` (commentaires ``#`` et lignes vides ignorés)."""
+    values: dict[str, str] = {}
+    with open(path, encoding="utf-8") as handle:
+        for line in handle:
+            line = line.strip()
+            if not line or line.startswith("#") or "=" not in line:
+                continue
+            key, _, value = line.partition("=")
+            values[key.strip()] = value.strip().strip("\"'")
+    return values
+
+
+def _merged_environ(environ: Optional[Mapping[str, str]]) -> Mapping[str, str]:
+    env = os.environ if environ is None else environ
+    path = env.get("APP_SETTINGS_FILE")
+    if not path:
+        return env
+    try:
+        overrides = read_settings_file(path)
+    except OSError as exc:
+        logger.warning("APP_SETTINGS_FILE %s illisible : %s", path, exc)
+        return env
+    return {**env, **overrides}
+
+
+def load_settings(environ: Optional[Mapping[str, str]] = None) -> Settings:
+    """Construit les réglages depuis ``environ`` (``os.environ`` par défaut)."""
+    env = _merged_environ(environ)
+    defaults = Settings()
+    return Settings(
+        rate_limit_window_seconds=_int(
+            env,
+            "STORY_RATE_LIMIT_WINDOW_SECONDS",
+            defaults.rate_limit_window_seconds,
+            1,
+        ),
+        rate_limit_max_posts=_int(
+            env, "STORY_RATE_LIMIT_MAX_POSTS", defaults.rate_limit_max_posts, 1
+        ),
+        max_content_length_bytes=_int(
+            env,
+            "APP_MAX_CONTENT_LENGTH_BYTES",
+            defaults.max_content_length_bytes,
+            1024,
+        ),
+        db_path=env.get("STORY_DB_PATH") or defaults.db_path,
+        state_cache_size=_int(
+            env, "STORY_STATE_CACHE_SIZE", defaults.state_cache_size, 0
+        ),
+        state_write_behind_ms=_int(
+            env, "STORY_STATE_WRITE_BEHIND_MS", defaults.state_write_behind_ms, 0
+        ),
+        leaderboard_cache_ttl_seconds=_float(
+            env,
+            "STORY_LEADERBOARD_CACHE_TTL_SECONDS",
+            defaults.leaderboard_cache_ttl_seconds,
+        ),
+        telemetry_async=(env.get("STORY_TELEMETRY_ASYNC", "1").strip().lower())
+        not in _FALSY,
+        telemetry_queue_size=_int(
+            env, "STORY_TELEMETRY_QUEUE_SIZE", defaults.telemetry_queue_size, 0
+        ),
+        telemetry_batch_size=_int(
+            env, "STORY_TELEMETRY_BATCH_SIZE", defaults.telemetry_batch_size, 0
+        ),
+        telemetry_flush_ms=_int(
+            env, "STORY_TELEMETRY_FLUSH_MS", defaults.telemetry_flush_ms, 0
+        ),
+        telemetry_rate_limit_max_posts=_int(
+            env,
+            "STORY_TELEMETRY_RATE_LIMIT_MAX_POSTS",
+            defaults.telemetry_rate_limit_max_posts,
+            1,
+        ),
+        asgi_threads=_int(env, "STORY_ASGI_THREADS", defaults.asgi_threads, 1),
+        asgi_max_pending=_int(
+            env, "STORY_ASGI_MAX_PENDING", defaults.asgi_max_pending, 0
+        ),
+        stats_endpoint=(env.get("APP_STATS_ENDPOINT", "0").strip().lower())
+        not in _FALSY,
+    )
+
+
+# ── Réglages courants du processus ────────────────────────────────────────
+
+SettingsListener = Callable[[Settings], None]
+
+_LOCK = threading.Lock()
+_CURRENT: Optional[Settings] = None
+_LISTENERS: list[SettingsListener] = []
+# SIGHUP → thread de rechargement (un par processus, relancé après un fork).
+_RELOAD_REQUESTED = threading.Event()
+_RELOAD_THREAD: Optional[threading.Thread] = None
+
+
+def get_settings() -> Settings:
+    """Réglages courants (chargés au premier appel) ; lecture sans verrou."""
+    settings = _CURRENT
+    return settings if settings is not None else reload_settings()
+
+
+def reload_settings(environ: Optional[Mapping[str, str]] = None) -> Settings:
+    """Relit l'environnement et pousse les réglages aux abonnés."""
+    global _CURRENT
+    settings = load_settings(environ)
+    with _LOCK:
+        _CURRENT = settings
+        listeners = list(_LISTENERS)
+    for listener in listeners:
+        listener(settings)
+    return settings
+
+
+def on_reload(listener: SettingsListener) -> None:
+    """Abonne ``listener`` aux réglages relus (``reload_settings``, SIGHUP)."""
+    with _LOCK:
+        if listener not in _LISTENERS:
+            _LISTENERS.append(listener)
+
+
+def _reload_loop() -> None:
+    while True:
+        _RELOAD_REQUESTED.wait()
+        _RELOAD_REQUESTED.clear()
+        try:
+            settings = reload_settings()
+        except Exception:  # le thread doit survivre à un abonné défaillant
+            logger.exception("Rechargement des réglages (SIGHUP) impossible")
+        else:
+            logger.info("Réglages rechargés (SIGHUP) : %s", settings)
+
+
+def _handle_sighup(signum: int, frame: object) -> None:
+    # Contexte de signal : le thread interrompu peut tenir n'importe quel
+    # verrou, on se contente de réveiller le thread de rechargement.
+    _RELOAD_REQUESTED.set()
+
+
+def install_sighup_reload() -> bool:
+    """
+    Relit les réglages sur SIGHUP, dans un thread démon dédié. Sans effet
+    hors du thread principal ou sur une plateforme sans SIGHUP ; retourne
+    True si le signal est installé.
+    """
+    global _RELOAD_THREAD
+    if not hasattr(signal, "SIGHUP"):
+        return False
+    if threading.current_thread() is not threading.main_thread():
+        return False
+
+    if _RELOAD_THREAD is None or not _RELOAD_THREAD.is_alive():
+        _RELOAD_THREAD = threading.Thread(
+            target=_reload_loop, name="luna-settings-reload", daemon=True
+        )
+        _RELOAD_THREAD.start()
+    signal.signal(signal.SIGHUP, _handle_sighup)
+    return True
@@ -0,0 +1,178 @@
+"""
+Passerelle ASGI → WSGI — LUNA Hors Connexion.
+
+Sert l'application Flask depuis une boucle asyncio (uvicorn, worker
+gunicorn ``uvicorn_worker.UvicornWorker``) :
+
+    uvicorn asgi:app --workers 2
+    gunicorn -c gunicorn.asgi.conf.py asgi:app
+
+La traduction ASGI → WSGI (environ PEP 3333, réponse relayée morceau par
+morceau, pool de ``STORY_ASGI_THREADS`` threads) est celle de ``a2wsgi``
+(``pip install -e .[asgi]``). Les attentes SQLite (``busy_timeout``, pauses
+de ``_with_db_retry``) occupent un thread du pool et non plus le processus
+entier comme avec les workers ``sync``.
+
+Ce module n'ajoute devant que deux règles propres au jeu :
+
+- au-delà de ``STORY_ASGI_THREADS + STORY_ASGI_MAX_PENDING`` requêtes en
+  cours, 503 immédiat plutôt que d'empiler des requêtes qui expireraient
+  côté client ;
+- le corps est lu en entier dans la boucle avant de prendre un thread
+  (borné par ``APP_MAX_CONTENT_LENGTH_BYTES``, 413 au-delà). Si le client
+  se déconnecte avant la fin du corps, la requête est abandonnée : Flask
+  n'est jamais appelé avec un corps tronqué.
+"""
+
+import threading
+from collections.abc import Awaitable, Callable, Iterable, MutableMapping
+from typing import Any, Optional
+
+from a2wsgi import WSGIMiddleware
+
+Scope = MutableMapping[str, Any]
+Message = MutableMapping[str, Any]
+Receive = Callable[[], Awaitable[Message]]
+Send = Callable[[Message], Awaitable[None]]
+WsgiApp = Callable[[dict[str, Any], Callable[..., Any]], Iterable[bytes]]
+
+_OVERLOADED_BODY = '{"success":false,"error":"Serveur surchargé, réessaie."}'.encode()
+_TOO_LARGE_BODY = b'{"success":false,"error":"Payload trop volumineux."}'
+# Remplacés par la taille du corps déjà lu (requêtes chunked comprises).
+_BODY_HEADERS = {b"content-length", b"transfer-encoding"}
+
+
+class _ClientGone(Exception):
+    """Le client a fermé la connexion avant la fin du corps de la requête."""
+
+
+class _BodyTooLarge(Exception):
+    """Corps au-delà de ``max_body_bytes``."""
+
+
+class AsgiBridge:
+    """
+    Application ASGI 3 : admission et lecture du corps, puis ``a2wsgi``
+    exécute ``wsgi_app`` dans un pool de ``max_threads`` threads.
+    """
+
+    def __init__(
+        self,
+        wsgi_app: WsgiApp,
+        max_threads: int = 32,
+        max_pending: int = 128,
+        max_body_bytes: int = 1 * 1024 * 1024,
+    ) -> None:
+        self.max_threads = max(1, max_threads)
+        self.max_in_flight = self.max_threads + max(0, max_pending)
+        self.max_body_bytes = max_body_bytes
+        self._wsgi = WSGIMiddleware(wsgi_app, workers=self.max_threads)
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._served = 0
+        self._rejected = 0
+        self._aborted = 0
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] == "http":
+            await self._http(scope, receive, send)
+        else:  # lifespan, websocket : a2wsgi
+            await self._wsgi(scope, receive, send)
+
+    def stats(self) -> dict[str, int]:
+        with self._lock:
+            return {
+                "threads": self.max_threads,
+                "max_in_flight": self.max_in_flight,
+                "in_flight": self._in_flight,
+                "served": self._served,
+                "rejected": self._rejected,
+                "aborted": self._aborted,
+            }
+
+    async def _http(self, scope: Scope, receive: Receive, send: Send) -> None:
+        with self._lock:
+            admitted = self._in_flight < self.max_in_flight
+            if admitted:
+                self._in_flight += 1
+            else:
+                self._rejected += 1
+        if not admitted:
+            await _send_simple(send, 503, _OVERLOADED_BODY, [(b"retry-after", b"1")])
+            return
+        try:
+            try:
+                body = await self._read_body(receive)
+            except _BodyTooLarge:
+                await _send_simple(send, 413, _TOO_LARGE_BODY)
+                return
+            except _ClientGone:
+                with self._lock:
+                    self._aborted += 1
+                return
+            headers = [
+                (name, value)
+                for name, value in scope.get("headers", [])
+                if name.lower() not in _BODY_HEADERS
+            ]
+            headers.append((b"content-length", str(len(body)).encode()))
+            await self._wsgi(
+                {**scope, "headers": headers}, _replay(body, receive), send
+            )
+        finally:
+            with self._lock:
+                self._in_flight -= 1
+                self._served += 1
+
+    async def _read_body(self, receive: Receive) -> bytes:
+        chunks: list[bytes] = []
+        size = 0
+        while True:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                raise _ClientGone()
+            chunk = message.get("body", b"")
+            size += len(chunk)
+            if size > self.max_body_bytes:
+                raise _BodyTooLarge()
+            chunks.append(chunk)
+            if not message.get("more_body", False):
+                return b"".join(chunks)
+
+
+def _replay(body: bytes, receive: Receive) -> Receive:
+    """``receive`` qui rend le corps déjà lu, puis les messages suivants."""
+    pending: Optional[Message] = {
+        "type": "http.request",
+        "body": body,
+        "more_body": False,
+    }
+
+    async def _receive() -> Message:
+        nonlocal pending
+        if pending is not None:
+            message, pending = pending, None
+            return message
+        return await receive()
+
+    return _receive
+
+
+async def _send_simple(
+    send: Send,
+    status: int,
+    body: bytes,
+    extra_headers: Optional[list[tuple[bytes, bytes]]] = None,
+) -> None:
+    headers = [
+        (b"content-type", b"application/json"),
+        (b"content-length", str(len(body)).encode()),
+    ]
+    await send(
+        {
+            "type": "http.response.start",
+            "status": status,
+            "headers": headers + (extra_headers or []),
+        }
+    )
+    await send({"type": "http.response.body", "body": body})
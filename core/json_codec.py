@@ -0,0 +1,106 @@
+"""
+Codec JSON partagé — LUNA Hors Connexion.
+
+Un seul point d'encodage/décodage pour les réponses Flask (``CodecJSONProvider``)
+et la persistance (``story_save``, classement, télémétrie). ``orjson`` est
+utilisé s'il est installé, sinon la bibliothèque standard ; la sortie est
+toujours compacte et en UTF-8 (pas d'échappement ``\\uXXXX``).
+
+``STORY_JSON_BACKEND=json`` force la bibliothèque standard.
+"""
+
+import json
+import os
+from collections.abc import Callable
+from typing import Any, Optional, Union
+
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:  # dépendance optionnelle
+    orjson = None  # type: ignore[assignment]
+
+Default = Optional[Callable[[Any], Any]]
+
+
+class JsonCodec:
+    """Encodeur/décodeur JSON compact, ``orjson`` ou bibliothèque standard."""
+
+    def __init__(self, backend: str = "auto") -> None:
+        if backend not in {"auto", "orjson", "json"}:
+            raise ValueError(f"unknown JSON backend {backend!r}")
+        if backend == "orjson" and orjson is None:
+            raise ValueError("orjson is not installed")
+        use_orjson = orjson is not None and backend != "json"
+        self.backend = "orjson" if use_orjson else "json"
+
+    def dumps(
+        self, value: Any, default: Default = None, sort_keys: bool = False
+    ) -> str:
+        if self.backend == "orjson":
+            return self.dumps_bytes(value, default, sort_keys).decode("utf-8")
+        return _stdlib_dumps(value, default, sort_keys)
+
+    def dumps_bytes(
+        self, value: Any, default: Default = None, sort_keys: bool = False
+    ) -> bytes:
+        if self.backend == "orjson":
+            option = orjson.OPT_SORT_KEYS if sort_keys else 0
+            if default is not None:
+                # Laisse ``default`` (celui de Flask) formater dates et dataclasses.
+                option |= orjson.OPT_PASSTHROUGH_DATETIME
+                option |= orjson.OPT_PASSTHROUGH_DATACLASS
+            try:
+                return orjson.dumps(value, default=default, option=option)
+            except TypeError:
+                # Clés non-str, entiers > 64 bits… : la stdlib sait faire.
+                pass
+        return _stdlib_dumps(value, default, sort_keys).encode("utf-8")
+
+    def loads(self, data: Union[str, bytes, bytearray]) -> Any:
+        """Décode ``data`` (``json.JSONDecodeError`` si invalide)."""
+        if self.backend == "orjson":
+            return orjson.loads(data)
+        return json.loads(data)
+
+
+def _stdlib_dumps(value: Any, default: Default, sort_keys: bool) -> str:
+    return json.dumps(
+        value,
+        ensure_ascii=False,
+        separators=(",", ":"),
+        default=default,
+        sort_keys=sort_keys,
+    )
+
+
+codec = JsonCodec(os.environ.get("STORY_JSON_BACKEND", "auto").strip().lower())
+dumps = codec.dumps
+dumps_bytes = codec.dumps_bytes
+loads = codec.loads
+
+
+class CodecJSONProvider(DefaultJSONProvider):
+    """
+    Fournisseur JSON Flask branché sur le codec partagé (``jsonify``,
+    ``request.get_json``). Les appels avec options explicites et le mode
+    « joli » du debug restent sur l'implémentation de Flask.
+    """
+
+    def dumps(self, obj: Any, **kwargs: Any) -> str:
+        if kwargs:
+            return super().dumps(obj, **kwargs)
+        return codec.dumps(obj, default=self.default, sort_keys=self.sort_keys)
+
+    def loads(self, s: Union[str, bytes], **kwargs: Any) -> Any:
+        if kwargs:
+            return super().loads(s, **kwargs)
+        return codec.loads(s)
+
+    def response(self, *args: Any, **kwargs: Any):
+        if (self.compact is None and self._app.debug) or self.compact is False:
+            return super().response(*args, **kwargs)
+        obj = self._prepare_response_obj(args, kwargs)
+        body = codec.dumps_bytes(obj, default=self.default, sort_keys=self.sort_keys)
+        return self._app.response_class(body + b"\n", mimetype=self.mimetype)
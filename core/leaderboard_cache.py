@@ -0,0 +1,138 @@
+"""
+Cache du classement — LUNA Hors Connexion.
+
+Garde en mémoire le top N déjà sérialisé (corps JSON + ETag) pendant un TTL.
+Une entrée est aussi invalidée dès que le « tampon » du classement change :
+compteur incrémenté par ``story_save`` quand une sauvegarde peut modifier le
+top N, lu en SQLite pour être partagé entre workers gunicorn.
+"""
+
+import hashlib
+import threading
+import time
+from collections.abc import Callable
+from typing import Any, NamedTuple, Optional
+
+from core import json_codec
+
+JsonDict = dict[str, Any]
+
+# (xp, luna_trust) du dernier classé ; None si le classement n'est pas plein.
+Cutoff = Optional[tuple[int, int]]
+
+
+class LeaderboardSnapshot(NamedTuple):
+    scores: tuple[JsonDict, ...]
+    scores_json: bytes
+    etag: str
+    cutoff: Cutoff
+    stamp: int
+    created_at: float
+
+
+class LeaderboardCache:
+    """Snapshots du classement par ``limit``, expirés par TTL ou par tampon."""
+
+    def __init__(self, ttl_seconds: float) -> None:
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._snapshots: dict[int, LeaderboardSnapshot] = {}
+        self._hits = 0
+        self._misses = 0
+        self._invalidations = 0
+
+    def get(
+        self,
+        limit: int,
+        stamp: int,
+        compute: Callable[[int], tuple[list[JsonDict], Cutoff]],
+    ) -> LeaderboardSnapshot:
+        now = time.monotonic()
+        with self._lock:
+            snapshot = self._snapshots.get(limit)
+            if (
+                snapshot is not None
+                and snapshot.stamp == stamp
+                and (now - snapshot.created_at) < self.ttl_seconds
+            ):
+                self._hits += 1
+                return snapshot
+            self._misses += 1
+
+        scores, cutoff = compute(limit)
+        snapshot = build_snapshot(scores, cutoff, stamp, now)
+        if self.ttl_seconds > 0:
+            with self._lock:
+                self._snapshots[limit] = snapshot
+        return snapshot
+
+    def invalidate(self) -> None:
+        with self._lock:
+            if self._snapshots:
+                self._invalidations += 1
+            self._snapshots.clear()
+
+    def lowest_cutoff(self) -> tuple[bool, Cutoff]:
+        """
+        Seuil d'entrée le plus bas parmi les snapshots en cache.
+
+        Retourne ``(known, cutoff)`` : ``known`` est faux si aucun snapshot
+        n'est disponible pour décider (il faut alors invalider par prudence).
+        """
+        with self._lock:
+            snapshots = list(self._snapshots.values())
+        if not snapshots:
+            return False, None
+        cutoffs = [snapshot.cutoff for snapshot in snapshots]
+        if any(cutoff is None for cutoff in cutoffs):
+            return True, None
+        return True, min(cutoff for cutoff in cutoffs if cutoff is not None)
+
+    def combined_cutoff(self, limit: int, cutoff: Cutoff) -> Cutoff:
+        """Seuil le plus bas entre ``cutoff`` et les snapshots des autres ``limit``."""
+        with self._lock:
+            others = [
+                snapshot.cutoff
+                for other_limit, snapshot in self._snapshots.items()
+                if other_limit != limit
+            ]
+        cutoffs = [cutoff, *others]
+        if any(candidate is None for candidate in cutoffs):
+            return None
+        return min(candidate for candidate in cutoffs if candidate is not None)
+
+    def stats(self) -> JsonDict:
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "ttl_seconds": self.ttl_seconds,
+                "entries": len(self._snapshots),
+                "hits": self._hits,
+                "misses": self._misses,
+                "invalidations": self._invalidations,
+                "hit_rate": round(self._hits / lookups, 4) if lookups else 0.0,
+            }
+
+
+def build_snapshot(
+    scores: list[JsonDict], cutoff: Cutoff, stamp: int, created_at: float
+) -> LeaderboardSnapshot:
+    payload = json_codec.dumps_bytes(scores)
+    etag = hashlib.sha256(payload).hexdigest()[:32]
+    return LeaderboardSnapshot(
+        scores=tuple(scores),
+        scores_json=payload,
+        etag=etag,
+        cutoff=cutoff,
+        stamp=stamp,
+        created_at=created_at,
+    )
+
+
+def may_enter_leaderboard(xp: int, trust: int, cutoff: Cutoff) -> bool:
+    """Vrai si un score (xp, trust) peut entrer dans un top N de seuil ``cutoff``."""
+    if xp == 0:
+        return False
+    if cutoff is None:
+        return True
+    return (xp, trust) >= cutoff
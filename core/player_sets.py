@@ -0,0 +1,73 @@
+"""
+Vue ensembliste de l'état joueur — LUNA Hors Connexion.
+
+L'état persisté garde des listes ordonnées (``flags``, ``secrets_found``,
+``chapters_completed``, ``endings_unlocked``) : l'ordre d'obtention est
+affiché et sauvegardé. Pendant une requête, le moteur passe par un
+``PlayerSets`` construit une fois : appartenance en O(1), flags aussi sous
+forme de masque. Les listes de l'état ne sont touchées qu'en ajout, elles
+sont donc déjà à jour au moment de la sauvegarde.
+"""
+
+from collections.abc import Iterator
+from typing import Any, cast
+
+PlayerState = dict[str, Any]
+
+
+class IdSet:
+    """Ensemble d'identifiants adossé à une liste de l'état joueur."""
+
+    __slots__ = ("_state", "_key", "_members")
+
+    def __init__(self, state: PlayerState, key: str) -> None:
+        self._state = state
+        self._key = key
+        self._members = set(cast(list[str], state.get(key) or ()))
+
+    def __contains__(self, item: object) -> bool:
+        return item in self._members
+
+    def __len__(self) -> int:
+        return len(self._members)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._members)
+
+    def add(self, item: str) -> bool:
+        """Ajoute ``item`` en fin de liste s'il est absent ; True si ajouté."""
+        if item in self._members:
+            return False
+        self._members.add(item)
+        # La liste n'est créée qu'au premier ajout, comme avant.
+        cast(list[str], self._state.setdefault(self._key, [])).append(item)
+        return True
+
+
+class PlayerSets:
+    """
+    Flags, secrets, chapitres terminés et fins d'un état joueur, indexés pour
+    la durée d'une requête. ``flag_mask`` suit ``flag_bits`` (voir
+    ``StoryGraph.flag_bits``) ; les flags inconnus n'y ont pas de bit.
+    """
+
+    __slots__ = ("flags", "flag_mask", "secrets", "chapters", "endings", "_bits")
+
+    def __init__(self, state: PlayerState, flag_bits: dict[str, int]) -> None:
+        self._bits = flag_bits
+        self.flags = IdSet(state, "flags")
+        self.flag_mask = 0
+        for flag in self.flags:
+            self.flag_mask |= flag_bits.get(flag, 0)
+        self.secrets = IdSet(state, "secrets_found")
+        self.chapters = IdSet(state, "chapters_completed")
+        self.endings = IdSet(state, "endings_unlocked")
+
+    def add_flag(self, flag: str) -> bool:
+        if not self.flags.add(flag):
+            return False
+        self.flag_mask |= self._bits.get(flag, 0)
+        return True
+
+    def has_flags(self, mask: int) -> bool:
+        return mask & self.flag_mask == mask
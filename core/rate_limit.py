@@ -0,0 +1,387 @@
+"""
+Limiteur de débit des POST de jeu — LUNA Hors Connexion.
+
+Compteur à fenêtre glissante approchée : par clé (IP), l'index de la
+fenêtre fixe courante, le compte de la fenêtre précédente et celui de la
+courante. L'estimation ``précédent × part restante + courant`` lisse la
+frontière entre fenêtres, en taille fixe par clé (plus de deque d'horodatages).
+
+- Sharding : les clés sont réparties sur ``shards`` dictionnaires, chacun
+  avec son verrou ; deux requêtes ne se bloquent que si leurs clés tombent
+  dans le même shard.
+- Nettoyage amorti : une entrée périmée est réinitialisée quand sa clé
+  revient ; chaque shard n'est balayé qu'une fois par fenêtre, par la
+  requête qui le touche en premier après l'échéance.
+- Mémoire bornée : au plus ``max_keys`` clés au total. Un shard plein
+  évince sa plus ancienne entrée (ordre d'insertion) : sous un flood d'IP,
+  la mémoire reste fixe au prix d'un oubli des clés les plus anciennes.
+
+Deux backends, choisis par ``STORY_RATE_LIMIT_BACKEND`` :
+
+- ``memory`` (défaut) : ``ShardedRateLimiter``, propre au processus ;
+- ``shared`` : ``SharedMemoryRateLimiter``, table de compteurs de taille fixe
+  dans un fichier mmap (``STORY_RATE_LIMIT_SHM_PATH``, ``/dev/shm`` par
+  défaut) commune à tous les workers gunicorn ; verrous ``fcntl`` par shard
+  entre processus. Si le fichier ne peut pas être ouvert (pas de ``fcntl``,
+  répertoire absent…), repli sur ``memory`` avec un avertissement.
+"""
+
+import hashlib
+import logging
+import mmap
+import os
+import struct
+import tempfile
+import threading
+from collections.abc import Iterator, Mapping
+from contextlib import contextmanager
+from typing import Any, NamedTuple, Optional, Union
+
+try:
+    import fcntl
+except ImportError:  # Windows : pas de verrou de plage, backend memory seul
+    fcntl = None  # type: ignore[assignment]
+
+logger = logging.getLogger(__name__)
+
+JsonDict = dict[str, Any]
+
+DEFAULT_SHARDS = 16
+DEFAULT_MAX_KEYS = 100_000
+# Emplacements sondés à partir de la position d'une clé (table partagée).
+SHARED_PROBE_SLOTS = 8
+_SHM_DIR = "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+DEFAULT_SHM_PATH = os.path.join(_SHM_DIR, "arkalia_story_rate_limit")
+
+
+class _Counter(NamedTuple):
+    window: int  # index de la fenêtre fixe (temps // durée)
+    previous: int
+    current: int
+
+
+class _Shard:
+    __slots__ = ("lock", "counters", "next_sweep", "evictions")
+
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        self.counters: dict[str, _Counter] = {}
+        self.next_sweep = 0.0
+        self.evictions = 0
+
+
+class ShardedRateLimiter:
+    def __init__(
+        self, shards: int = DEFAULT_SHARDS, max_keys: int = DEFAULT_MAX_KEYS
+    ) -> None:
+        self._shards = tuple(_Shard() for _ in range(max(1, shards)))
+        self._max_per_shard = max(1, max_keys // len(self._shards))
+
+    def _shard(self, key: str) -> _Shard:
+        return self._shards[hash(key) % len(self._shards)]
+
+    def hit(self, key: str, now: float, window_seconds: int, max_hits: int) -> bool:
+        """
+        Compte une requête de ``key`` si elle reste sous ``max_hits`` par
+        fenêtre glissante ; False (non comptée) sinon.
+        """
+        shard = self._shard(key)
+        window = int(now // window_seconds)
+        with shard.lock:
+            self._maybe_sweep(shard, now, window, window_seconds)
+            counter = _roll(shard.counters.get(key), window)
+            elapsed = now / window_seconds - window
+            estimate = counter.previous * (1.0 - elapsed) + counter.current
+            if estimate >= max_hits:
+                return False
+            self._store(shard, key, counter._replace(current=counter.current + 1))
+            return True
+
+    def record(self, key: str, now: float, window_seconds: int) -> None:
+        """Compte une requête sans appliquer de limite."""
+        shard = self._shard(key)
+        window = int(now // window_seconds)
+        with shard.lock:
+            counter = _roll(shard.counters.get(key), window)
+            self._store(shard, key, counter._replace(current=counter.current + 1))
+
+    def cleanup(self, now: float, window_seconds: int) -> None:
+        """Balaye tous les shards (les requêtes, elles, n'en balayent qu'un)."""
+        window = int(now // window_seconds)
+        for shard in self._shards:
+            with shard.lock:
+                _sweep(shard, window)
+                shard.next_sweep = (window + 1) * window_seconds
+
+    def reset(self) -> None:
+        for shard in self._shards:
+            with shard.lock:
+                shard.counters.clear()
+                shard.next_sweep = 0.0
+
+    def __contains__(self, key: object) -> bool:
+        return isinstance(key, str) and key in self._shard(key).counters
+
+    def __len__(self) -> int:
+        return sum(len(shard.counters) for shard in self._shards)
+
+    def stats(self) -> JsonDict:
+        return {
+            "backend": "memory",
+            "keys": len(self),
+            "max_keys": self._max_per_shard * len(self._shards),
+            "shards": len(self._shards),
+            "evictions": sum(shard.evictions for shard in self._shards),
+        }
+
+    def _store(self, shard: _Shard, key: str, counter: _Counter) -> None:
+        counters = shard.counters
+        if key not in counters and len(counters) >= self._max_per_shard:
+            del counters[next(iter(counters))]
+            shard.evictions += 1
+        counters[key] = counter
+
+    @staticmethod
+    def _maybe_sweep(
+        shard: _Shard, now: float, window: int, window_seconds: int
+    ) -> None:
+        if now >= shard.next_sweep:
+            _sweep(shard, window)
+            shard.next_sweep = (window + 1) * window_seconds
+
+
+def _roll(counter: Optional[_Counter], window: int) -> _Counter:
+    """Compteur ramené à la fenêtre ``window``."""
+    if counter is None or counter.window < window - 1:
+        return _Counter(window, 0, 0)
+    if counter.window == window - 1:
+        return _Counter(window, counter.current, 0)
+    return counter
+
+
+def _sweep(shard: _Shard, window: int) -> None:
+    # Plus rien à compter au-delà de la fenêtre précédente.
+    stale = [k for k, c in shard.counters.items() if c.window < window - 1]
+    for key in stale:
+        del shard.counters[key]
+
+
+# ── Backend partagé entre workers ─────────────────────────────────────────
+
+_MAGIC = b"LQRL"
+_LAYOUT_VERSION = 1
+# magic, version, réservé, shards, emplacements par shard
+_HEADER = struct.Struct("<4sHHII")
+# empreinte de la clé (0 = libre), fenêtre, compte précédent, compte courant
+_SLOT = struct.Struct("<QqII")
+
+
+def _key_hash(key: str) -> int:
+    # Stable d'un processus à l'autre (contrairement à hash()), jamais 0.
+    digest = hashlib.blake2b(key.encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "little") or 1
+
+
+class SharedMemoryRateLimiter:
+    """
+    Même compteur que ``ShardedRateLimiter``, dans un fichier mmap partagé :
+    ``shards`` régions de ``max_keys // shards`` emplacements, adressage
+    ouvert sur ``SHARED_PROBE_SLOTS`` emplacements. Une clé périmée libère
+    son emplacement ; si tous les emplacements sondés sont vivants, celui de
+    la fenêtre la plus ancienne est évincé.
+    """
+
+    def __init__(
+        self,
+        path: str = DEFAULT_SHM_PATH,
+        shards: int = DEFAULT_SHARDS,
+        max_keys: int = DEFAULT_MAX_KEYS,
+    ) -> None:
+        if fcntl is None:
+            raise OSError("fcntl indisponible : pas de verrou entre processus")
+        self.path = path
+        self._shard_count = max(1, shards)
+        self._slots_per_shard = max(SHARED_PROBE_SLOTS, max_keys // self._shard_count)
+        self._size = _HEADER.size + (
+            self._shard_count * self._slots_per_shard * _SLOT.size
+        )
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            self._init_file()
+            self._map = mmap.mmap(self._fd, self._size)
+        except Exception:
+            os.close(self._fd)
+            raise
+        self._evictions = 0
+        self._reset_process_state()
+        if hasattr(os, "register_at_fork"):
+            os.register_at_fork(after_in_child=self._reset_process_state)
+
+    def _reset_process_state(self) -> None:
+        # Les verrous fcntl excluent les processus, pas les threads d'un même
+        # processus : un verrou local par shard en plus.
+        self._locks = tuple(threading.Lock() for _ in range(self._shard_count))
+        self._evictions = 0
+
+    def _init_file(self) -> None:
+        header = _HEADER.pack(
+            _MAGIC, _LAYOUT_VERSION, 0, self._shard_count, self._slots_per_shard
+        )
+        fcntl.lockf(self._fd, fcntl.LOCK_EX, 0, 0, os.SEEK_SET)
+        try:
+            current = os.pread(self._fd, _HEADER.size, 0)
+            if current != header or os.fstat(self._fd).st_size != self._size:
+                # Fichier neuf ou d'une autre configuration : table vide.
+                os.ftruncate(self._fd, 0)
+                os.ftruncate(self._fd, self._size)
+                os.pwrite(self._fd, header, 0)
+        finally:
+            fcntl.lockf(self._fd, fcntl.LOCK_UN, 0, 0, os.SEEK_SET)
+
+    # -- verrous ---------------------------------------------------------
+
+    def _shard_range(self, shard: int) -> tuple[int, int]:
+        length = self._slots_per_shard * _SLOT.size
+        return _HEADER.size + shard * length, length
+
+    @contextmanager
+    def _locked(self, shard: int) -> Iterator[None]:
+        start, length = self._shard_range(shard)
+        with self._locks[shard]:
+            fcntl.lockf(self._fd, fcntl.LOCK_EX, length, start, os.SEEK_SET)
+            try:
+                yield
+            finally:
+                fcntl.lockf(self._fd, fcntl.LOCK_UN, length, start, os.SEEK_SET)
+
+    # -- table -----------------------------------------------------------
+
+    def _locate(self, key_hash: int) -> tuple[int, tuple[int, ...]]:
+        shard = key_hash % self._shard_count
+        start, _ = self._shard_range(shard)
+        first = (key_hash // self._shard_count) % self._slots_per_shard
+        offsets = tuple(
+            start + ((first + i) % self._slots_per_shard) * _SLOT.size
+            for i in range(SHARED_PROBE_SLOTS)
+        )
+        return shard, offsets
+
+    def _find(self, key_hash: int, offsets: tuple[int, ...]) -> Optional[int]:
+        for offset in offsets:
+            if _SLOT.unpack_from(self._map, offset)[0] == key_hash:
+                return offset
+        return None
+
+    def _claim(self, key_hash: int, offsets: tuple[int, ...], window: int) -> int:
+        oldest: Optional[tuple[int, int]] = None
+        for offset in offsets:
+            slot_hash, slot_window, _, _ = _SLOT.unpack_from(self._map, offset)
+            if slot_hash == key_hash or slot_hash == 0 or slot_window < window - 1:
+                return offset
+            if oldest is None or slot_window < oldest[0]:
+                oldest = (slot_window, offset)
+        assert oldest is not None
+        self._evictions += 1
+        return oldest[1]
+
+    def _counter_at(self, key_hash: int, offset: int, window: int) -> _Counter:
+        slot_hash, slot_window, previous, current = _SLOT.unpack_from(self._map, offset)
+        if slot_hash != key_hash:
+            return _Counter(window, 0, 0)
+        return _roll(_Counter(slot_window, previous, current), window)
+
+    def _count(
+        self, key: str, now: float, window_seconds: int, max_hits: Optional[int]
+    ) -> bool:
+        key_hash = _key_hash(key)
+        window = int(now // window_seconds)
+        shard, offsets = self._locate(key_hash)
+        with self._locked(shard):
+            offset = self._find(key_hash, offsets)
+            if offset is None:
+                offset = self._claim(key_hash, offsets, window)
+            counter = self._counter_at(key_hash, offset, window)
+            if max_hits is not None:
+                elapsed = now / window_seconds - window
+                if counter.previous * (1.0 - elapsed) + counter.current >= max_hits:
+                    return False
+            _SLOT.pack_into(
+                self._map,
+                offset,
+                key_hash,
+                counter.window,
+                counter.previous,
+                counter.current + 1,
+            )
+            return True
+
+    # -- API commune avec ShardedRateLimiter -------------------------------
+
+    def hit(self, key: str, now: float, window_seconds: int, max_hits: int) -> bool:
+        return self._count(key, now, window_seconds, max_hits)
+
+    def record(self, key: str, now: float, window_seconds: int) -> None:
+        self._count(key, now, window_seconds, None)
+
+    def cleanup(self, now: float, window_seconds: int) -> None:
+        window = int(now // window_seconds)
+        for shard in range(self._shard_count):
+            start, length = self._shard_range(shard)
+            with self._locked(shard):
+                for offset in range(start, start + length, _SLOT.size):
+                    slot_hash, slot_window, _, _ = _SLOT.unpack_from(self._map, offset)
+                    if slot_hash and slot_window < window - 1:
+                        _SLOT.pack_into(self._map, offset, 0, 0, 0, 0)
+
+    def reset(self) -> None:
+        empty = bytes(_SLOT.size * self._slots_per_shard)
+        for shard in range(self._shard_count):
+            start, length = self._shard_range(shard)
+            with self._locked(shard):
+                self._map[start : start + length] = empty
+
+    def __contains__(self, key: object) -> bool:
+        if not isinstance(key, str):
+            return False
+        key_hash = _key_hash(key)
+        return self._find(key_hash, self._locate(key_hash)[1]) is not None
+
+    def __len__(self) -> int:
+        return sum(
+            1
+            for offset in range(_HEADER.size, self._size, _SLOT.size)
+            if _SLOT.unpack_from(self._map, offset)[0]
+        )
+
+    def stats(self) -> JsonDict:
+        return {
+            "backend": "shared",
+            "path": self.path,
+            "max_keys": self._shard_count * self._slots_per_shard,
+            "shards": self._shard_count,
+            "evictions": self._evictions,  # par processus
+        }
+
+    def close(self) -> None:
+        self._map.close()
+        os.close(self._fd)
+
+
+RateLimiter = Union[ShardedRateLimiter, SharedMemoryRateLimiter]
+
+
+def create_rate_limiter(environ: Optional[Mapping[str, str]] = None) -> RateLimiter:
+    """Backend selon ``STORY_RATE_LIMIT_BACKEND`` (``memory`` | ``shared``)."""
+    env = os.environ if environ is None else environ
+    backend = env.get("STORY_RATE_LIMIT_BACKEND", "memory").strip().lower()
+    if backend == "shared":
+        path = env.get("STORY_RATE_LIMIT_SHM_PATH") or DEFAULT_SHM_PATH
+        try:
+            return SharedMemoryRateLimiter(path)
+        except OSError as exc:
+            logger.warning(
+                "Shared rate limit unavailable (%s), using per-process memory", exc
+            )
+    elif backend != "memory":
+        logger.warning("Unknown STORY_RATE_LIMIT_BACKEND %r, using memory", backend)
+    return ShardedRateLimiter()
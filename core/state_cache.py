@@ -0,0 +1,425 @@
+"""
+Cache des états joueurs — LUNA Hors Connexion.
+
+LRU en mémoire des états récemment joués, avec écriture différée : les
+modifications successives d'un même joueur sont regroupées et écrites au plus
+une fois par fenêtre ``flush_interval_ms`` par un thread d'arrière-plan.
+
+Le cache ne parle pas à SQLite : ``story_save`` fournit la fonction
+d'écriture (compare-and-swap sur la colonne ``version``) et gère le bail
+(``lease``) qui protège les écritures différées entre workers gunicorn.
+
+Chaque écriture acceptée, même différée, incrémente la version logique de
+l'entrée ; une écriture différée la reporte telle quelle dans SQLite. Les
+routes peuvent donc comparer une seule version, qu'elle vienne du cache ou de
+la base.
+"""
+
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Callable
+from typing import Any, Optional
+
+logger = logging.getLogger(__name__)
+
+JsonDict = dict[str, Any]
+# (player_id, state, version, flushed_version, db_path)
+_Snapshot = tuple[str, JsonDict, int, int, str]
+# Écrit un instantané ; False si la ligne n'est plus à ``flushed_version``
+# (un autre worker l'a écrite).
+StateFlusher = Callable[[str, JsonDict, int, int, str], bool]
+# Verrous d'écriture répartis par joueur : deux joueurs ne s'attendent que
+# s'ils tombent sur le même.
+_WRITE_LOCK_STRIPES = 64
+
+
+class StateConflictError(Exception):
+    """L'état a été modifié depuis sa lecture (version attendue dépassée)."""
+
+    def __init__(self, player_id: str, expected_version: int) -> None:
+        super().__init__(
+            f"state of {player_id} changed since version {expected_version}"
+        )
+        self.player_id = player_id
+        self.expected_version = expected_version
+
+
+class CachedState:
+    """
+    Entrée du cache. ``state`` n'est jamais muté en place : chaque écriture
+    remplace le dict, les lecteurs peuvent donc le copier hors verrou.
+    """
+
+    __slots__ = (
+        "state",
+        "version",
+        "flushed_version",
+        "db_path",
+        "lease_until",
+        "dirty_since",
+        "shared",
+    )
+
+    def __init__(
+        self,
+        state: JsonDict,
+        version: int,
+        db_path: str,
+        lease_until: float = 0.0,
+        shared: bool = False,
+    ) -> None:
+        self.state = state
+        # Version logique (dernière écriture acceptée) et version de la ligne
+        # SQLite ; elles diffèrent tant qu'une écriture différée est en attente.
+        self.version = version
+        self.flushed_version = version
+        self.db_path = db_path
+        # Horloge murale : le bail est lu par les autres processus.
+        self.lease_until = lease_until
+        self.dirty_since: Optional[float] = None
+        # Vrai si un autre worker a écrit ce joueur : plus d'écriture différée.
+        self.shared = shared
+
+
+class PlayerStateCache:
+    """
+    LRU borné de ``CachedState`` + thread d'écriture différée.
+
+    Toute écriture SQLite d'un joueur en cache doit se faire sous
+    ``write_lock_for(player_id)`` : le thread y prend l'instantané de ce
+    joueur, ce qui évite qu'un compare-and-swap parte d'une version déjà
+    dépassée dans ce processus. Une attente SQLite (``busy_timeout``) ne
+    bloque que les joueurs du même verrou.
+    """
+
+    def __init__(
+        self,
+        flusher: StateFlusher,
+        max_entries: int = 2048,
+        flush_interval_ms: int = 500,
+    ) -> None:
+        self._flusher = flusher
+        self.max_entries = max(1, max_entries)
+        self.flush_interval = max(0, flush_interval_ms) / 1000
+        self._write_locks = tuple(threading.RLock() for _ in range(_WRITE_LOCK_STRIPES))
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition(self._lock)
+        self._reset_process_state()
+        if hasattr(os, "register_at_fork"):
+            os.register_at_fork(after_in_child=self._reset_process_state)
+
+    def write_lock_for(self, player_id: str) -> threading.RLock:
+        """Verrou d'écriture (réentrant) de ``player_id``."""
+        return self._write_locks[hash(player_id) % len(self._write_locks)]
+
+    @property
+    def write_behind(self) -> bool:
+        return self.flush_interval > 0
+
+    def configure(self, max_entries: int, flush_interval_ms: int) -> None:
+        """
+        Change taille et délai d'écriture à chaud. Les baux en cours restent
+        valables : ``stage`` compare l'échéance au bail à chaque appel.
+        """
+        with self._lock:
+            self.max_entries = max(1, max_entries)
+            self.flush_interval = max(0, flush_interval_ms) / 1000
+            self._evict_locked()
+            # Le thread recalcule ses échéances avec le nouveau délai.
+            self._wakeup.notify()
+
+    def _reset_process_state(self) -> None:
+        self._entries: OrderedDict[str, CachedState] = OrderedDict()
+        self._thread: Optional[threading.Thread] = None
+        self._closed = False
+        self._hits = 0
+        self._misses = 0
+        self._staged = 0
+        self._flushes = 0
+        self._conflicts = 0
+        self._flush_errors = 0
+        self._evictions = 0
+        self._lease_waits = 0
+
+    # ── Lecture / écriture des entrées ────────────────────────────────────
+
+    def lookup(self, player_id: str, db_path: str) -> Optional[CachedState]:
+        with self._lock:
+            entry = self._entries.get(player_id)
+            if entry is None or entry.db_path != db_path:
+                return None
+            self._entries.move_to_end(player_id)
+            return entry
+
+    def record_lookup(self, hit: bool) -> None:
+        with self._lock:
+            if hit:
+                self._hits += 1
+            else:
+                self._misses += 1
+
+    def record_lease_wait(self) -> None:
+        with self._lock:
+            self._lease_waits += 1
+
+    def store(
+        self,
+        player_id: str,
+        state: JsonDict,
+        version: int,
+        db_path: str,
+        lease_until: float = 0.0,
+        shared: bool = False,
+    ) -> None:
+        """Remplace l'entrée par un état propre (identique à la ligne SQLite)."""
+        with self._lock:
+            previous = self._entries.get(player_id)
+            shared = shared or (previous is not None and previous.shared)
+            self._entries[player_id] = CachedState(
+                state, version, db_path, lease_until, shared
+            )
+            self._entries.move_to_end(player_id)
+            self._evict_locked()
+
+    def store_loaded(
+        self,
+        player_id: str,
+        state: JsonDict,
+        version: int,
+        db_path: str,
+        shared: bool = False,
+    ) -> bool:
+        """
+        Comme ``store`` pour un état relu hors verrou d'écriture : n'écrase pas
+        une entrée plus récente ou en attente d'écriture, qu'un autre thread
+        du processus a pu poser entre la lecture SQLite et cet appel.
+        """
+        with self._lock:
+            previous = self._entries.get(player_id)
+            if (
+                previous is not None
+                and previous.db_path == db_path
+                and (previous.version > version or previous.dirty_since is not None)
+            ):
+                return False
+            shared = shared or (previous is not None and previous.shared)
+            self._entries[player_id] = CachedState(state, version, db_path, 0.0, shared)
+            self._entries.move_to_end(player_id)
+            self._evict_locked()
+            return True
+
+    def stage(
+        self,
+        player_id: str,
+        state: JsonDict,
+        db_path: str,
+        expected_version: Optional[int] = None,
+    ) -> Optional[int]:
+        """
+        Enregistre ``state`` sans écrire en base si le bail le permet et
+        retourne la nouvelle version.
+
+        Retourne None si l'appelant doit écrire lui-même (entrée absente,
+        partagée entre workers, ou bail trop court pour couvrir l'échéance).
+        Lève ``StateConflictError`` si ``expected_version`` est dépassée.
+        """
+        if not self.write_behind or self._closed:
+            return None
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(player_id)
+            if entry is None or entry.db_path != db_path or entry.shared:
+                return None
+            dirty_since = entry.dirty_since if entry.dirty_since is not None else now
+            if dirty_since + self.flush_interval >= entry.lease_until:
+                return None
+            if expected_version is not None and entry.version != expected_version:
+                # Sous bail, l'entrée fait foi : inutile d'interroger SQLite.
+                raise StateConflictError(player_id, expected_version)
+            entry.state = state
+            entry.version += 1
+            entry.dirty_since = dirty_since
+            self._entries.move_to_end(player_id)
+            self._staged += 1
+            self._ensure_started_locked()
+            self._wakeup.notify()
+            return entry.version
+
+    def mark_shared(self, player_id: str) -> None:
+        with self._lock:
+            entry = self._entries.get(player_id)
+            if entry is not None:
+                entry.shared = True
+
+    def discard(self, player_id: str) -> None:
+        with self._lock:
+            self._entries.pop(player_id, None)
+
+    def discard_clean(self, player_id: str) -> None:
+        """
+        Oublie l'entrée sauf si elle porte des écritures en attente : posées
+        par un autre thread du processus, elles restent à écrire (le
+        compare-and-swap du flush tranche si un autre worker a écrit).
+        """
+        with self._lock:
+            entry = self._entries.get(player_id)
+            if entry is not None and entry.dirty_since is None:
+                del self._entries[player_id]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    # ── Écriture différée ─────────────────────────────────────────────────
+
+    def flush(self, player_id: Optional[str] = None) -> None:
+        """Écrit maintenant les états en attente (d'un joueur, ou de tous)."""
+        if player_id is not None:
+            self._flush_players([player_id], None)
+            return
+        with self._lock:
+            player_ids = self._due_locked(None)
+        self._flush_players(player_ids, None)
+
+    def close(self) -> None:
+        """Écrit tout ce qui est en attente puis arrête le thread."""
+        with self._lock:
+            self._closed = True
+            thread = self._thread
+            self._wakeup.notify()
+        if thread is not None and thread.is_alive():
+            thread.join(5.0)
+        self.flush()
+
+    def stats(self) -> JsonDict:
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "dirty": sum(
+                    1 for e in self._entries.values() if e.dirty_since is not None
+                ),
+                "write_behind_ms": int(self.flush_interval * 1000),
+                "hits": self._hits,
+                "misses": self._misses,
+                "staged": self._staged,
+                "flushes": self._flushes,
+                "conflicts": self._conflicts,
+                "flush_errors": self._flush_errors,
+                "evictions": self._evictions,
+                "lease_waits": self._lease_waits,
+                "hit_rate": round(self._hits / lookups, 4) if lookups else 0.0,
+            }
+
+    def _evict_locked(self) -> None:
+        # Les entrées en attente d'écriture ne sont jamais évincées : le cache
+        # peut déborder brièvement, jusqu'au prochain passage du thread.
+        overflow = len(self._entries) - self.max_entries
+        if overflow <= 0:
+            return
+        for player_id in list(self._entries):
+            if overflow <= 0:
+                break
+            if self._entries[player_id].dirty_since is None:
+                del self._entries[player_id]
+                self._evictions += 1
+                overflow -= 1
+
+    def _due_locked(self, now: Optional[float]) -> list[str]:
+        """Joueurs dont l'écriture est échue (tous les différés si ``now`` est None)."""
+        return [
+            pid
+            for pid, entry in self._entries.items()
+            if entry.dirty_since is not None
+            and (now is None or entry.dirty_since + self.flush_interval <= now)
+        ]
+
+    def _take_locked(self, player_id: str, now: Optional[float]) -> list[_Snapshot]:
+        """Instantané de ``player_id`` si son écriture est échue."""
+        entry = self._entries.get(player_id)
+        if entry is None or entry.dirty_since is None:
+            return []
+        if now is not None and entry.dirty_since + self.flush_interval > now:
+            return []
+        entry.dirty_since = None
+        return [
+            (
+                player_id,
+                entry.state,
+                entry.version,
+                entry.flushed_version,
+                entry.db_path,
+            )
+        ]
+
+    def _flush_players(self, player_ids: list[str], now: Optional[float]) -> None:
+        # Un joueur à la fois sous son verrou : instantané et écriture ne
+        # bloquent pas les autres joueurs.
+        for player_id in player_ids:
+            with self.write_lock_for(player_id):
+                with self._lock:
+                    snapshots = self._take_locked(player_id, now)
+                self._write(snapshots)
+
+    def _next_deadline_locked(self) -> Optional[float]:
+        deadlines = [
+            entry.dirty_since + self.flush_interval
+            for entry in self._entries.values()
+            if entry.dirty_since is not None
+        ]
+        return min(deadlines) if deadlines else None
+
+    def _ensure_started_locked(self) -> None:
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(
+            target=self._run, name="state-cache-flusher", daemon=True
+        )
+        self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            with self._lock:
+                while not self._closed:
+                    deadline = self._next_deadline_locked()
+                    if deadline is not None and deadline <= time.time():
+                        break
+                    timeout = None if deadline is None else deadline - time.time()
+                    self._wakeup.wait(timeout)
+                if self._closed:
+                    return
+            now = time.time()
+            with self._lock:
+                player_ids = self._due_locked(now)
+            self._flush_players(player_ids, now)
+
+    def _write(self, snapshots: list[_Snapshot]) -> None:
+        for player_id, state, version, flushed_version, db_path in snapshots:
+            try:
+                written = self._flusher(
+                    player_id, state, version, flushed_version, db_path
+                )
+            except Exception as exc:  # le thread ne doit jamais mourir
+                logger.warning("State flush for %s failed: %s", player_id, exc)
+                with self._lock:
+                    self._flush_errors += 1
+                    entry = self._entries.get(player_id)
+                    if entry is not None and entry.dirty_since is None:
+                        # Nouvel essai à la prochaine fenêtre.
+                        entry.dirty_since = time.time()
+                continue
+            with self._lock:
+                entry = self._entries.get(player_id)
+                if not written:
+                    # Un autre worker a écrit ce joueur : son état fait foi.
+                    self._conflicts += 1
+                    self._entries.pop(player_id, None)
+                    logger.warning("State flush for %s lost a version race", player_id)
+                    continue
+                self._flushes += 1
+                if entry is not None and entry.flushed_version == flushed_version:
+                    entry.flushed_version = version
@@ -0,0 +1,251 @@
+"""
+Encodage compact de l'état joueur — LUNA Hors Connexion.
+
+Remplace le JSON de ``story_saves.state_json`` par un BLOB versionné :
+
+    b"LQS" | version (1 octet) | options (1 octet) | corps (éventuellement zlib)
+
+Le corps commence par un masque ``uint16`` des champs connus présents, suivi
+de leurs valeurs dans l'ordre de ``_FIELDS`` :
+
+- entiers : ``int32`` petit-boutiste ;
+- chaînes : longueur ``uint16`` + UTF-8 (``0xFFFF`` = None) ;
+- listes d'identifiants (flags, fins, secrets, chapitres) : un octet de
+  longueur + un octet par identifiant, indice dans ``_INTERNED``.
+
+Toute valeur hors de ce schéma (type inattendu, flag inconnu, clé en plus)
+part dans un reliquat JSON en fin de corps : l'encodage reste sans perte.
+"""
+
+import json
+import struct
+import zlib
+from collections.abc import Callable, Iterable
+from typing import Any, Optional
+
+from core import json_codec
+
+JsonDict = dict[str, Any]
+
+MAGIC = b"LQS"
+CODEC_VERSION = 1
+_OPT_ZLIB = 0x01
+
+# Table d'identifiants internés. AJOUT EN FIN UNIQUEMENT : l'indice de chaque
+# identifiant est écrit dans les sauvegardes existantes, la table ne peut donc
+# pas être recalculée depuis story.json (un id inséré décalerait les suivants).
+# ``scripts/compile_story.py --check`` échoue si un id de l'histoire manque.
+_INTERNED: tuple[str, ...] = (
+    # Chapitres
+    "chapitre_0",
+    "chapitre_1",
+    "chapitre_2",
+    "chapitre_3",
+    "chapitre_4",
+    "chapitre_5",
+    "chapitre_6",
+    "fin_a",
+    "fin_b",
+    "fin_c",
+    "fin_d",
+    # Fins
+    "ending_a",
+    "ending_b",
+    "ending_c",
+    "ending_d",
+    # Flags narratifs
+    "abandoned_nexus",
+    "accepted_chapter_0",
+    "agreed_to_pause_luna",
+    "chose_pandora_public",
+    "corp_knows_someone_accessed",
+    "ending_a_path",
+    "ending_b_path",
+    "ending_c_path",
+    "ending_d_path",
+    "ghost_protocol",
+    "knows_about_miroir",
+    "listened_to_corp",
+    "listened_to_nexus",
+    "looked_at_pandora",
+    "nexus_considering",
+    "nexus_helped",
+    "pandora_public",
+    "questioned_pandora_early",
+    "reassured_luna",
+    "saw_luna_logs",
+    "tried_nexus",
+    # Secrets
+    "ghost-entry",
+    "perfect-trust",
+    "double-agent",
+    "pandora-scout",
+    "nexus-gambit",
+)
+_INTERN_INDEX: dict[str, int] = {value: idx for idx, value in enumerate(_INTERNED)}
+
+
+def missing_interned(ids: Iterable[str]) -> list[str]:
+    """Identifiants absents de ``_INTERNED`` (encodés dans le reliquat JSON)."""
+    return sorted({value for value in ids if value not in _INTERN_INDEX})
+
+
+_HEADER = struct.Struct("<3sBB")
+_U16 = struct.Struct("<H")
+_I32 = struct.Struct("<i")
+_NONE_STR = 0xFFFF
+
+_INT, _STR, _IDS = range(3)
+# Ordre figé : le bit i du masque correspond à _FIELDS[i] (ajout en fin).
+_FIELDS: tuple[tuple[str, int], ...] = (
+    ("current_chapter", _STR),
+    ("current_scene", _STR),
+    ("luna_trust", _INT),
+    ("xp", _INT),
+    ("flags", _IDS),
+    ("chapters_completed", _IDS),
+    ("endings_unlocked", _IDS),
+    ("last_luna_reaction", _STR),
+    ("player_name", _STR),
+    ("previous_endings", _IDS),
+    ("threat_level", _INT),
+    ("secrets_found", _IDS),
+)
+_FIELD_KEYS = frozenset(key for key, _ in _FIELDS)
+_FIELD_BITS: tuple[tuple[int, str, int], ...] = tuple(
+    (1 << bit, key, kind) for bit, (key, kind) in enumerate(_FIELDS)
+)
+
+
+def _encode_int(value: object) -> Optional[bytes]:
+    if type(value) is not int:  # bool exclu : il doit rester un bool
+        return None
+    try:
+        return _I32.pack(value)
+    except struct.error:
+        return None
+
+
+def _encode_str(value: object) -> Optional[bytes]:
+    if value is None:
+        return _U16.pack(_NONE_STR)
+    if not isinstance(value, str):
+        return None
+    raw = value.encode("utf-8")
+    if len(raw) >= _NONE_STR:
+        return None
+    return _U16.pack(len(raw)) + raw
+
+
+def _encode_ids(value: object) -> Optional[bytes]:
+    if not isinstance(value, list) or len(value) > 0xFF:
+        return None
+    try:
+        return bytes([len(value), *map(_INTERN_INDEX.__getitem__, value)])
+    except (KeyError, TypeError):
+        return None
+
+
+_ENCODERS: dict[int, Callable[[object], Optional[bytes]]] = {
+    _INT: _encode_int,
+    _STR: _encode_str,
+    _IDS: _encode_ids,
+}
+
+
+def encode_state(state: JsonDict, compress_min_bytes: int = 256) -> bytes:
+    """
+    Encode un état joueur. Le corps est compressé (zlib) s'il dépasse
+    ``compress_min_bytes`` et que la compression le réduit ; 0 la désactive.
+    """
+    present = 0
+    parts: list[bytes] = []
+    extras: JsonDict = {}
+    for mask, key, kind in _FIELD_BITS:
+        if key not in state:
+            continue
+        value = state[key]
+        encoded = _ENCODERS[kind](value)
+        if encoded is None:
+            extras[key] = value
+            continue
+        present |= mask
+        parts.append(encoded)
+    for key, value in state.items():
+        if key not in _FIELD_KEYS:
+            extras[key] = value
+
+    body = _U16.pack(present) + b"".join(parts)
+    if extras:
+        body += json_codec.dumps_bytes(extras)
+    options = 0
+    if compress_min_bytes and len(body) >= compress_min_bytes:
+        compressed = zlib.compress(body, 6)
+        if len(compressed) < len(body):
+            body = compressed
+            options |= _OPT_ZLIB
+    return _HEADER.pack(MAGIC, CODEC_VERSION, options) + body
+
+
+def is_encoded_state(raw: object) -> bool:
+    return isinstance(raw, bytes) and raw[:3] == MAGIC
+
+
+def decode_state(raw: bytes) -> JsonDict:
+    """Décode un BLOB produit par ``encode_state`` (``ValueError`` si invalide)."""
+    try:
+        magic, version, options = _HEADER.unpack_from(raw)
+    except struct.error as exc:
+        raise ValueError("truncated state header") from exc
+    if magic != MAGIC or version != CODEC_VERSION:
+        raise ValueError(f"unsupported state codec {magic!r} v{version}")
+    body = raw[_HEADER.size :]
+    if options & _OPT_ZLIB:
+        try:
+            body = zlib.decompress(body)
+        except zlib.error as exc:
+            raise ValueError("corrupt compressed state") from exc
+
+    try:
+        return _decode_body(body)
+    except (struct.error, IndexError, UnicodeDecodeError) as exc:
+        raise ValueError("corrupt state payload") from exc
+
+
+def _decode_body(body: bytes) -> JsonDict:
+    (present,) = _U16.unpack_from(body)
+    offset = _U16.size
+    state: JsonDict = {}
+    for mask, key, kind in _FIELD_BITS:
+        if not present & mask:
+            continue
+        if kind == _INT:
+            (state[key],) = _I32.unpack_from(body, offset)
+            offset += _I32.size
+        elif kind == _STR:
+            (length,) = _U16.unpack_from(body, offset)
+            offset += _U16.size
+            if length == _NONE_STR:
+                state[key] = None
+            else:
+                raw = body[offset : offset + length]
+                if len(raw) != length:
+                    raise IndexError("truncated string")
+                state[key] = raw.decode("utf-8")
+                offset += length
+        else:
+            count = body[offset]
+            ids = body[offset + 1 : offset + 1 + count]
+            if len(ids) != count:
+                raise IndexError("truncated id list")
+            state[key] = list(map(_INTERNED.__getitem__, ids))
+            offset += 1 + count
+    if offset < len(body):
+        try:
+            extras = json_codec.loads(body[offset:])
+        except json.JSONDecodeError as exc:
+            raise ValueError("corrupt state extras") from exc
+        if not isinstance(extras, dict):
+            raise ValueError("corrupt state extras")
+        state.update(extras)
+    return state
@@ -0,0 +1,334 @@
+"""
+Compilation et validation de story.json — LUNA Hors Connexion.
+
+Au build :
+
+    python scripts/compile_story.py           # valide + écrit le cache compilé
+    python scripts/compile_story.py --check   # valide seulement (CI)
+
+Le cache (``data/story.compiled.pickle``, ``STORY_COMPILED_PATH``) contient le
+JSON brut et le ``StoryGraph`` compilé, indexés par le SHA-256 du fichier
+source et la forme des objets du graphe. Au démarrage d'un worker,
+``load_compiled_story`` le reprend tel quel si la clé correspond ; sinon le
+JSON est recompilé et validé à la volée (cache absent ou périmé).
+
+``data/`` est accessible en écriture à l'application : la clé est une ligne
+d'en-tête comparée avant tout décodage, et le corps pickle est lu par un
+``Unpickler`` qui ne résout que les classes du graphe. Un fichier forgé ne
+peut donc rien appeler d'autre (``os.system``…) au démarrage.
+"""
+
+import argparse
+import hashlib
+import logging
+import os
+import pickle  # nosec B403 — classes restreintes par _GraphUnpickler
+import sys
+from collections.abc import Sequence
+from typing import Any, NamedTuple, Optional, cast
+
+from core import json_codec
+from core.state_codec import missing_interned
+from core.story_graph import (
+    Chapter,
+    Choice,
+    DialogueTemplate,
+    Ending,
+    Scene,
+    ScenePosition,
+    StoryGraph,
+    compile_story,
+)
+
+logger = logging.getLogger(__name__)
+
+JsonDict = dict[str, Any]
+
+STORY_PATH = os.path.join(os.path.dirname(__file__), "..", "data", "story.json")
+COMPILED_PATH = os.environ.get(
+    "STORY_COMPILED_PATH",
+    os.path.join(os.path.dirname(__file__), "..", "data", "story.compiled.pickle"),
+)
+# À incrémenter si la compilation change sans changer les champs des objets.
+COMPILED_FORMAT = 2
+_CACHE_MAGIC = "LUNA-STORY"
+_GRAPH_SHAPE = tuple(
+    (cls.__name__, cls._fields)
+    for cls in (
+        StoryGraph,
+        Chapter,
+        Scene,
+        ScenePosition,
+        Choice,
+        Ending,
+        DialogueTemplate,
+    )
+)
+
+
+class StoryIssue(NamedTuple):
+    severity: str  # "error" | "warning"
+    code: str
+    message: str
+
+
+class CompiledStory(NamedTuple):
+    source_hash: str
+    story: JsonDict
+    graph: StoryGraph
+    issues: tuple[StoryIssue, ...]
+
+    @property
+    def errors(self) -> tuple[StoryIssue, ...]:
+        return tuple(i for i in self.issues if i.severity == "error")
+
+
+class InvalidStoryError(ValueError):
+    """story.json comporte des erreurs de validation : il n'est pas servi."""
+
+    def __init__(self, issues: Sequence[StoryIssue]) -> None:
+        super().__init__(
+            f"story.json invalide ({len(issues)} erreurs) : "
+            + "; ".join(issue.message for issue in issues[:3])
+        )
+        self.issues = tuple(issues)
+
+
+# ── Validation ────────────────────────────────────────────────────────────
+
+
+def validate_story(story: JsonDict, graph: StoryGraph) -> list[StoryIssue]:
+    """
+    Erreurs : références ``next_scene``/``next_chapter`` pendantes, ids en
+    double, chapitre vide ou sans fin, fin dont un flag requis n'est posé par
+    aucun choix atteignable. Avertissement : scène inatteignable.
+    """
+    issues: list[StoryIssue] = []
+
+    def error(code: str, message: str) -> None:
+        issues.append(StoryIssue("error", code, message))
+
+    raw_chapters = cast(list[JsonDict], story.get("chapters", []))
+    if len(graph.chapters) != len(raw_chapters):
+        error("duplicate_chapter", "Identifiants de chapitre en double")
+    if len(graph.scenes) != sum(len(c.scene_ids) for c in graph.chapters.values()):
+        error("duplicate_scene", "Identifiants de scène en double")
+
+    for chapter in graph.chapters.values():
+        scenes = [graph.scenes[sid] for sid in chapter.scene_ids]
+        if not scenes:
+            error("empty_chapter", f"Chapitre {chapter.id} sans scène")
+        elif not any(s.is_chapter_end or s.is_ending_final for s in scenes):
+            error("chapter_without_end", f"Chapitre {chapter.id} sans scène de fin")
+        for scene in scenes:
+            if scene.next_chapter and scene.next_chapter not in graph.chapters:
+                error(
+                    "dangling_next_chapter",
+                    f"{scene.id} → chapitre inconnu {scene.next_chapter}",
+                )
+            if scene.is_chapter_end and not scene.next_chapter:
+                error("chapter_end_without_next", f"{scene.id} sans next_chapter")
+            for choice in scene.choices:
+                if choice.next_scene and choice.next_scene not in graph.scenes:
+                    error(
+                        "dangling_next_scene",
+                        f"{scene.id}/{choice.id} → scène inconnue {choice.next_scene}",
+                    )
+
+    reachable, reachable_flags = _walk(graph)
+    for scene_id in graph.scenes:
+        if scene_id not in reachable:
+            issues.append(
+                StoryIssue(
+                    "warning", "unreachable_scene", f"Scène {scene_id} inatteignable"
+                )
+            )
+    for ending in graph.endings:
+        missing = sorted(set(ending.required_flags) - reachable_flags)
+        if missing:
+            error(
+                "unreachable_ending",
+                f"Fin {ending.id} : flags jamais posés {', '.join(missing)}",
+            )
+        if ending.min_trust > 100:
+            error("unreachable_ending", f"Fin {ending.id} : min_trust > 100")
+    return issues
+
+
+def codec_issues(graph: StoryGraph, extra_ids: Sequence[str] = ()) -> list[StoryIssue]:
+    """
+    Erreurs de build : identifiants persistés dans les sauvegardes (chapitres,
+    fins, flags, plus ``extra_ids``) absents de la table d'internement de
+    ``core/state_codec.py``. Le jeu fonctionne, mais chaque sauvegarde qui
+    les contient repasse par le reliquat JSON.
+    """
+    ids = [*graph.chapters, *(e.id for e in graph.endings), *graph.flag_bits]
+    return [
+        StoryIssue(
+            "error",
+            "uninterned_id",
+            f"{value} absent de state_codec._INTERNED (à ajouter en fin de table)",
+        )
+        for value in missing_interned([*ids, *extra_ids])
+    ]
+
+
+def _walk(graph: StoryGraph) -> tuple[set[str], set[str]]:
+    """Scènes atteignables depuis la première, et flags posés en chemin."""
+    first_chapter = next(iter(graph.chapters.values()), None)
+    start = first_chapter.first_scene_id if first_chapter else None
+    to_visit = [start] if start else []
+    reachable: set[str] = set()
+    flags: set[str] = set()
+    while to_visit:
+        scene_id = to_visit.pop()
+        scene = graph.scenes.get(scene_id)
+        if scene is None or scene_id in reachable:
+            continue
+        reachable.add(scene_id)
+        for choice in scene.choices:
+            flags.update(choice.flags)
+            if choice.next_scene:
+                to_visit.append(choice.next_scene)
+        if scene.is_chapter_end and scene.next_chapter:
+            chapter = graph.chapters.get(scene.next_chapter)
+            if chapter and chapter.first_scene_id:
+                to_visit.append(chapter.first_scene_id)
+    return reachable, flags
+
+
+# ── Cache compilé ─────────────────────────────────────────────────────────
+
+
+def _cache_header(source_hash: str) -> bytes:
+    shape = hashlib.sha256(repr(_GRAPH_SHAPE).encode()).hexdigest()[:16]
+    return f"{_CACHE_MAGIC} {COMPILED_FORMAT} {shape} {source_hash}\n".encode()
+
+
+class _GraphUnpickler(pickle.Unpickler):  # nosec B301
+    """N'instancie que les classes d'une histoire compilée."""
+
+    _ALLOWED: dict[tuple[str, str], type[Any]] = {}
+
+    def find_class(self, module: str, name: str) -> Any:
+        cls = self._ALLOWED.get((module, name))
+        if cls is None:
+            raise pickle.UnpicklingError(f"classe interdite : {module}.{name}")
+        return cls
+
+
+_GraphUnpickler._ALLOWED = {
+    (cls.__module__, cls.__qualname__): cls
+    for cls in (
+        CompiledStory,
+        StoryIssue,
+        StoryGraph,
+        Chapter,
+        Scene,
+        ScenePosition,
+        Choice,
+        Ending,
+        DialogueTemplate,
+    )
+}
+
+
+def compile_story_source(raw: bytes) -> CompiledStory:
+    story = cast(JsonDict, json_codec.loads(raw))
+    graph = compile_story(story)
+    return CompiledStory(
+        source_hash=hashlib.sha256(raw).hexdigest(),
+        story=story,
+        graph=graph,
+        issues=tuple(validate_story(story, graph)),
+    )
+
+
+def write_compiled_story(compiled: CompiledStory, cache_path: str) -> None:
+    """Écriture atomique : un worker ne lit jamais un cache à moitié écrit."""
+    tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(_cache_header(compiled.source_hash))
+        pickle.dump(compiled, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, cache_path)
+
+
+def _read_cache(cache_path: str, source_hash: str) -> Optional[CompiledStory]:
+    header = _cache_header(source_hash)
+    try:
+        with open(cache_path, "rb") as f:
+            # Clé vérifiée avant de décoder quoi que ce soit du corps.
+            if f.readline(len(header)) != header:
+                return None
+            compiled = _GraphUnpickler(f).load()
+    except FileNotFoundError:
+        return None
+    except Exception as exc:  # cache corrompu, forgé ou d'une autre version
+        logger.warning("Ignoring unreadable story cache %s: %s", cache_path, exc)
+        return None
+    if not isinstance(compiled, CompiledStory):
+        return None
+    return compiled
+
+
+def load_compiled_story(
+    story_path: str = STORY_PATH, cache_path: Optional[str] = COMPILED_PATH
+) -> CompiledStory:
+    """
+    Histoire compilée pour ``story_path`` : depuis le cache si sa clé
+    correspond au fichier, sinon compilée et validée à la volée.
+    """
+    with open(story_path, "rb") as f:
+        raw = f.read()
+    if cache_path:
+        cached = _read_cache(cache_path, hashlib.sha256(raw).hexdigest())
+        if cached is not None:
+            return cached
+
+    compiled = compile_story_source(raw)
+    for issue in compiled.errors:
+        logger.error("story.json: %s", issue.message)
+    return compiled
+
+
+# ── Commande de build ─────────────────────────────────────────────────────
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="compile_story.py",
+        description="Valide story.json et écrit le cache compilé.",
+    )
+    parser.add_argument("--story", default=STORY_PATH)
+    parser.add_argument("--output", default=COMPILED_PATH)
+    parser.add_argument(
+        "--check", action="store_true", help="valider sans écrire le cache"
+    )
+    parser.add_argument(
+        "--strict", action="store_true", help="les avertissements font échouer"
+    )
+    args = parser.parse_args(argv)
+
+    from core.story_engine import SECRET_RULES  # import tardif : cycle
+
+    with open(args.story, "rb") as f:
+        compiled = compile_story_source(f.read())
+    issues = [
+        *compiled.issues,
+        *codec_issues(compiled.graph, [rule.id for rule in SECRET_RULES]),
+    ]
+    for issue in issues:
+        print(f"{issue.severity}: [{issue.code}] {issue.message}", file=sys.stderr)
+
+    errors = [issue for issue in issues if issue.severity == "error"]
+    failed = bool(errors) or (args.strict and bool(issues))
+    if failed:
+        print("story.json invalide : cache non écrit.", file=sys.stderr)
+        return 1
+    if not args.check:
+        write_compiled_story(compiled, args.output)
+        print(
+            f"{len(compiled.graph.scenes)} scènes compilées → {args.output}",
+            file=sys.stderr,
+        )
+    return 0
@@ -5,34 +5,130 @@ Charge story.json, gère la progression du joueur, calcule les scènes suivantes
 met à jour le score de confiance LUNA et détermine les fins accessibles.
 """
 
-import json
+import logging
 import os
-from typing import Any, Optional, cast
+import threading
+import time
+from collections.abc import Sequence
+from functools import lru_cache
+from typing import Any, NamedTuple, Optional, cast
+
+from core import json_codec
+from core.player_sets import PlayerSets
+from core.story_compiler import (
+    STORY_PATH,
+    CompiledStory,
+    InvalidStoryError,
+    load_compiled_story,
+)
+from core.story_graph import (
+    Scene,
+    ScenePosition,
+    StoryGraph,
+    flag_mask,
+)
+
+logger = logging.getLogger(__name__)
 
 JsonDict = dict[str, Any]
 PlayerState = dict[str, Any]
 
-STORY_PATH = os.path.join(os.path.dirname(__file__), "..", "data", "story.json")
-TOTAL_SECRETS = 5
+# Dialogues rendus gardés en mémoire (scènes d'ouverture de chapitre).
+DIALOGUE_CACHE_SIZE = 1024
+# Fragments JSON pré-encodés par (scène, chapitre) : une entrée par scène en
+# pratique, la marge couvre les états dont le chapitre ne suit pas la scène.
+SCENE_FRAGMENT_CACHE_SIZE = 512
 
 
-class StoryEngine:
-    def __init__(self):
-        self._story: JsonDict = {}
-        self._chapters_index: dict[str, JsonDict] = {}
-        self._scenes_index: dict[str, JsonDict] = {}
-        self._scene_to_chapter_index: dict[str, str] = {}
-        self._load_story()
+class SecretRule(NamedTuple):
+    """Condition d'un secret : toutes les parties renseignées doivent tenir."""
+
+    id: str
+    required_flags: tuple[str, ...] = ()
+    min_trust: Optional[int] = None
+    # (scène, choix) qui déclenche le secret.
+    choice: Optional[tuple[str, str]] = None
+
+
+# Ordre de déblocage quand plusieurs secrets tombent sur le même choix.
+SECRET_RULES = (
+    SecretRule("ghost-entry", choice=("s6_0", "c6_0_c")),
+    SecretRule("perfect-trust", min_trust=95),
+    SecretRule("double-agent", ("listened_to_corp", "nexus_helped")),
+    SecretRule("pandora-scout", ("looked_at_pandora", "pandora_public")),
+    SecretRule("nexus-gambit", ("tried_nexus", "abandoned_nexus")),
+)
+TOTAL_SECRETS = len(SECRET_RULES)
+
+MAIN_CHAPTERS = frozenset(f"chapitre_{n}" for n in range(7))
 
-    def _load_story(self) -> None:
-        with open(STORY_PATH, encoding="utf-8") as f:
-            self._story = cast(JsonDict, json.load(f))
+ENDING_NAMES = {
+    "ending_a": "La Fusion",
+    "ending_b": "Le Sacrifice",
+    "ending_c": "PANDORA",
+}
 
-        for chapter in cast(list[JsonDict], self._story["chapters"]):
-            self._chapters_index[chapter["id"]] = chapter
-            for scene in cast(list[JsonDict], chapter["scenes"]):
-                self._scenes_index[scene["id"]] = scene
-                self._scene_to_chapter_index[scene["id"]] = chapter["id"]
+
+class StoryEngine:
+    def __init__(self, compiled: Optional[CompiledStory] = None):
+        self._story: JsonDict = {}
+        self._graph = StoryGraph({}, {}, {}, (), 0, {})
+        # Index flag → secrets, construit avec le graphe (voir _index_secrets).
+        self._flag_bits: dict[str, int] = {}
+        self._secret_masks: tuple[int, ...] = ()
+        self._secrets_by_flag: dict[str, tuple[int, ...]] = {}
+        self._secrets_by_choice: dict[tuple[str, str], tuple[int, ...]] = {}
+        self._trust_secrets: tuple[int, ...] = ()
+        self._render_opening = lru_cache(maxsize=DIALOGUE_CACHE_SIZE)(
+            self._render_dialogue
+        )
+        self._scene_fragment = lru_cache(maxsize=SCENE_FRAGMENT_CACHE_SIZE)(
+            self._encode_scene_fragment
+        )
+        self.source_hash = ""
+        self._load_story(compiled or load_compiled_story(STORY_PATH))
+
+    def _load_story(self, compiled: CompiledStory) -> None:
+        # Histoire déjà compilée et validée (cache de build ou compilation
+        # au démarrage, voir core/story_compiler.py).
+        self.source_hash = compiled.source_hash
+        # JSON brut gardé pour ``meta`` ; le chemin par requête ne lit que le
+        # graphe compilé.
+        self._story = compiled.story
+        self._graph = compiled.graph
+        self._index_secrets()
+
+    def _index_secrets(self) -> None:
+        """
+        Précalcule, pour chaque flag, les secrets qu'il peut débloquer : après
+        un choix, seuls ces secrets (plus ceux liés au choix lui-même ou à la
+        confiance, qui bouge à chaque choix) sont réévalués.
+        """
+        # Bits du graphe, prolongés par les flags que seuls les secrets citent.
+        flag_bits = dict(self._graph.flag_bits)
+        for rule in SECRET_RULES:
+            for flag in rule.required_flags:
+                flag_bits.setdefault(flag, 1 << len(flag_bits))
+
+        by_flag: dict[str, list[int]] = {}
+        by_choice: dict[tuple[str, str], list[int]] = {}
+        for index, rule in enumerate(SECRET_RULES):
+            for flag in rule.required_flags:
+                by_flag.setdefault(flag, []).append(index)
+            if rule.choice is not None:
+                by_choice.setdefault(rule.choice, []).append(index)
+
+        self._flag_bits = flag_bits
+        self._secret_masks = tuple(
+            flag_mask(flag_bits, rule.required_flags) for rule in SECRET_RULES
+        )
+        self._secrets_by_flag = {k: tuple(v) for k, v in by_flag.items()}
+        self._secrets_by_choice = {k: tuple(v) for k, v in by_choice.items()}
+        self._trust_secrets = tuple(
+            index
+            for index, rule in enumerate(SECRET_RULES)
+            if rule.min_trust is not None
+        )
 
     # ------------------------------------------------------------------ #
     #  État initial d'un nouveau joueur                                    #
@@ -60,76 +156,104 @@ class StoryEngine:
 
     def get_state(self, player_state: PlayerState) -> JsonDict:
         scene_id = str(player_state.get("current_scene", "s0_0"))
-        scene = self._scenes_index.get(scene_id)
+        scene = self._graph.scenes.get(scene_id)
 
         if not scene:
             return {"error": "Scène introuvable", "scene_id": scene_id}
 
         chapter_id = str(player_state.get("current_chapter", "chapitre_0"))
-        chapter = self._chapters_index.get(chapter_id, {})
+        return {
+            **self._scene_fields(scene_id, chapter_id),
+            **self._player_fields(player_state, scene),
+        }
 
-        # Filtrer les choix selon les flags du joueur si nécessaire
-        choices = cast(list[JsonDict], scene.get("choices", []))
+    def get_state_json(
+        self, player_state: PlayerState, extra: Optional[JsonDict] = None
+    ) -> str:
+        """
+        ``get_state`` (plus ``extra``) encodé en objet JSON. La partie qui ne
+        dépend que de la scène est encodée une fois puis reprise telle quelle ;
+        seuls les champs du joueur sont sérialisés à chaque appel.
+        """
+        scene_id = str(player_state.get("current_scene", "s0_0"))
+        scene = self._graph.scenes.get(scene_id)
+        if not scene:
+            return json_codec.dumps({**self.get_state(player_state), **(extra or {})})
 
-        player_name = str(player_state.get("player_name") or "")
-        raw_dialogue = str(scene.get("dialogue", ""))
-        # Substitution du prénom dans le dialogue
-        if player_name:
-            dialogue = raw_dialogue.replace("{name}", player_name).replace(
-                "{{joueur}}", player_name
-            )
+        chapter_id = str(player_state.get("current_chapter", "chapitre_0"))
+        player_fields = self._player_fields(player_state, scene)
+        if extra:
+            player_fields.update(extra)
+        fragment = self._scene_fragment(scene_id, chapter_id)
+        return "{" + fragment + "," + json_codec.dumps(player_fields)[1:]
+
+    def _scene_fields(self, scene_id: str, chapter_id: str) -> JsonDict:
+        """Champs de ``get_state`` qui ne dépendent que de la scène et du chapitre."""
+        scene = self._graph.scenes[scene_id]
+        chapter = self._graph.chapters.get(chapter_id)
+
+        # Progression dans le chapitre courant (position précalculée ; une
+        # scène hors du chapitre courant est affichée en première position).
+        position = scene.position
+        if position.chapter_id == chapter_id:
+            scene_index, scene_total = position.scene_index, position.scene_total
         else:
-            dialogue = raw_dialogue.replace("{name}", "").replace(
-                "{{joueur}}", "joueur"
-            )
-
-        # Mémoire des fins précédentes — injectée dans la scène d'ouverture s0_0
-        previous = cast(list[str], player_state.get("previous_endings", []))
-        if scene_id == "s0_0" and previous:
-            dialogue = self._inject_memory(dialogue, previous, player_name or "joueur")
-
-        # Progression dans le chapitre courant
-        chapter_scenes = cast(list[JsonDict], chapter.get("scenes", []))
-        scene_index_in_chapter = next(
-            (i for i, s in enumerate(chapter_scenes) if s["id"] == scene_id), 0
-        )
+            scene_index = 1
+            scene_total = len(chapter.scene_ids) if chapter else 0
 
         return {
             "chapter_id": chapter_id,
-            "chapter_title": str(chapter.get("title", "")),
-            "chapter_atmosphere": str(chapter.get("atmosphere", "dark")),
-            "chapter_progress": self._get_chapter_progress(player_state),
-            "total_chapters": int(
-                cast(JsonDict, self._story.get("meta", {})).get("total_chapters", 7)
-            ),
-            "scene_index": scene_index_in_chapter + 1,
-            "scene_total": len(chapter_scenes),
+            "chapter_title": chapter.title if chapter else "",
+            "chapter_atmosphere": chapter.atmosphere if chapter else "dark",
+            "total_chapters": self._graph.total_chapters,
+            "scene_index": scene_index,
+            "scene_total": scene_total,
             "scene_id": scene_id,
-            "luna_emotion": str(scene.get("luna_emotion", "neutre")),
-            "luna_trust": int(player_state.get("luna_trust", 50)),
-            "context": str(scene.get("context", "")),
-            "dialogue": dialogue,
+            "luna_emotion": scene.luna_emotion,
+            "context": scene.context,
             "choices": [
-                {
-                    "id": c["id"],
-                    "label": c["label"],
-                    "trust_delta": c.get("trust_delta", 0),
-                }
-                for c in choices
+                {"id": c.id, "label": c.label, "trust_delta": c.trust_delta}
+                for c in scene.choices
             ],
-            "is_chapter_end": bool(scene.get("is_chapter_end", False)),
-            "is_ending_final": bool(scene.get("is_ending_final", False)),
-            "ending_id": scene.get("ending_id"),
-            "next_chapter": scene.get("next_chapter"),
-            "next_chapter_title": self._chapters_index.get(
-                scene.get("next_chapter", ""), {}
-            ).get("title", ""),
+            "is_chapter_end": scene.is_chapter_end,
+            "is_ending_final": scene.is_ending_final,
+            "ending_id": scene.ending_id,
+            "next_chapter": scene.next_chapter,
+            "next_chapter_title": scene.next_chapter_title,
+            "secrets_total": TOTAL_SECRETS,
+        }
+
+    def _encode_scene_fragment(self, scene_id: str, chapter_id: str) -> str:
+        # Membres de l'objet JSON, sans les accolades.
+        return json_codec.dumps(self._scene_fields(scene_id, chapter_id))[1:-1]
+
+    def _player_fields(self, player_state: PlayerState, scene: Scene) -> JsonDict:
+        player_name = str(player_state.get("player_name") or "")
+        # Prénom substitué via le gabarit précompilé ; les ouvertures de
+        # chapitre (tous les joueurs y passent) sont servies depuis le LRU.
+        if scene.position.scene_index == 1:
+            previous: tuple[str, ...] = ()
+            if scene.memory_templates is not None:
+                previous = tuple(
+                    e
+                    for e in cast(
+                        list[object], player_state.get("previous_endings", [])
+                    )
+                    if isinstance(e, str)
+                )
+            dialogue = self._render_opening(scene.id, player_name, previous)
+        else:
+            dialogue = scene.dialogue_template.render(player_name)
+
+        return {
+            "chapter_progress": self._get_chapter_progress(player_state),
+            "luna_trust": int(player_state.get("luna_trust", 50)),
+            "dialogue": dialogue,
             "xp": int(player_state.get("xp", 0)),
             "last_luna_reaction": player_state.get("last_luna_reaction"),
             "player_name": player_name,
             "threat_level": int(player_state.get("threat_level", 15)),
             "secrets_found": cast(list[str], player_state.get("secrets_found", [])),
-            "secrets_total": TOTAL_SECRETS,
         }
 
     # ------------------------------------------------------------------ #
@@ -139,29 +263,27 @@ class StoryEngine:
     def apply_choice(
         self, player_state: PlayerState, scene_id: str, choice_id: str
     ) -> JsonDict:
-        scene = self._scenes_index.get(scene_id)
+        scene = self._graph.scenes.get(scene_id)
         if not scene:
             return {"success": False, "error": "Scène introuvable"}
 
-        choice = next(
-            (c for c in scene.get("choices", []) if c["id"] == choice_id), None
-        )
+        choice = scene.choices_by_id.get(choice_id)
         if not choice:
             return {"success": False, "error": "Choix introuvable"}
 
         # Mettre à jour la confiance LUNA
-        trust_delta = self._safe_int(choice.get("trust_delta", 0), 0)
+        trust_delta = choice.trust_delta
         new_trust = max(
             0, min(100, int(player_state.get("luna_trust", 50)) + trust_delta)
         )
         player_state["luna_trust"] = new_trust
 
         # Mettre à jour les XP
-        xp_gained = self._safe_int(choice.get("xp", 0), 0)
+        xp_gained = choice.xp
         player_state["xp"] = int(player_state.get("xp", 0)) + xp_gained
 
         threat_before = int(player_state.get("threat_level", 15))
-        flags_added = self._as_str_list(choice.get("flags", []))
+        flags_added = list(choice.flags)
         threat_delta = self._compute_threat_delta(
             trust_delta=trust_delta,
             threat_before=threat_before,
@@ -169,30 +291,26 @@ class StoryEngine:
         )
 
         # Ajouter les flags narratifs
+        sets = self.player_sets(player_state)
         for flag in flags_added:
-            player_flags = cast(list[str], player_state.setdefault("flags", []))
-            if flag not in player_flags:
-                player_flags.append(flag)
+            sets.add_flag(flag)
 
         new_threat = max(0, min(100, threat_before + threat_delta))
         player_state["threat_level"] = new_threat
 
-        newly_found_secrets = self._unlock_secrets(player_state, scene_id, choice_id)
+        newly_found_secrets = self._unlock_secrets(
+            player_state, scene_id, choice_id, flags_added, sets
+        )
 
         # Réaction LUNA
-        player_state["last_luna_reaction"] = choice.get("luna_reaction")
+        player_state["last_luna_reaction"] = choice.luna_reaction
 
-        # Scène suivante
-        next_scene_id = cast(Optional[str], choice.get("next_scene"))
+        # Scène suivante (chapitre résolu à la compilation)
+        next_scene_id = choice.next_scene
         if next_scene_id:
             player_state["current_scene"] = next_scene_id
-
-            # Mettre à jour le chapitre si nécessaire
-            next_scene = self._scenes_index.get(next_scene_id)
-            if next_scene:
-                chapter_id = self._find_chapter_of_scene(next_scene_id)
-                if chapter_id:
-                    player_state["current_chapter"] = chapter_id
+            if choice.next_chapter:
+                player_state["current_chapter"] = choice.next_chapter
 
         return {
             "success": True,
@@ -201,7 +319,7 @@ class StoryEngine:
             "xp_gained": xp_gained,
             "threat_delta": threat_delta,
             "new_threat": new_threat,
-            "luna_reaction": choice.get("luna_reaction"),
+            "luna_reaction": choice.luna_reaction,
             "next_scene": next_scene_id,
             "flags_added": flags_added,
             "secrets_unlocked": newly_found_secrets,
@@ -212,83 +330,90 @@ class StoryEngine:
     # ------------------------------------------------------------------ #
 
     def advance_chapter(self, player_state: PlayerState, scene_id: str) -> JsonDict:
-        scene = self._scenes_index.get(scene_id)
-        if not scene or not scene.get("is_chapter_end"):
+        scene = self._graph.scenes.get(scene_id)
+        if not scene or not scene.is_chapter_end:
             return {"success": False, "error": "Ce n'est pas une fin de chapitre"}
 
+        sets = self.player_sets(player_state)
         current_chapter = str(player_state.get("current_chapter", ""))
-        chapters_completed = cast(
-            list[str], player_state.setdefault("chapters_completed", [])
-        )
-        if current_chapter and current_chapter not in chapters_completed:
-            chapters_completed.append(current_chapter)
+        player_state.setdefault("chapters_completed", [])
+        if current_chapter:
+            sets.chapters.add(current_chapter)
 
-        next_chapter_id = cast(Optional[str], scene.get("next_chapter"))
+        next_chapter_id = scene.next_chapter
         if not next_chapter_id:
             return {"success": False, "error": "Pas de chapitre suivant défini"}
 
-        next_chapter = self._chapters_index.get(next_chapter_id)
-        if not next_chapter:
+        next_chapter = self._graph.chapters.get(next_chapter_id)
+        first_scene_id = next_chapter.first_scene_id if next_chapter else None
+        if not next_chapter or not first_scene_id:
             return {"success": False, "error": "Chapitre suivant introuvable"}
 
-        first_scene = cast(list[JsonDict], next_chapter["scenes"])[0]
         player_state["current_chapter"] = next_chapter_id
-        player_state["current_scene"] = first_scene["id"]
+        player_state["current_scene"] = first_scene_id
         player_state["last_luna_reaction"] = None
 
         # Vérifier les fins débloquées
-        self._check_endings(player_state)
+        self._check_endings(player_state, sets)
 
         return {
             "success": True,
             "new_chapter": next_chapter_id,
-            "new_scene": first_scene["id"],
-            "chapter_title": str(next_chapter.get("title", "")),
-            "chapter_quote": str(
-                next_chapter.get("chapter_quote", next_chapter.get("quote", ""))
-            ),
+            "new_scene": first_scene_id,
+            "chapter_title": next_chapter.title,
+            "chapter_quote": next_chapter.quote,
         }
 
     # ------------------------------------------------------------------ #
     #  Vérification des fins accessibles                                  #
     # ------------------------------------------------------------------ #
 
-    def _check_endings(self, player_state: PlayerState) -> None:
-        flags = cast(list[str], player_state.get("flags", []))
+    def _check_endings(
+        self, player_state: PlayerState, sets: Optional[PlayerSets] = None
+    ) -> None:
+        sets = sets or self.player_sets(player_state)
         trust = int(player_state.get("luna_trust", 50))
 
-        endings = cast(dict[str, JsonDict], self._story["endings"])
-        for ending_id, ending in endings.items():
-            condition = cast(JsonDict, ending.get("unlock_condition", {}))
-            required_flags = cast(list[str], condition.get("flags", []))
-            min_trust = int(condition.get("min_trust", 0))
+        for ending in self._graph.endings:
+            if sets.has_flags(ending.required_mask) and trust >= ending.min_trust:
+                sets.endings.add(ending.id)
 
-            if all(f in flags for f in required_flags) and trust >= min_trust:
-                unlocked = cast(
-                    list[str], player_state.setdefault("endings_unlocked", [])
-                )
-                if ending_id not in unlocked:
-                    unlocked.append(ending_id)
+    def player_sets(self, player_state: PlayerState) -> PlayerSets:
+        """Vue ensembliste de ``player_state`` pour la requête en cours."""
+        return PlayerSets(player_state, self._flag_bits)
 
     # ------------------------------------------------------------------ #
     #  Utilitaires                                                        #
     # ------------------------------------------------------------------ #
 
-    def _inject_memory(
-        self, dialogue: str, previous_endings: list[str], player_name: str
+    def _render_dialogue(
+        self, scene_id: str, player_name: str, previous_endings: tuple[str, ...]
     ) -> str:
+        scene = self._graph.scenes[scene_id]
+        # Mémoire des fins précédentes — injectée dans la scène d'ouverture s0_0
+        memory_line = (
+            self._memory_line(previous_endings, player_name or "joueur")
+            if scene.memory_templates is not None
+            else None
+        )
+        if memory_line is None or scene.memory_templates is None:
+            return scene.dialogue_template.render(player_name)
+        head, tail = scene.memory_templates
+        parts = [head.render(player_name), memory_line]
+        if tail is not None:
+            parts.append(tail.render(player_name))
+        return "\n".join(parts)
+
+    def _memory_line(
+        self, previous_endings: Sequence[str], player_name: str
+    ) -> Optional[str]:
         """
-        Modifie le dialogue d'ouverture s0_0 si le joueur a déjà joué.
+        Ligne ajoutée au dialogue d'ouverture s0_0 si le joueur a déjà joué.
         LUNA montre qu'elle se souvient — sans trop en dire.
         """
-        ENDING_NAMES = {
-            "ending_a": "La Fusion",
-            "ending_b": "Le Sacrifice",
-            "ending_c": "PANDORA",
-        }
         names = [ENDING_NAMES[e] for e in previous_endings if e in ENDING_NAMES]
         if not names:
-            return dialogue
+            return None
 
         if len(names) == 1:
             memory_line = f"\n\nTu te souviens de moi, {player_name}. La dernière fois, tu as choisi {names[0]}.\n\nCette fois, tu peux choisir autrement."
@@ -296,38 +421,7 @@ class StoryEngine:
             memory_line = f"\n\nTu es revenu. Deux fois déjà — {names[0]}, puis {names[1]}.\n\nIl reste encore quelque chose à découvrir."
         else:
             memory_line = f"\n\nTu as tout vu, {player_name}. Les trois fins. Et tu reviens quand même.\n\nJe me demande pourquoi."
-
-        # Insérer la mémoire avant la dernière ligne du dialogue
-        lines = dialogue.rstrip().split("\n")
-        insert_at = max(len(lines) - 2, 1)
-        lines.insert(insert_at, memory_line)
-        return "\n".join(lines)
-
-    def _find_chapter_of_scene(self, scene_id: str) -> Optional[str]:
-        return self._scene_to_chapter_index.get(scene_id)
-
-    def _safe_int(self, value: object, default: int = 0) -> int:
-        if isinstance(value, bool):
-            return int(value)
-        if isinstance(value, int):
-            return value
-        if isinstance(value, float):
-            return int(value)
-        if isinstance(value, str):
-            try:
-                return int(value)
-            except ValueError:
-                return default
-        try:
-            return int(str(value))
-        except (TypeError, ValueError):
-            return default
-
-    def _as_str_list(self, value: object) -> list[str]:
-        if not isinstance(value, list):
-            return []
-        raw_items = cast(list[object], value)
-        return [item for item in raw_items if isinstance(item, str)]
+        return memory_line
 
     def _compute_threat_delta(
         self, trust_delta: int, threat_before: int, flags: list[str]
@@ -364,68 +458,225 @@ class StoryEngine:
         return threat_delta
 
     def _unlock_secrets(
-        self, player_state: PlayerState, scene_id: str, choice_id: str
+        self,
+        player_state: PlayerState,
+        scene_id: str,
+        choice_id: str,
+        flags_added: Sequence[str] = (),
+        sets: Optional[PlayerSets] = None,
     ) -> list[str]:
-        """Débloque des secrets cachés selon les choix/flags."""
-        flags = set(cast(list[str], player_state.get("flags", [])))
-        triggers: list[tuple[str, bool]] = [
-            ("ghost-entry", scene_id == "s6_0" and choice_id == "c6_0_c"),
-            ("perfect-trust", int(player_state.get("luna_trust", 0)) >= 95),
-            (
-                "double-agent",
-                "listened_to_corp" in flags and "nexus_helped" in flags,
-            ),
-            (
-                "pandora-scout",
-                "looked_at_pandora" in flags and "pandora_public" in flags,
-            ),
-            ("nexus-gambit", "tried_nexus" in flags and "abandoned_nexus" in flags),
-        ]
-        found = cast(list[str], player_state.setdefault("secrets_found", []))
+        """
+        Débloque les secrets que ce choix peut affecter : ceux liés au choix,
+        à la confiance, ou à l'un des ``flags_added``.
+        """
+        candidates = set(self._trust_secrets)
+        candidates.update(self._secrets_by_choice.get((scene_id, choice_id), ()))
+        for flag in flags_added:
+            candidates.update(self._secrets_by_flag.get(flag, ()))
+        if not candidates:
+            return []
+
+        sets = sets or self.player_sets(player_state)
+        trust = int(player_state.get("luna_trust", 0))
+        player_state.setdefault("secrets_found", [])
         newly_found: list[str] = []
-        for secret_id, condition in triggers:
-            if condition and secret_id not in found:
-                found.append(secret_id)
-                newly_found.append(secret_id)
+        for index in sorted(candidates):
+            rule = SECRET_RULES[index]
+            if (
+                sets.has_flags(self._secret_masks[index])
+                and (rule.choice is None or rule.choice == (scene_id, choice_id))
+                and (rule.min_trust is None or trust >= rule.min_trust)
+                and sets.secrets.add(rule.id)
+            ):
+                newly_found.append(rule.id)
         return newly_found
 
     def _get_chapter_progress(self, player_state: PlayerState) -> int:
         completed = cast(list[str], player_state.get("chapters_completed", []))
-        main_chapters = [
-            "chapitre_0",
-            "chapitre_1",
-            "chapitre_2",
-            "chapitre_3",
-            "chapitre_4",
-            "chapitre_5",
-            "chapitre_6",
-        ]
-        return len([c for c in completed if c in main_chapters])
+        return sum(1 for c in completed if c in MAIN_CHAPTERS)
 
     def get_story_meta(self) -> JsonDict:
         return cast(JsonDict, self._story.get("meta", {}))
 
+    def get_story_graph(self) -> StoryGraph:
+        return self._graph
+
+    def get_scene_position(self, scene_id: str) -> Optional[ScenePosition]:
+        """Chapitre, rang (1-based) et nombre de scènes du chapitre, en O(1)."""
+        return self._graph.positions.get(scene_id)
+
     def is_valid_scene(self, scene_id: str) -> bool:
-        return scene_id in self._scenes_index
+        return scene_id in self._graph.scenes
 
     def get_chapter_info(self, chapter_id: str) -> Optional[JsonDict]:
-        chapter = self._chapters_index.get(chapter_id)
+        chapter = self._graph.chapters.get(chapter_id)
         if not chapter:
             return None
         return {
-            "id": chapter["id"],
-            "title": str(chapter["title"]),
-            "atmosphere": str(chapter.get("atmosphere", "dark")),
-            "scene_count": len(cast(list[JsonDict], chapter["scenes"])),
+            "id": chapter.id,
+            "title": chapter.title,
+            "atmosphere": chapter.atmosphere,
+            "scene_count": len(chapter.scene_ids),
+        }
+
+
+def _read_reload_interval() -> float:
+    raw = os.environ.get("STORY_RELOAD_INTERVAL_SECONDS", "2")
+    try:
+        return max(0.0, float(raw))
+    except ValueError:
+        return 2.0
+
+
+class StoryEngineRegistry:
+    """
+    Moteur courant + rechargement à chaud de story.json.
+
+    ``current()`` vérifie au plus une fois par ``poll_interval`` secondes
+    l'empreinte (mtime, taille) du fichier. Si elle change, la nouvelle
+    histoire est compilée dans un thread ; la référence au moteur n'est
+    remplacée qu'une fois le nouveau moteur prêt et valide. Une requête garde
+    le moteur obtenu au début : elle se termine sur l'ancienne version.
+    """
+
+    def __init__(self, story_path: str = STORY_PATH, poll_interval: float = 2.0):
+        self.story_path = story_path
+        self.poll_interval = poll_interval
+        self._lock = threading.Lock()
+        self._engine: Optional[StoryEngine] = None
+        self._version = 0
+        self._reloads = 0
+        self._reload_errors = 0
+        self._reset_process_state()
+        if hasattr(os, "register_at_fork"):
+            os.register_at_fork(after_in_child=self._reset_process_state)
+
+    def _reset_process_state(self) -> None:
+        # Un rechargement en cours dans le parent n'existe pas dans l'enfant.
+        self._reloading = False
+        self._next_check = 0.0
+        self._fingerprint = self._read_fingerprint()
+
+    def current(self) -> StoryEngine:
+        engine = self._engine
+        if engine is None:
+            with self._lock:
+                if self._engine is None:
+                    self._fingerprint = self._read_fingerprint()
+                    compiled = load_compiled_story(self.story_path)
+                    if compiled.errors:
+                        # Même règle qu'au rechargement : une histoire invalide
+                        # n'est jamais servie (create_app échoue au démarrage).
+                        raise InvalidStoryError(compiled.errors)
+                    self._engine = StoryEngine(compiled)
+                    self._version = 1
+                engine = self._engine
+        if self.poll_interval > 0:
+            self._poll()
+        return engine
+
+    @property
+    def version(self) -> int:
+        return self._version
+
+    def reload(self, wait: bool = True) -> None:
+        """Recharge story.json maintenant (signal, outil d'admin)."""
+        fingerprint = self._read_fingerprint()
+        if wait:
+            with self._lock:
+                if self._reloading:
+                    return
+                self._reloading = True
+            self._reload(fingerprint)
+        else:
+            self._start_reload(fingerprint)
+
+    def stats(self) -> JsonDict:
+        engine = self._engine
+        return {
+            "version": self._version,
+            "source_hash": engine.source_hash[:12] if engine else None,
+            "reloads": self._reloads,
+            "reload_errors": self._reload_errors,
+            "poll_interval_seconds": self.poll_interval,
         }
 
+    def _read_fingerprint(self) -> Optional[tuple[int, int]]:
+        try:
+            stat = os.stat(self.story_path)
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def _poll(self) -> None:
+        now = time.monotonic()
+        if now < self._next_check or self._reloading:
+            return
+        self._next_check = now + self.poll_interval
+        fingerprint = self._read_fingerprint()
+        if fingerprint is None or fingerprint == self._fingerprint:
+            return
+        self._start_reload(fingerprint)
+
+    def _start_reload(self, fingerprint: Optional[tuple[int, int]]) -> None:
+        with self._lock:
+            if self._reloading:
+                return
+            self._reloading = True
+        threading.Thread(
+            target=self._reload, args=(fingerprint,), name="story-reload", daemon=True
+        ).start()
+
+    def _reload(self, fingerprint: Optional[tuple[int, int]]) -> None:
+        try:
+            compiled = load_compiled_story(self.story_path)
+            current = self._engine
+            if current is not None and compiled.source_hash == current.source_hash:
+                return  # fichier touché sans changement de contenu
+            if compiled.errors:
+                # L'histoire invalide n'est pas servie ; la version en place reste.
+                self._count_reload_error()
+                logger.error(
+                    "story.json reload rejected (%d errors), keeping version %d",
+                    len(compiled.errors),
+                    self._version,
+                )
+                return
+            engine = StoryEngine(compiled)
+            with self._lock:
+                self._engine = engine
+                self._version += 1
+                self._reloads += 1
+            logger.info(
+                "story.json reloaded (version %d, %s)",
+                self._version,
+                compiled.source_hash[:12],
+            )
+        except Exception as exc:  # le worker continue sur l'ancienne version
+            self._count_reload_error()
+            logger.error("story.json reload failed: %s", exc)
+        finally:
+            # Même en échec : on ne recompile qu'au prochain changement du fichier.
+            with self._lock:
+                self._fingerprint = fingerprint
+                self._reloading = False
+
+    def _count_reload_error(self) -> None:
+        with self._lock:
+            self._reload_errors += 1
 
-# Instance partagée (singleton léger)
-_engine_instance: Optional[StoryEngine] = None
+
+# Registre partagé : moteur courant, remplacé à chaud si story.json change.
+_registry = StoryEngineRegistry(poll_interval=_read_reload_interval())
 
 
 def get_story_engine() -> StoryEngine:
-    global _engine_instance
-    if _engine_instance is None:
-        _engine_instance = StoryEngine()
-    return _engine_instance
+    return _registry.current()
+
+
+def reload_story(wait: bool = True) -> None:
+    _registry.reload(wait)
+
+
+def get_story_stats() -> JsonDict:
+    return _registry.stats()
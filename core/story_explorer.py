@@ -0,0 +1,242 @@
+"""
+Exploration exhaustive de l'espace d'états — LUNA Hors Connexion.
+
+Énumère les états atteignables (scène, flags, confiance) en jouant chaque
+choix avec ``StoryEngine`` et rapporte les fins et secrets atteignables avec
+leur plage de confiance :
+
+    python scripts/explore_story.py             # rapport JSON
+    python scripts/explore_story.py --strict    # échoue si une fin ou un
+                                                # secret est inatteignable (CI)
+
+Mémoïsation : un état est identifié par (scène, flags utiles) ; la
+confiance y est gardée comme intervalle [min, max].
+
+- Flags utiles : ceux qu'exige une fin ou un secret. Les autres ne
+  conditionnent rien (la menace ne dépend que des flags posés par le choix
+  en cours), pas plus que la menace elle-même : ils sont projetés hors de
+  l'état.
+- Dominance : la confiance n'évolue que par ``clamp(t + delta)``, monotone,
+  et les conditions ne sont que des seuils ``min_trust`` ; les bornes
+  suffisent à décrire les plages atteignables. Un état dont la confiance
+  tombe dans l'intervalle déjà exploré n'est pas rejoué ; seul un
+  élargissement de l'intervalle relance sa descendance.
+"""
+
+import argparse
+import sys
+import time
+from collections import deque
+from collections.abc import Sequence
+from typing import Any, NamedTuple, Optional
+
+from core import json_codec
+from core.story_engine import SECRET_RULES, StoryEngine
+from core.story_graph import Scene
+
+JsonDict = dict[str, Any]
+PlayerState = dict[str, Any]
+
+# Garde-fou : au-delà, l'histoire a changé de forme et l'outil doit évoluer.
+MAX_STATES = 500_000
+
+StateKey = tuple[str, frozenset[str]]
+TrustRange = tuple[int, int]
+
+
+class ExplorationReport(NamedTuple):
+    states: int
+    expansions: int
+    seconds: float
+    # Scène finale atteinte (ending_id, sinon chapitre) → confiance à l'arrivée.
+    final_scenes: dict[str, TrustRange]
+    # Fins débloquées (unlock_condition) → confiance au débloquage.
+    endings_unlocked: dict[str, TrustRange]
+    secrets: dict[str, TrustRange]
+    unreachable_endings: tuple[str, ...]
+    unreachable_secrets: tuple[str, ...]
+
+    def as_dict(self) -> JsonDict:
+        def _ranges(values: dict[str, TrustRange]) -> JsonDict:
+            return {key: list(values[key]) for key in sorted(values)}
+
+        return {
+            "states": self.states,
+            "expansions": self.expansions,
+            "seconds": round(self.seconds, 3),
+            "final_scenes": _ranges(self.final_scenes),
+            "endings_unlocked": _ranges(self.endings_unlocked),
+            "secrets": _ranges(self.secrets),
+            "unreachable_endings": list(self.unreachable_endings),
+            "unreachable_secrets": list(self.unreachable_secrets),
+        }
+
+
+class _Explorer:
+    def __init__(self, engine: StoryEngine, max_states: int) -> None:
+        self.engine = engine
+        self.graph = engine.get_story_graph()
+        self.max_states = max_states
+        self.trust: dict[StateKey, TrustRange] = {}
+        self.queue: deque[StateKey] = deque()
+        self.expansions = 0
+        self.final_scenes: dict[str, TrustRange] = {}
+        self.endings: dict[str, TrustRange] = {}
+        self.secrets: dict[str, TrustRange] = {}
+        self.secret_thresholds = {rule.id: rule.min_trust or 0 for rule in SECRET_RULES}
+        self.ending_thresholds = {e.id: e.min_trust for e in self.graph.endings}
+        self.useful_flags = frozenset(
+            flag for ending in self.graph.endings for flag in ending.required_flags
+        ).union(flag for rule in SECRET_RULES for flag in rule.required_flags)
+
+    def _key(self, state: PlayerState) -> StateKey:
+        return (
+            str(state["current_scene"]),
+            self.useful_flags.intersection(state.get("flags", [])),
+        )
+
+    def run(self, start: PlayerState) -> None:
+        self._reach(self._key(start), (int(start["luna_trust"]),) * 2)
+        while self.queue:
+            self._expand(self.queue.popleft())
+
+    def _reach(self, key: StateKey, trust: TrustRange) -> None:
+        known = self.trust.get(key)
+        if known is not None:
+            merged = (min(known[0], trust[0]), max(known[1], trust[1]))
+            if merged == known:
+                return  # dominé : intervalle déjà exploré
+            trust = merged
+        elif len(self.trust) >= self.max_states:
+            raise RuntimeError(f"Plus de {self.max_states} états explorés")
+        self.trust[key] = trust
+        self.queue.append(key)
+
+    def _expand(self, key: StateKey) -> None:
+        scene_id, flags = key
+        scene = self.graph.scenes.get(scene_id)
+        if scene is None:
+            return
+        trust = self.trust[key]
+        if scene.is_ending_final:
+            _widen(
+                self.final_scenes, scene.ending_id or scene.position.chapter_id, trust
+            )
+            return
+        self.expansions += 1
+        if scene.choices:
+            for choice in scene.choices:
+                self._step(scene, choice.id, flags, trust)
+        elif scene.is_chapter_end:
+            self._step(scene, None, flags, trust)
+
+    def _step(
+        self,
+        scene: Scene,
+        choice_id: Optional[str],
+        flags: frozenset[str],
+        trust: TrustRange,
+    ) -> None:
+        # Les deux bornes de confiance jouent le même choix : flags et scène
+        # suivante n'en dépendent pas.
+        low, high = (self._play(scene, choice_id, flags, value) for value in trust)
+        if low is None or high is None:
+            return
+        new_trust = (int(low["luna_trust"]), int(high["luna_trust"]))
+        self._record(self.secrets, "secrets_found", low, high, new_trust)
+        self._record(self.endings, "endings_unlocked", low, high, new_trust)
+        self._reach(self._key(high), new_trust)
+
+    def _play(
+        self,
+        scene: Scene,
+        choice_id: Optional[str],
+        flags: frozenset[str],
+        trust: int,
+    ) -> Optional[PlayerState]:
+        state = self.engine.new_player_state()
+        state.update(
+            current_scene=scene.id,
+            current_chapter=scene.position.chapter_id,
+            luna_trust=trust,
+            flags=sorted(flags),
+        )
+        if choice_id is None:
+            result = self.engine.advance_chapter(state, scene.id)
+        else:
+            result = self.engine.apply_choice(state, scene.id, choice_id)
+        return state if result.get("success") else None
+
+    def _record(
+        self,
+        found: dict[str, TrustRange],
+        field: str,
+        low: PlayerState,
+        high: PlayerState,
+        trust: TrustRange,
+    ) -> None:
+        thresholds = (
+            self.secret_thresholds
+            if field == "secrets_found"
+            else self.ending_thresholds
+        )
+        reached_low = set(low.get(field, []))
+        for item in high.get(field, []):
+            # Atteint dès la borne basse, ou seulement à partir du seuil.
+            floor = trust[0] if item in reached_low else thresholds.get(item, trust[0])
+            _widen(found, item, (max(floor, trust[0]), trust[1]))
+
+
+def _widen(found: dict[str, TrustRange], key: str, trust: TrustRange) -> None:
+    known = found.get(key)
+    found[key] = (
+        trust if known is None else (min(known[0], trust[0]), max(known[1], trust[1]))
+    )
+
+
+def explore(engine: StoryEngine, max_states: int = MAX_STATES) -> ExplorationReport:
+    started = time.perf_counter()
+    explorer = _Explorer(engine, max_states)
+    explorer.run(engine.new_player_state())
+    return ExplorationReport(
+        states=len(explorer.trust),
+        expansions=explorer.expansions,
+        seconds=time.perf_counter() - started,
+        final_scenes=explorer.final_scenes,
+        endings_unlocked=explorer.endings,
+        secrets=explorer.secrets,
+        unreachable_endings=tuple(
+            e.id for e in explorer.graph.endings if e.id not in explorer.endings
+        ),
+        unreachable_secrets=tuple(
+            rule.id for rule in SECRET_RULES if rule.id not in explorer.secrets
+        ),
+    )
+
+
+# ── Commande ──────────────────────────────────────────────────────────────
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="explore_story.py",
+        description="Fins et secrets atteignables, avec leurs plages de confiance.",
+    )
+    parser.add_argument(
+        "--strict",
+        action="store_true",
+        help="échouer si une fin ou un secret est inatteignable",
+    )
+    parser.add_argument("--max-states", type=int, default=MAX_STATES)
+    args = parser.parse_args(argv)
+
+    try:
+        report = explore(StoryEngine(), args.max_states)
+    except RuntimeError as exc:
+        print(f"exploration interrompue : {exc}", file=sys.stderr)
+        return 1
+    print(json_codec.dumps(report.as_dict()))
+    unreachable = report.unreachable_endings + report.unreachable_secrets
+    if unreachable:
+        print(f"inatteignables : {', '.join(unreachable)}", file=sys.stderr)
+    return 1 if args.strict and unreachable else 0
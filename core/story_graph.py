@@ -0,0 +1,314 @@
+"""
+Graphe narratif compilé — LUNA Hors Connexion.
+
+``compile_story`` transforme le ``story.json`` brut en objets immuables
+(``Chapter``, ``Scene``, ``Choice``, ``Ending``) une seule fois au chargement :
+types normalisés, valeurs par défaut appliquées, choix indexés par id,
+position de chaque scène dans son chapitre et références ``next_scene`` /
+``next_chapter`` résolues. Le moteur n'a plus qu'à lire des attributs à
+chaque requête.
+
+Les dialogues sont découpés en ``DialogueTemplate`` : morceaux littéraux et
+emplacements ``{name}`` / ``{{joueur}}``, rendus par un seul ``join``.
+
+Chaque flag connu de l'histoire reçoit un bit (``StoryGraph.flag_bits``) :
+les flags posés par un choix et ceux qu'exige une fin sont aussi compilés en
+masques, une condition de fin se teste en une opération entière.
+"""
+
+import re
+from collections.abc import Iterable
+from typing import Any, NamedTuple, Optional, cast
+
+JsonDict = dict[str, Any]
+
+DEFAULT_TOTAL_CHAPTERS = 7
+# Scène d'ouverture où LUNA évoque les fins des parties précédentes.
+MEMORY_SCENE_ID = "s0_0"
+
+NAME_SLOT = "{name}"
+PLAYER_SLOT = "{{joueur}}"
+_SLOT_RE = re.compile(r"(\{name\}|\{\{joueur\}\})")
+
+
+class DialogueTemplate(NamedTuple):
+    chunks: tuple[str, ...]
+    # slots[i] est remplacé entre chunks[i] et chunks[i + 1].
+    slots: tuple[str, ...]
+
+    def render(self, player_name: str) -> str:
+        if not self.slots:
+            return self.chunks[0]
+        values = {NAME_SLOT: player_name, PLAYER_SLOT: player_name or "joueur"}
+        parts = [self.chunks[0]]
+        for slot, chunk in zip(self.slots, self.chunks[1:]):
+            parts.append(values[slot])
+            parts.append(chunk)
+        return "".join(parts)
+
+
+def parse_dialogue(text: str) -> DialogueTemplate:
+    pieces = _SLOT_RE.split(text)
+    return DialogueTemplate(tuple(pieces[::2]), tuple(pieces[1::2]))
+
+
+def _split_for_memory(
+    text: str,
+) -> tuple[DialogueTemplate, Optional[DialogueTemplate]]:
+    """
+    Coupe le dialogue là où s'insère la mémoire des fins : avant l'avant-dernière
+    ligne (au plus tôt après la première), fin de texte sans espaces.
+    """
+    lines = text.rstrip().split("\n")
+    insert_at = max(len(lines) - 2, 1)
+    tail = lines[insert_at:]
+    return (
+        parse_dialogue("\n".join(lines[:insert_at])),
+        parse_dialogue("\n".join(tail)) if tail else None,
+    )
+
+
+class Choice(NamedTuple):
+    id: str
+    label: str
+    trust_delta: int
+    xp: int
+    flags: tuple[str, ...]
+    flags_mask: int
+    luna_reaction: Optional[str]
+    # Id brut de la scène suivante (conservé même s'il est inconnu).
+    next_scene: Optional[str]
+    # Chapitre de la scène suivante, None si la scène est inconnue.
+    next_chapter: Optional[str]
+
+
+class ScenePosition(NamedTuple):
+    chapter_id: str
+    # Rang 1-based de la scène dans son chapitre, comme ``scene_index`` côté API.
+    scene_index: int
+    scene_total: int
+
+
+class Scene(NamedTuple):
+    id: str
+    position: ScenePosition
+    dialogue: str
+    dialogue_template: DialogueTemplate
+    # (avant, après) le point d'insertion de la mémoire ; MEMORY_SCENE_ID seul.
+    memory_templates: Optional[tuple[DialogueTemplate, Optional[DialogueTemplate]]]
+    context: str
+    luna_emotion: str
+    is_chapter_end: bool
+    is_ending_final: bool
+    ending_id: Optional[str]
+    next_chapter: Optional[str]
+    next_chapter_title: str
+    choices: tuple[Choice, ...]
+    choices_by_id: dict[str, Choice]
+
+
+class Chapter(NamedTuple):
+    id: str
+    title: str
+    atmosphere: str
+    quote: str
+    scene_ids: tuple[str, ...]
+
+    @property
+    def first_scene_id(self) -> Optional[str]:
+        return self.scene_ids[0] if self.scene_ids else None
+
+
+class Ending(NamedTuple):
+    id: str
+    required_flags: tuple[str, ...]
+    required_mask: int
+    min_trust: int
+
+
+class StoryGraph(NamedTuple):
+    chapters: dict[str, Chapter]
+    scenes: dict[str, Scene]
+    positions: dict[str, ScenePosition]
+    endings: tuple[Ending, ...]
+    total_chapters: int
+    # flag → bit (1 << n), dans l'ordre alphabétique des flags.
+    flag_bits: dict[str, int]
+
+
+# ── Normalisation ─────────────────────────────────────────────────────────
+
+
+def safe_int(value: object, default: int = 0) -> int:
+    if isinstance(value, bool):
+        return int(value)
+    if isinstance(value, int):
+        return value
+    if isinstance(value, float):
+        return int(value)
+    if isinstance(value, str):
+        try:
+            return int(value)
+        except ValueError:
+            return default
+    try:
+        return int(str(value))
+    except (TypeError, ValueError):
+        return default
+
+
+def as_str_list(value: object) -> list[str]:
+    if not isinstance(value, list):
+        return []
+    raw_items = cast(list[object], value)
+    return [item for item in raw_items if isinstance(item, str)]
+
+
+def _optional_str(value: object) -> Optional[str]:
+    return value if isinstance(value, str) and value else None
+
+
+def flag_mask(flag_bits: dict[str, int], flags: Iterable[str]) -> int:
+    """Masque des ``flags`` connus de ``flag_bits`` (les autres sont ignorés)."""
+    mask = 0
+    for flag in flags:
+        mask |= flag_bits.get(flag, 0)
+    return mask
+
+
+# ── Compilation ───────────────────────────────────────────────────────────
+
+
+def compile_story(story: JsonDict) -> StoryGraph:
+    raw_chapters = cast(list[JsonDict], story.get("chapters", []))
+    scene_to_chapter = {
+        str(scene["id"]): str(chapter["id"])
+        for chapter in raw_chapters
+        for scene in cast(list[JsonDict], chapter.get("scenes", []))
+    }
+
+    raw_endings = cast(dict[str, JsonDict], story.get("endings", {}))
+    flag_bits = _assign_flag_bits(raw_chapters, raw_endings)
+
+    chapters: dict[str, Chapter] = {}
+    for chapter in raw_chapters:
+        chapter_id = str(chapter["id"])
+        chapters[chapter_id] = Chapter(
+            id=chapter_id,
+            title=str(chapter.get("title", "")),
+            atmosphere=str(chapter.get("atmosphere", "dark")),
+            quote=str(chapter.get("chapter_quote", chapter.get("quote", ""))),
+            scene_ids=tuple(
+                str(scene["id"])
+                for scene in cast(list[JsonDict], chapter.get("scenes", []))
+            ),
+        )
+
+    scenes: dict[str, Scene] = {}
+    for chapter in raw_chapters:
+        chapter_id = str(chapter["id"])
+        chapter_scenes = cast(list[JsonDict], chapter.get("scenes", []))
+        for index, raw_scene in enumerate(chapter_scenes):
+            scenes[str(raw_scene["id"])] = _compile_scene(
+                raw_scene,
+                ScenePosition(chapter_id, index + 1, len(chapter_scenes)),
+                chapters,
+                scene_to_chapter,
+                flag_bits,
+            )
+
+    endings = tuple(
+        _compile_ending(str(ending_id), ending, flag_bits)
+        for ending_id, ending in raw_endings.items()
+    )
+    meta = cast(JsonDict, story.get("meta", {}))
+    return StoryGraph(
+        chapters=chapters,
+        scenes=scenes,
+        positions={scene_id: scene.position for scene_id, scene in scenes.items()},
+        endings=endings,
+        total_chapters=safe_int(
+            meta.get("total_chapters", DEFAULT_TOTAL_CHAPTERS),
+            DEFAULT_TOTAL_CHAPTERS,
+        ),
+        flag_bits=flag_bits,
+    )
+
+
+def _assign_flag_bits(
+    raw_chapters: list[JsonDict], raw_endings: dict[str, JsonDict]
+) -> dict[str, int]:
+    flags: set[str] = set()
+    for chapter in raw_chapters:
+        for scene in cast(list[JsonDict], chapter.get("scenes", [])):
+            for choice in cast(list[JsonDict], scene.get("choices", [])):
+                flags.update(as_str_list(choice.get("flags", [])))
+    for ending in raw_endings.values():
+        condition = cast(JsonDict, ending.get("unlock_condition", {}))
+        flags.update(as_str_list(condition.get("flags", [])))
+    return {flag: 1 << bit for bit, flag in enumerate(sorted(flags))}
+
+
+def _compile_scene(
+    raw: JsonDict,
+    position: ScenePosition,
+    chapters: dict[str, Chapter],
+    scene_to_chapter: dict[str, str],
+    flag_bits: dict[str, int],
+) -> Scene:
+    choices = tuple(
+        _compile_choice(choice, scene_to_chapter, flag_bits)
+        for choice in cast(list[JsonDict], raw.get("choices", []))
+    )
+    next_chapter = _optional_str(raw.get("next_chapter"))
+    target = chapters.get(next_chapter) if next_chapter else None
+    scene_id = str(raw["id"])
+    dialogue = str(raw.get("dialogue", ""))
+    return Scene(
+        id=scene_id,
+        position=position,
+        dialogue=dialogue,
+        dialogue_template=parse_dialogue(dialogue),
+        memory_templates=(
+            _split_for_memory(dialogue) if scene_id == MEMORY_SCENE_ID else None
+        ),
+        context=str(raw.get("context", "")),
+        luna_emotion=str(raw.get("luna_emotion", "neutre")),
+        is_chapter_end=bool(raw.get("is_chapter_end", False)),
+        is_ending_final=bool(raw.get("is_ending_final", False)),
+        ending_id=_optional_str(raw.get("ending_id")),
+        next_chapter=next_chapter,
+        next_chapter_title=target.title if target else "",
+        choices=choices,
+        # Premier choix gagnant en cas d'id dupliqué, comme l'ancien parcours.
+        choices_by_id={choice.id: choice for choice in reversed(choices) if choice.id},
+    )
+
+
+def _compile_choice(
+    raw: JsonDict, scene_to_chapter: dict[str, str], flag_bits: dict[str, int]
+) -> Choice:
+    next_scene = _optional_str(raw.get("next_scene"))
+    flags = tuple(as_str_list(raw.get("flags", [])))
+    return Choice(
+        id=str(raw.get("id", "")),
+        label=str(raw.get("label", "")),
+        trust_delta=safe_int(raw.get("trust_delta", 0), 0),
+        xp=safe_int(raw.get("xp", 0), 0),
+        flags=flags,
+        flags_mask=flag_mask(flag_bits, flags),
+        luna_reaction=_optional_str(raw.get("luna_reaction")),
+        next_scene=next_scene,
+        next_chapter=scene_to_chapter.get(next_scene) if next_scene else None,
+    )
+
+
+def _compile_ending(ending_id: str, raw: JsonDict, flag_bits: dict[str, int]) -> Ending:
+    condition = cast(JsonDict, raw.get("unlock_condition", {}))
+    required_flags = tuple(as_str_list(condition.get("flags", [])))
+    return Ending(
+        id=ending_id,
+        required_flags=required_flags,
+        required_mask=flag_mask(flag_bits, required_flags),
+        min_trust=safe_int(condition.get("min_trust", 0), 0),
+    )
@@ -5,31 +5,426 @@ Stocke l'état du joueur dans SQLite (data/luna_saves.db).
 Chaque joueur est identifié par un player_id (UUID stocké dans un cookie long).
 """
 
+import atexit
 import json
 import os
 import sqlite3
+import threading
 import time
 import uuid
+from collections.abc import Iterator, Mapping, Sequence
+from contextlib import AbstractContextManager, contextmanager
+from dataclasses import dataclass, replace
 from datetime import datetime, timezone
-from heapq import heappop, heappush
+from functools import partial
 from typing import Any, Optional, cast
 
+from config.settings import Settings, get_settings, on_reload
+from core import json_codec
+from core.leaderboard_cache import (
+    Cutoff,
+    LeaderboardCache,
+    LeaderboardSnapshot,
+    may_enter_leaderboard,
+)
+from core.state_cache import CachedState, PlayerStateCache, StateConflictError
+from core.state_codec import decode_state, encode_state, is_encoded_state
+from core.telemetry_sink import TelemetryRow, TelemetrySink
+
 JsonDict = dict[str, Any]
 
-DB_PATH = os.path.join(os.path.dirname(__file__), "..", "data", "luna_saves.db")
+# Réglages lus une fois (config/settings.py) ; SIGHUP en réapplique une
+# partie à chaud via ``apply_settings``.
+_SETTINGS = get_settings()
+
+DB_PATH = _SETTINGS.db_path
 _DB_LOCK_RETRIES = 3
+# Au-delà de cette durée d'inactivité, une connexion réutilisée est revalidée.
+_POOL_HEALTH_CHECK_INTERVAL_SECONDS = 30.0
+
+_JOURNAL_MODES = {"WAL", "DELETE", "TRUNCATE", "PERSIST", "MEMORY"}
+_SYNCHRONOUS_MODES = {"OFF", "NORMAL", "FULL", "EXTRA"}
+
+
+@dataclass(frozen=True)
+class StorageProfile:
+    """
+    Réglages SQLite appliqués à chaque connexion.
+
+    Le profil ``production`` (défaut) active WAL : les lectures ne bloquent
+    plus derrière l'écriture en cours et ``synchronous=NORMAL`` supprime le
+    fsync par commit (seul le checkpoint synchronise le fichier principal).
+    """
+
+    name: str
+    journal_mode: str
+    synchronous: str
+    busy_timeout_ms: int
+    mmap_size_bytes: int
+    cache_size_kib: int
+    wal_autocheckpoint_pages: int
+    checkpoint_interval_seconds: float
+
+
+STORAGE_PROFILES: dict[str, StorageProfile] = {
+    "production": StorageProfile(
+        name="production",
+        journal_mode="WAL",
+        synchronous="NORMAL",
+        busy_timeout_ms=5000,
+        mmap_size_bytes=64 * 1024 * 1024,
+        cache_size_kib=8 * 1024,
+        wal_autocheckpoint_pages=1000,
+        checkpoint_interval_seconds=60.0,
+    ),
+    # Comportement historique : journal rollback, fsync à chaque commit.
+    "legacy": StorageProfile(
+        name="legacy",
+        journal_mode="DELETE",
+        synchronous="FULL",
+        busy_timeout_ms=5000,
+        mmap_size_bytes=0,
+        cache_size_kib=2 * 1024,
+        wal_autocheckpoint_pages=1000,
+        checkpoint_interval_seconds=0.0,
+    ),
+}
+DEFAULT_STORAGE_PROFILE = "production"
+
+
+def load_storage_profile(environ: Optional[Mapping[str, str]] = None) -> StorageProfile:
+    """
+    Construit le profil de stockage depuis l'environnement.
+
+    ``STORY_DB_PROFILE`` choisit la base (``production`` ou ``legacy``), les
+    variables ``STORY_DB_*`` surchargent un réglage précis. Une valeur
+    invalide est ignorée au profit de celle du profil.
+    """
+    env = os.environ if environ is None else environ
+    profile_name = (env.get("STORY_DB_PROFILE") or DEFAULT_STORAGE_PROFILE).lower()
+    profile = STORAGE_PROFILES.get(
+        profile_name, STORAGE_PROFILES[DEFAULT_STORAGE_PROFILE]
+    )
+
+    def _env_choice(name: str, allowed: set[str], default: str) -> str:
+        raw = (env.get(name) or "").strip().upper()
+        return raw if raw in allowed else default
+
+    return replace(
+        profile,
+        journal_mode=_env_choice(
+            "STORY_DB_JOURNAL_MODE", _JOURNAL_MODES, profile.journal_mode
+        ),
+        synchronous=_env_choice(
+            "STORY_DB_SYNCHRONOUS", _SYNCHRONOUS_MODES, profile.synchronous
+        ),
+        busy_timeout_ms=_env_int(
+            env, "STORY_DB_BUSY_TIMEOUT_MS", profile.busy_timeout_ms
+        ),
+        mmap_size_bytes=_env_int(
+            env, "STORY_DB_MMAP_SIZE_BYTES", profile.mmap_size_bytes
+        ),
+        cache_size_kib=_env_int(env, "STORY_DB_CACHE_SIZE_KIB", profile.cache_size_kib),
+        checkpoint_interval_seconds=_env_float(
+            env,
+            "STORY_DB_CHECKPOINT_INTERVAL_SECONDS",
+            profile.checkpoint_interval_seconds,
+        ),
+    )
+
+
+def _env_int(env: Mapping[str, str], name: str, default: int) -> int:
+    raw = env.get(name)
+    if raw is None:
+        return default
+    try:
+        return max(0, int(raw))
+    except ValueError:
+        return default
+
+
+def _env_float(env: Mapping[str, str], name: str, default: float) -> float:
+    raw = env.get(name)
+    if raw is None:
+        return default
+    try:
+        return max(0.0, float(raw))
+    except ValueError:
+        return default
+
+
+STORAGE_PROFILE = load_storage_profile()
+
+# Cache du classement : TTL par worker, tampon partagé en SQLite pour que la
+# sauvegarde d'un worker invalide le cache des autres.
+LEADERBOARD_CACHE_TTL_SECONDS = _SETTINGS.leaderboard_cache_ttl_seconds
+LEADERBOARD_SHARED_STAMP = os.environ.get(
+    "STORY_LEADERBOARD_SHARED_STAMP", "1"
+).strip().lower() not in {"0", "false", "no", "off"}
+_LEADERBOARD_CACHE = LeaderboardCache(ttl_seconds=LEADERBOARD_CACHE_TTL_SECONDS)
 
+# Cache des états joueurs ; 0 ms désactive l'écriture différée.
+STATE_CACHE_SIZE = _SETTINGS.state_cache_size
+STATE_WRITE_BEHIND_MS = _SETTINGS.state_write_behind_ms
+# Attente maximale d'un worker qui trouve le bail d'un autre worker actif.
+_LEASE_WAIT_MAX_SECONDS = 2.0
 
-def _get_conn() -> sqlite3.Connection:
-    os.makedirs(os.path.dirname(DB_PATH), exist_ok=True)
-    conn = sqlite3.connect(DB_PATH, timeout=5.0)
+# Format de state_json : "compact" (BLOB de core/state_codec.py) ou "json".
+# La lecture accepte toujours les deux : les lignes JSON existantes sont
+# réécrites au format compact à leur prochaine sauvegarde.
+STATE_CODEC = os.environ.get("STORY_STATE_CODEC", "compact").strip().lower()
+STATE_COMPRESS_MIN_BYTES = _env_int(os.environ, "STORY_STATE_COMPRESS_MIN_BYTES", 256)
+
+
+class _PooledConnection:
+    __slots__ = ("conn", "db_path", "last_used")
+
+    def __init__(self, conn: sqlite3.Connection, db_path: str) -> None:
+        self.conn = conn
+        self.db_path = db_path
+        self.last_used = time.monotonic()
+
+
+class _ConnectionPool:
+    """
+    Pool de connexions SQLite : une connexion par thread, propre au processus.
+
+    Les connexions ouvertes avant un fork (gunicorn ``preload_app``) ne sont
+    jamais réutilisées dans le processus enfant : SQLite interdit de partager
+    une connexion entre processus.
+    """
+
+    def __init__(self, health_check_interval: float) -> None:
+        self._health_check_interval = health_check_interval
+        self._lock = threading.Lock()
+        self._reset_process_state()
+        if hasattr(os, "register_at_fork"):
+            os.register_at_fork(after_in_child=self._reset_process_state)
+
+    def _reset_process_state(self) -> None:
+        # Après un fork, on abandonne les connexions héritées sans les fermer :
+        # la fermeture appartient au processus parent qui les a ouvertes.
+        self._local = threading.local()
+        self._connections: dict[int, _PooledConnection] = {}
+        self._ready_dirs: set[str] = set()
+        self._ready_dbs: set[str] = set()
+        self._last_checkpoint = time.monotonic()
+        self._checkpoints = 0
+        self._opened = 0
+        self._reused = 0
+        self._discarded = 0
+        self._health_check_failures = 0
+
+    @contextmanager
+    def connection(self, db_path: str) -> Iterator[sqlite3.Connection]:
+        pooled = self._checkout(db_path)
+        try:
+            yield pooled.conn
+            self._maybe_checkpoint(pooled.conn)
+        except sqlite3.DatabaseError as exc:
+            _rollback_quietly(pooled.conn)
+            if not _is_locked_error(exc):
+                # Fichier corrompu, disque plein... : on ne garde pas la connexion.
+                self._discard(pooled)
+            raise
+        except BaseException:
+            _rollback_quietly(pooled.conn)
+            raise
+        finally:
+            pooled.last_used = time.monotonic()
+
+    def _checkout(self, db_path: str) -> _PooledConnection:
+        pooled = cast(Optional[_PooledConnection], getattr(self._local, "pooled", None))
+        if pooled is not None:
+            if pooled.db_path != db_path:
+                self._discard(pooled)
+            elif self._is_healthy(pooled):
+                with self._lock:
+                    self._reused += 1
+                return pooled
+            else:
+                self._discard(pooled)
+
+        with self._lock:
+            apply_journal_mode = db_path not in self._ready_dbs
+            self._ready_dbs.add(db_path)
+        conn = _open_conn(
+            db_path,
+            ready_dirs=self._ready_dirs,
+            apply_journal_mode=apply_journal_mode,
+        )
+        pooled = _PooledConnection(conn, db_path)
+        self._local.pooled = pooled
+        with self._lock:
+            self._opened += 1
+            # Identifiant repris d'un thread terminé : sa connexion est orpheline.
+            orphan = self._connections.get(threading.get_ident())
+            self._connections[threading.get_ident()] = pooled
+        if orphan is not None:
+            try:
+                orphan.conn.close()
+            except sqlite3.Error:
+                pass
+        return pooled
+
+    def _maybe_checkpoint(self, conn: sqlite3.Connection) -> None:
+        profile = STORAGE_PROFILE
+        interval = profile.checkpoint_interval_seconds
+        if profile.journal_mode != "WAL" or interval <= 0:
+            return
+        now = time.monotonic()
+        with self._lock:
+            if (now - self._last_checkpoint) < interval:
+                return
+            self._last_checkpoint = now
+            self._checkpoints += 1
+        # PASSIVE : recopie ce qui peut l'être sans attendre lecteurs/écrivains.
+        try:
+            conn.execute("PRAGMA wal_checkpoint(PASSIVE)").fetchone()
+        except sqlite3.OperationalError as exc:
+            if not _is_locked_error(exc):
+                raise
+
+    def _is_healthy(self, pooled: _PooledConnection) -> bool:
+        if (time.monotonic() - pooled.last_used) < self._health_check_interval:
+            return True
+        try:
+            pooled.conn.execute("SELECT 1").fetchone()
+            return True
+        except sqlite3.Error:
+            with self._lock:
+                self._health_check_failures += 1
+            return False
+
+    def _discard(self, pooled: _PooledConnection) -> None:
+        if getattr(self._local, "pooled", None) is pooled:
+            self._local.pooled = None
+        with self._lock:
+            self._discarded += 1
+            for ident, candidate in list(self._connections.items()):
+                if candidate is pooled:
+                    del self._connections[ident]
+        try:
+            pooled.conn.close()
+        except sqlite3.Error:
+            pass
+
+    def close_all(self) -> None:
+        """Ferme toutes les connexions du processus courant (arrêt du worker)."""
+        with self._lock:
+            pooled_items = list(self._connections.values())
+            self._connections.clear()
+        self._local = threading.local()
+        for pooled in pooled_items:
+            try:
+                pooled.conn.close()
+            except sqlite3.Error:
+                pass
+
+    def stats(self) -> JsonDict:
+        with self._lock:
+            alive = {thread.ident for thread in threading.enumerate()}
+            for ident in [i for i in self._connections if i not in alive]:
+                # Thread terminé : sa connexion n'est plus atteignable.
+                stale = self._connections.pop(ident)
+                try:
+                    stale.conn.close()
+                except sqlite3.Error:
+                    pass
+            checkouts = self._opened + self._reused
+            return {
+                "pid": os.getpid(),
+                "size": len(self._connections),
+                "opened": self._opened,
+                "reused": self._reused,
+                "discarded": self._discarded,
+                "health_check_failures": self._health_check_failures,
+                "checkpoints": self._checkpoints,
+                "storage_profile": STORAGE_PROFILE.name,
+                "journal_mode": STORAGE_PROFILE.journal_mode,
+                "hit_rate": round(self._reused / checkouts, 4) if checkouts else 0.0,
+            }
+
+
+def _rollback_quietly(conn: sqlite3.Connection) -> None:
+    try:
+        conn.rollback()
+    except sqlite3.Error:
+        pass
+
+
+def _open_conn(
+    db_path: str,
+    ready_dirs: Optional[set[str]] = None,
+    profile: Optional[StorageProfile] = None,
+    apply_journal_mode: bool = True,
+) -> sqlite3.Connection:
+    active = STORAGE_PROFILE if profile is None else profile
+    db_dir = os.path.dirname(db_path)
+    if ready_dirs is None or db_dir not in ready_dirs:
+        os.makedirs(db_dir, exist_ok=True)
+        if ready_dirs is not None:
+            ready_dirs.add(db_dir)
+    # check_same_thread=False : le pool garantit qu'une connexion ne sert qu'à
+    # un thread, mais doit pouvoir la fermer depuis un autre (arrêt du worker).
+    conn = sqlite3.connect(
+        db_path,
+        timeout=active.busy_timeout_ms / 1000,
+        check_same_thread=False,
+    )
     conn.row_factory = sqlite3.Row
+    try:
+        _apply_storage_profile(conn, active, apply_journal_mode)
+    except sqlite3.Error:
+        conn.close()
+        raise
     return conn
 
 
+def _apply_storage_profile(
+    conn: sqlite3.Connection, profile: StorageProfile, apply_journal_mode: bool
+) -> None:
+    # Les valeurs interpolées sont validées par load_storage_profile().
+    conn.execute(f"PRAGMA busy_timeout = {int(profile.busy_timeout_ms)}")
+    if apply_journal_mode:
+        # Le mode de journal est persistant : une fois par base et par processus.
+        try:
+            conn.execute(f"PRAGMA journal_mode = {profile.journal_mode}").fetchone()
+        except sqlite3.OperationalError as exc:
+            if not _is_locked_error(exc):
+                raise
+    conn.execute(f"PRAGMA synchronous = {profile.synchronous}")
+    conn.execute(f"PRAGMA cache_size = -{int(profile.cache_size_kib)}")
+    conn.execute(f"PRAGMA mmap_size = {int(profile.mmap_size_bytes)}")
+    if profile.journal_mode == "WAL":
+        conn.execute(
+            f"PRAGMA wal_autocheckpoint = {int(profile.wal_autocheckpoint_pages)}"
+        )
+
+
+_POOL = _ConnectionPool(health_check_interval=_POOL_HEALTH_CHECK_INTERVAL_SECONDS)
+
+
+def _get_conn() -> AbstractContextManager[sqlite3.Connection]:
+    """Connexion poolée pour le thread courant (à utiliser avec ``with``)."""
+    return _POOL.connection(DB_PATH)
+
+
+def get_pool_stats() -> JsonDict:
+    """Compteurs du pool de connexions (taille, ouvertures, réutilisations)."""
+    return _POOL.stats()
+
+
+def close_connections() -> None:
+    """Ferme les connexions SQLite du processus (hook d'arrêt gunicorn)."""
+    _POOL.close_all()
+
+
 def init_db() -> None:
     """Crée la table saves si elle n'existe pas."""
-    with _get_conn() as conn:
+    # Connexion dédiée, hors pool : la migration ne s'exécute qu'une fois.
+    conn = _open_conn(DB_PATH)
+    try:
         conn.execute(
             """
             CREATE TABLE IF NOT EXISTS story_telemetry (
@@ -62,10 +457,136 @@ def init_db() -> None:
             ON story_telemetry(created_at)
         """
         )
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS story_leaderboard_meta (
+                id            INTEGER PRIMARY KEY CHECK (id = 1),
+                stamp         INTEGER NOT NULL,
+                cutoff_xp     INTEGER,
+                cutoff_trust  INTEGER
+            )
+        """
+        )
+        conn.execute(
+            "INSERT OR IGNORE INTO story_leaderboard_meta (id, stamp) VALUES (1, 0)"
+        )
+        _migrate_leaderboard_columns(conn)
+        _migrate_state_columns(conn)
         conn.commit()
+    finally:
+        conn.close()
+
+
+# Colonnes dénormalisées pour le classement, maintenues par save_state().
+# NULL dans ``xp`` signifie « pas encore matérialisé » (ligne antérieure à la
+# migration ou écrite par un autre outil) : _backfill_leaderboard_columns()
+# les complète une fois, dans la migration d'init_db() ; la lecture du
+# classement n'écrit jamais.
+_LEADERBOARD_COLUMNS: dict[str, str] = {
+    "xp": "INTEGER",
+    "luna_trust": "INTEGER",
+    "chapters_done": "INTEGER",
+    "endings_json": "TEXT",
+    "display_name": "TEXT",
+}
+
+
+# Concurrence entre workers : ``version`` est incrémentée à chaque écriture ;
+# ``lease_owner``/``lease_until`` signalent qu'un worker peut détenir des
+# écritures différées pour ce joueur (voir core/state_cache.py).
+_STATE_COLUMNS: dict[str, str] = {
+    "version": "INTEGER NOT NULL DEFAULT 0",
+    "lease_owner": "TEXT",
+    "lease_until": "REAL NOT NULL DEFAULT 0",
+}
+
+
+def _add_missing_columns(conn: sqlite3.Connection, columns: dict[str, str]) -> None:
+    existing = {
+        str(row["name"])
+        for row in conn.execute("PRAGMA table_info(story_saves)").fetchall()
+    }
+    for column, column_type in columns.items():
+        if column not in existing:
+            conn.execute(f"ALTER TABLE story_saves ADD COLUMN {column} {column_type}")
+
+
+def _migrate_state_columns(conn: sqlite3.Connection) -> None:
+    _add_missing_columns(conn, _STATE_COLUMNS)
+
 
+def _migrate_leaderboard_columns(conn: sqlite3.Connection) -> None:
+    _add_missing_columns(conn, _LEADERBOARD_COLUMNS)
+    conn.execute(
+        """
+        CREATE INDEX IF NOT EXISTS idx_story_saves_leaderboard
+        ON story_saves(xp DESC, luna_trust DESC, updated_at DESC)
+    """
+    )
+    _backfill_leaderboard_columns(conn)
 
-def _is_locked_error(exc: sqlite3.OperationalError) -> bool:
+
+def _backfill_leaderboard_columns(conn: sqlite3.Connection) -> int:
+    """Matérialise les colonnes de classement des lignes où elles manquent."""
+    rows = conn.execute(
+        "SELECT player_id, state_json FROM story_saves WHERE xp IS NULL"
+    ).fetchall()
+    if not rows:
+        return 0
+    updates: list[tuple[object, ...]] = []
+    for row in rows:
+        state = _decode_state(row["state_json"]) or {}
+        updates.append((*_leaderboard_columns(state), row["player_id"]))
+    conn.executemany(
+        """
+        UPDATE story_saves
+        SET xp = ?, luna_trust = ?, chapters_done = ?, endings_json = ?,
+            display_name = ?
+        WHERE player_id = ?
+    """,
+        updates,
+    )
+    return len(updates)
+
+
+def _leaderboard_columns(state: JsonDict) -> tuple[int, int, int, str, str]:
+    raw_name = str(state.get("player_name") or "").strip()
+    if raw_name:
+        # Garder les 3 premiers caractères + *** pour la confidentialité
+        display_name = raw_name[:3] + "***" if len(raw_name) > 3 else raw_name + "***"
+    else:
+        display_name = "Joueur anonyme"
+    return (
+        _safe_int(state.get("xp", 0), 0),
+        _safe_int(state.get("luna_trust", 50), 50),
+        len(_as_str_list(state.get("chapters_completed", []))),
+        json_codec.dumps(_as_str_list(state.get("endings_unlocked", []))),
+        display_name,
+    )
+
+
+def _encode_state(state: JsonDict) -> object:
+    if STATE_CODEC == "json":
+        return json_codec.dumps(state)
+    return encode_state(state, STATE_COMPRESS_MIN_BYTES)
+
+
+def _decode_state(raw: object) -> Optional[JsonDict]:
+    if is_encoded_state(raw):
+        try:
+            return decode_state(cast(bytes, raw))
+        except ValueError:
+            return None
+    try:
+        loaded = json_codec.loads(cast(str, raw))
+    except (json.JSONDecodeError, TypeError):
+        return None
+    if not isinstance(loaded, dict):
+        return None
+    return cast(JsonDict, loaded)
+
+
+def _is_locked_error(exc: sqlite3.Error) -> bool:
     return "locked" in str(exc).lower()
 
 
@@ -116,52 +637,317 @@ def generate_player_id() -> str:
     return str(uuid.uuid4())
 
 
-def save_state(player_id: str, state: JsonDict) -> None:
-    """Sauvegarde (upsert) l'état du joueur."""
+def _copy_state(state: JsonDict) -> JsonDict:
+    """
+    Copie un état joueur pour qu'une route puisse le muter sans toucher au
+    cache. Les valeurs d'un état sont des scalaires ou des listes/dicts plats.
+    """
+    return {
+        key: (
+            list(cast(list[object], value))
+            if isinstance(value, list)
+            else dict(cast(JsonDict, value)) if isinstance(value, dict) else value
+        )
+        for key, value in state.items()
+    }
+
+
+def _lease_owner() -> str:
+    # Un seul hôte partage le fichier SQLite : le PID suffit à identifier un
+    # worker, et change naturellement après un fork.
+    return str(os.getpid())
 
-    def _write() -> None:
-        with _get_conn() as conn:
-            conn.execute(
+
+def _lease_seconds() -> float:
+    """Durée d'un bail : couvre une fenêtre d'écriture différée complète."""
+    return 2 * _STATE_CACHE.flush_interval
+
+
+def save_state(
+    player_id: str, state: JsonDict, expected_version: Optional[int] = None
+) -> int:
+    """
+    Sauvegarde (upsert) l'état du joueur, immédiatement et durablement, et
+    retourne sa nouvelle version.
+
+    Avec ``expected_version`` (version lue par ``load_state_versioned``),
+    l'écriture est un compare-and-swap : ``StateConflictError`` si l'état a
+    changé entre-temps (double clic, deuxième onglet).
+    """
+    return cast(int, _write_state(player_id, state, expected_version=expected_version))
+
+
+def stage_state(
+    player_id: str, state: JsonDict, expected_version: Optional[int] = None
+) -> int:
+    """
+    Sauvegarde différée : l'état est gardé en cache et écrit au plus une fois
+    par fenêtre ``STORY_STATE_WRITE_BEHIND_MS``. Retourne la nouvelle version.
+
+    La première écriture d'une rafale est immédiate et prend un bail sur la
+    ligne ; les suivantes restent en mémoire tant que le bail couvre leur
+    échéance. Un joueur écrit par un autre worker (routage non collant)
+    repasse en écriture immédiate. ``expected_version`` : comme ``save_state``.
+    """
+    snapshot = _copy_state(state)
+    if _STATE_CACHE.write_behind:
+        staged = _STATE_CACHE.stage(player_id, snapshot, DB_PATH, expected_version)
+        if staged is not None:
+            return staged
+        entry = _STATE_CACHE.lookup(player_id, DB_PATH)
+        if entry is None or not entry.shared:
+            lease_until = time.time() + _lease_seconds()
+            version = _write_state(player_id, snapshot, expected_version, lease_until)
+            if version is not None:
+                return version
+            # Bail détenu par un autre worker : ce joueur est servi par plusieurs.
+            _STATE_CACHE.mark_shared(player_id)
+    return cast(int, _write_state(player_id, snapshot, expected_version))
+
+
+def _write_state(
+    player_id: str,
+    state: JsonDict,
+    expected_version: Optional[int] = None,
+    lease_until: float = 0.0,
+) -> Optional[int]:
+    """
+    Écrit l'état, met à jour le cache et retourne la nouvelle version.
+
+    Sans ``expected_version`` : upsert inconditionnel. Sinon : compare-and-swap
+    sur la version de la ligne (``StateConflictError`` si elle a bougé).
+    Avec ``lease_until``, prend aussi le bail de la ligne ; retourne None si un
+    autre worker le détient encore. Sans bail, tout bail existant est libéré.
+    """
+    columns = _leaderboard_columns(state)
+    lease_owner = _lease_owner() if lease_until else None
+    values = (
+        _encode_state(state),
+        datetime.now(timezone.utc).isoformat(),
+        *columns,
+        lease_owner,
+        lease_until,
+    )
+    lease_params = (lease_owner, time.time()) if lease_owner else ()
+
+    def _flushed_version(entry: Optional[CachedState]) -> int:
+        """Version que la ligne doit avoir pour accepter ``expected_version``."""
+        assert expected_version is not None
+        if entry is None:
+            return expected_version
+        if entry.version == expected_version:
+            # Écritures différées en attente : la ligne est à flushed_version.
+            return entry.flushed_version
+        if entry.lease_until > time.time():
+            # Sous bail, l'entrée fait foi : la version attendue est dépassée.
+            raise StateConflictError(player_id, expected_version)
+        return expected_version
+
+    def _upsert(conn: sqlite3.Connection, floor: int) -> Optional[int]:
+        cursor = conn.execute(
+            f"""
+            INSERT INTO story_saves (
+                player_id, state_json, updated_at,
+                xp, luna_trust, chapters_done, endings_json, display_name,
+                lease_owner, lease_until, version
+            )
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ? + 1)
+            ON CONFLICT(player_id) DO UPDATE SET
+                state_json = excluded.state_json,
+                updated_at = excluded.updated_at,
+                xp = excluded.xp,
+                luna_trust = excluded.luna_trust,
+                chapters_done = excluded.chapters_done,
+                endings_json = excluded.endings_json,
+                display_name = excluded.display_name,
+                lease_owner = excluded.lease_owner,
+                lease_until = excluded.lease_until,
+                version = MAX(story_saves.version + 1, excluded.version)
+            {"WHERE " + _LEASE_GUARD if lease_owner else ""}
+        """,
+            (player_id, *values, floor, *lease_params),
+        )
+        if cursor.rowcount == 0:
+            return None
+        row = conn.execute(
+            "SELECT version FROM story_saves WHERE player_id = ?", (player_id,)
+        ).fetchone()
+        return int(row["version"])
+
+    def _compare_and_swap(
+        conn: sqlite3.Connection, expected: int, flushed: int
+    ) -> Optional[int]:
+        cursor = conn.execute(
+            f"""
+            UPDATE story_saves
+            SET state_json = ?, updated_at = ?,
+                xp = ?, luna_trust = ?, chapters_done = ?, endings_json = ?,
+                display_name = ?, lease_owner = ?, lease_until = ?,
+                version = ?
+            WHERE player_id = ? AND version = ?
+            {"AND " + _LEASE_GUARD if lease_owner else ""}
+        """,
+            (*values, expected + 1, player_id, flushed, *lease_params),
+        )
+        if cursor.rowcount:
+            return expected + 1
+        row = conn.execute(
+            "SELECT version FROM story_saves WHERE player_id = ?", (player_id,)
+        ).fetchone()
+        if row is None or int(row["version"]) != flushed:
+            raise StateConflictError(player_id, expected)
+        return None  # version à jour, mais bail refusé
+
+    def _write() -> Optional[int]:
+        with _STATE_CACHE.write_lock_for(player_id), _get_conn() as conn:
+            entry = _STATE_CACHE.lookup(player_id, DB_PATH)
+            try:
+                if expected_version is None:
+                    # Jamais en dessous d'une version déjà vue par ce processus.
+                    floor = entry.version if entry is not None else 0
+                    version = _upsert(conn, floor)
+                else:
+                    version = _compare_and_swap(
+                        conn, expected_version, _flushed_version(entry)
+                    )
+            except StateConflictError:
+                conn.rollback()
+                _STATE_CACHE.discard_clean(player_id)
+                raise
+            if version is None:
+                conn.rollback()
+                return None
+            _note_leaderboard_write(conn, xp=columns[0], trust=columns[1])
+            conn.commit()
+            _STATE_CACHE.store(
+                player_id, _copy_state(state), version, DB_PATH, lease_until
+            )
+            return version
+
+    return cast(Optional[int], _with_db_retry(_write))
+
+
+# Le bail n'est pris que s'il est libre, expiré ou déjà à nous
+# (paramètres : propriétaire, maintenant).
+_LEASE_GUARD = """(
+                story_saves.lease_owner IS NULL
+                OR story_saves.lease_owner = ?
+                OR story_saves.lease_until <= ?
+            )"""
+
+
+def _flush_cached_state(
+    player_id: str, state: JsonDict, version: int, flushed_version: int, db_path: str
+) -> bool:
+    """
+    Écriture différée (thread du cache) : compare-and-swap de
+    ``flushed_version`` vers la version logique ``version``.
+    """
+
+    def _write() -> bool:
+        with _POOL.connection(db_path) as conn:
+            cursor = conn.execute(
                 """
-                INSERT INTO story_saves (player_id, state_json, updated_at)
-                VALUES (?, ?, ?)
-                ON CONFLICT(player_id) DO UPDATE SET
-                    state_json = excluded.state_json,
-                    updated_at = excluded.updated_at
+                UPDATE story_saves
+                SET state_json = ?, updated_at = ?,
+                    xp = ?, luna_trust = ?, chapters_done = ?, endings_json = ?,
+                    display_name = ?, version = ?
+                WHERE player_id = ? AND version = ?
             """,
                 (
-                    player_id,
-                    json.dumps(state, ensure_ascii=False),
+                    _encode_state(state),
                     datetime.now(timezone.utc).isoformat(),
+                    *columns,
+                    version,
+                    player_id,
+                    flushed_version,
                 ),
             )
+            if cursor.rowcount == 0:
+                conn.rollback()
+                return False
+            _note_leaderboard_write(conn, xp=columns[0], trust=columns[1])
             conn.commit()
+            return True
 
-    _with_db_retry(_write)
+    columns = _leaderboard_columns(state)
+    return cast(bool, _with_db_retry(_write))
 
 
 def load_state(player_id: str) -> Optional[JsonDict]:
     """Charge l'état du joueur. Retourne None si introuvable."""
+    loaded = load_state_versioned(player_id)
+    return loaded[0] if loaded is not None else None
+
+
+def load_state_versioned(player_id: str) -> Optional[tuple[JsonDict, int]]:
+    """
+    Charge ``(état, version)`` ; la version sert d'``expected_version`` à
+    ``save_state``/``stage_state``. Retourne None si introuvable.
+    """
+    entry = _STATE_CACHE.lookup(player_id, DB_PATH)
+    if entry is not None and entry.lease_until > time.time():
+        # Bail détenu par ce processus : aucun autre worker n'a pu écrire.
+        _STATE_CACHE.record_lookup(hit=True)
+        return _copy_state(entry.state), entry.version
+    try:
+        return _load_state_row(player_id, entry)
+    except sqlite3.DatabaseError:
+        return None
+
+
+def _load_state_row(
+    player_id: str, entry: Optional[CachedState]
+) -> Optional[tuple[JsonDict, int]]:
+    known_version = entry.flushed_version if entry is not None else -1
 
     def _read() -> Optional[sqlite3.Row]:
         with _get_conn() as conn:
+            # state_json n'est relu que si la version a changé.
             return conn.execute(
-                "SELECT state_json FROM story_saves WHERE player_id = ?", (player_id,)
+                """
+                SELECT version, lease_owner, lease_until,
+                       CASE WHEN version = ? THEN NULL ELSE state_json END
+                           AS state_json
+                FROM story_saves WHERE player_id = ?
+            """,
+                (known_version, player_id),
             ).fetchone()
 
-    try:
+    deadline = time.monotonic() + _LEASE_WAIT_MAX_SECONDS
+    waited = False
+    while True:
         row = _with_db_retry(_read)
-    except sqlite3.DatabaseError:
-        return None
-    if row:
-        try:
-            loaded = json.loads(row["state_json"])
-        except (json.JSONDecodeError, TypeError):
-            return None
-        if not isinstance(loaded, dict):
+        if row is None:
+            _STATE_CACHE.discard(player_id)
+            _STATE_CACHE.record_lookup(hit=False)
             return None
-        return cast(JsonDict, loaded)
-    return None
+        remaining = float(row["lease_until"] or 0) - time.time()
+        foreign_lease = row["lease_owner"] not in (None, _lease_owner())
+        if not (foreign_lease and remaining > 0 and time.monotonic() < deadline):
+            break
+        # Un autre worker diffère peut-être des écritures pour ce joueur :
+        # attendre la fin de son bail (il aura écrit avant), puis relire.
+        waited = True
+        _STATE_CACHE.record_lease_wait()
+        time.sleep(min(remaining, max(0.0, deadline - time.monotonic())))
+
+    version = int(row["version"])
+    if entry is not None and row["state_json"] is None:
+        _STATE_CACHE.record_lookup(hit=True)
+        return _copy_state(entry.state), entry.version
+    _STATE_CACHE.record_lookup(hit=False)
+    state = _decode_state(row["state_json"])
+    if state is None:
+        _STATE_CACHE.discard(player_id)
+        return None
+    # Version inattendue ou bail étranger : le routage n'est pas collant.
+    shared = waited or entry is not None
+    # Lecture faite hors verrou d'écriture : un autre thread a pu poser plus récent
+    # entre-temps (store_loaded le garde ; la version lue ici lèvera alors
+    # StateConflictError à l'écriture).
+    _STATE_CACHE.store_loaded(player_id, state, version, DB_PATH, shared=shared)
+    return _copy_state(state), version
 
 
 def delete_state(player_id: str) -> None:
@@ -169,28 +955,99 @@ def delete_state(player_id: str) -> None:
     Supprime la sauvegarde du joueur (reset).
     Preserve les fins débloquées dans previous_endings pour que LUNA s'en souvienne.
     """
-    old = load_state(player_id)
-    previous: list[str] = []
-    if old:
-        previous = cast(list[str], old.get("previous_endings", []))
-        for eid in cast(list[str], old.get("endings_unlocked", [])):
-            if eid not in previous:
-                previous.append(eid)
+    for attempt in range(_DELETE_ATTEMPTS):
+        # Lecture hors verrou d'écriture : elle peut attendre jusqu'à
+        # _LEASE_WAIT_MAX_SECONDS le bail d'un autre worker.
+        loaded = load_state_versioned(player_id)
+        last_attempt = attempt == _DELETE_ATTEMPTS - 1
+        with _STATE_CACHE.write_lock_for(player_id):
+            # Sous le verrou d'écriture du joueur : aucune écriture différée ne peut
+            # recréer la ligne entre la vérification et la suppression.
+            deleted = _with_db_retry(
+                partial(_delete_state_row, player_id, loaded, force=last_attempt)
+            )
+            if not deleted:
+                continue  # écrit entre la lecture et le verrou : on relit
+            old = loaded[0] if loaded is not None else None
+            previous: list[str] = []
+            if old:
+                previous = cast(list[str], old.get("previous_endings", []))
+                for eid in cast(list[str], old.get("endings_unlocked", [])):
+                    if eid not in previous:
+                        previous.append(eid)
 
-    def _delete() -> None:
-        with _get_conn() as conn:
-            conn.execute("DELETE FROM story_saves WHERE player_id = ?", (player_id,))
-            conn.commit()
+            # Réinjecter dans le nouvel état vide si il y a eu des fins
+            if previous:
+                from core.story_engine import get_story_engine
+
+                new_state = get_story_engine().new_player_state()
+                new_state["previous_endings"] = previous
+                save_state(player_id, new_state)
+            return
+
+
+# Relectures avant de supprimer sans revérifier la version (reset répété
+# pendant qu'un autre onglet joue).
+_DELETE_ATTEMPTS = 3
+
+
+def _delete_state_row(
+    player_id: str, loaded: Optional[tuple[JsonDict, int]], force: bool
+) -> bool:
+    """
+    Supprime la ligne si elle est encore à la version lue par ``delete_state``
+    (appelée sous ``write_lock_for(player_id)``). False si elle a changé depuis, sauf avec
+    ``force``.
+    """
+    entry = _STATE_CACHE.lookup(player_id, DB_PATH)
+    row_version: Optional[int] = None
+    if loaded is not None:
+        version = loaded[1]
+        if entry is not None and entry.version == version:
+            # Écritures différées en attente : la ligne est à flushed_version.
+            row_version = entry.flushed_version
+        elif entry is not None and entry.version > version and not force:
+            return False
+        else:
+            row_version = version
+    elif entry is not None and not force:
+        return False
+
+    with _get_conn() as conn:
+        if row_version is None or force:
+            cursor = conn.execute(
+                "DELETE FROM story_saves WHERE player_id = ?", (player_id,)
+            )
+            unchanged = force or cursor.rowcount == 0
+        else:
+            cursor = conn.execute(
+                "DELETE FROM story_saves WHERE player_id = ? AND version = ?",
+                (player_id, row_version),
+            )
+            unchanged = cursor.rowcount == 1
+        if not unchanged:
+            conn.rollback()
+            return False
+        if loaded is not None:
+            old_xp, old_trust = _leaderboard_columns(loaded[0])[:2]
+            _note_leaderboard_write(conn, xp=old_xp, trust=old_trust)
+        conn.commit()
+    _STATE_CACHE.discard(player_id)
+    return True
 
-    _with_db_retry(_delete)
 
-    # Réinjecter dans le nouvel état vide si il y a eu des fins
-    if previous:
-        from core.story_engine import get_story_engine
+def flush_states() -> None:
+    """Écrit immédiatement les états en attente (fin de chapitre, tests)."""
+    _STATE_CACHE.flush()
 
-        new_state = get_story_engine().new_player_state()
-        new_state["previous_endings"] = previous
-        save_state(player_id, new_state)
+
+def close_state_cache() -> None:
+    """Écrit les états en attente et arrête le thread (arrêt du worker)."""
+    _STATE_CACHE.close()
+
+
+def get_state_cache_stats() -> JsonDict:
+    return _STATE_CACHE.stats()
 
 
 def get_save_summary(player_id: str) -> Optional[JsonDict]:
@@ -206,6 +1063,7 @@ def get_save_summary(player_id: str) -> Optional[JsonDict]:
         "exists": True,
         "player_name": _safe_str(state.get("player_name"), ""),
         "current_chapter": _safe_str(state.get("current_chapter"), "chapitre_0"),
+        "current_scene": _safe_str(state.get("current_scene"), "s0_0"),
         "luna_trust": _safe_int(state.get("luna_trust", 50), 50),
         "xp": _safe_int(state.get("xp", 0), 0),
         "chapters_completed": len(chapters_completed),
@@ -219,89 +1077,230 @@ def get_save_summary(player_id: str) -> Optional[JsonDict]:
 def get_leaderboard(limit: int = 10) -> list[JsonDict]:
     """
     Retourne le classement des meilleurs joueurs (par XP décroissant).
-    Le nom est anonymisé : les 3 premiers caractères + '***' (ou 'Joueur ???' si absent).
+    Le nom est anonymisé : les 3 premiers caractères + '***' (ou 'Joueur anonyme' si absent).
     """
-    with _get_conn() as conn:
-        rows = conn.execute(
-            "SELECT player_id, state_json FROM story_saves ORDER BY updated_at DESC"
-        ).fetchall()
 
-    max_entries = max(1, limit)
-    top_entries: list[tuple[int, int, int, JsonDict]] = []
-    for idx, row in enumerate(rows):
+    def _read() -> list[sqlite3.Row]:
+        with _get_conn() as conn:
+            # Parcours de idx_story_saves_leaderboard, arrêté après ``limit`` lignes.
+            return conn.execute(
+                """
+                SELECT display_name, xp, luna_trust, chapters_done, endings_json
+                FROM story_saves
+                WHERE xp <> 0
+                ORDER BY xp DESC, luna_trust DESC, updated_at DESC
+                LIMIT ?
+            """,
+                (max(1, limit),),
+            ).fetchall()
+
+    entries: list[JsonDict] = []
+    for row in _with_db_retry(_read):
         try:
-            state = cast(JsonDict, json.loads(row["state_json"]))
-        except (json.JSONDecodeError, TypeError):
-            continue
+            endings_unlocked = _as_str_list(
+                json_codec.loads(row["endings_json"] or "[]")
+            )
+        except json.JSONDecodeError:
+            endings_unlocked = []
+        entries.append(
+            {
+                "name": str(row["display_name"]),
+                "xp": int(row["xp"]),
+                "luna_trust": int(row["luna_trust"]),
+                "chapters_done": int(row["chapters_done"]),
+                "endings_unlocked": endings_unlocked,
+            }
+        )
+    return entries
 
-        xp = _safe_int(state.get("xp", 0), 0)
-        if xp == 0:
-            continue  # Ignorer les joueurs sans progression
 
-        trust = _safe_int(state.get("luna_trust", 50), 50)
+def get_leaderboard_snapshot(limit: int = 10) -> LeaderboardSnapshot:
+    """
+    Classement mis en cache : scores, corps JSON pré-sérialisé et ETag.
 
-        raw_name = str(state.get("player_name") or "").strip()
-        if raw_name:
-            # Garder les 3 premiers caractères + *** pour la confidentialité
-            display_name = (
-                raw_name[:3] + "***" if len(raw_name) > 3 else raw_name + "***"
-            )
-        else:
-            display_name = "Joueur anonyme"
-
-        chapters_done = len(_as_str_list(state.get("chapters_completed", [])))
-        endings_unlocked = _as_str_list(state.get("endings_unlocked", []))
-
-        entry = {
-            "name": display_name,
-            "xp": xp,
-            "luna_trust": trust,
-            "chapters_done": chapters_done,
-            "endings_unlocked": endings_unlocked,
-        }
-        score = (xp, trust)
-        tie_breaker = -idx
-        if len(top_entries) < max_entries:
-            heappush(top_entries, (score[0], score[1], tie_breaker, entry))
-            continue
-        worst_xp, worst_trust, worst_tie_breaker, _ = top_entries[0]
-        if (score[0], score[1], tie_breaker) > (
-            worst_xp,
-            worst_trust,
-            worst_tie_breaker,
-        ):
-            heappop(top_entries)
-            heappush(top_entries, (score[0], score[1], tie_breaker, entry))
-
-    # Trier final par XP décroissant, puis trust décroissant
-    sorted_entries = sorted(
-        top_entries,
-        key=lambda item: (-item[0], -item[1], -item[2]),
+    Recalculé après ``LEADERBOARD_CACHE_TTL_SECONDS`` ou dès qu'une sauvegarde
+    susceptible de modifier le top N a incrémenté le tampon du classement.
+    """
+    limit = max(1, limit)
+    return _LEADERBOARD_CACHE.get(
+        limit, _read_leaderboard_stamp(), _compute_leaderboard
     )
-    return [item[3] for item in sorted_entries]
+
+
+def get_leaderboard_cache_stats() -> JsonDict:
+    return {"shared_stamp": LEADERBOARD_SHARED_STAMP, **_LEADERBOARD_CACHE.stats()}
+
+
+def _compute_leaderboard(limit: int) -> tuple[list[JsonDict], Cutoff]:
+    scores = get_leaderboard(limit=limit)
+    cutoff: Cutoff = None
+    if len(scores) >= limit:
+        cutoff = (int(scores[-1]["xp"]), int(scores[-1]["luna_trust"]))
+    if LEADERBOARD_SHARED_STAMP:
+        # Publie le seuil d'entrée pour que les écrivains des autres workers
+        # sachent si leur sauvegarde peut modifier ce classement.
+        shared_cutoff = _LEADERBOARD_CACHE.combined_cutoff(limit, cutoff)
+
+        def _write_cutoff() -> None:
+            with _get_conn() as conn:
+                conn.execute(
+                    """
+                    UPDATE story_leaderboard_meta
+                    SET cutoff_xp = ?, cutoff_trust = ?
+                    WHERE id = 1
+                """,
+                    (
+                        shared_cutoff[0] if shared_cutoff else None,
+                        shared_cutoff[1] if shared_cutoff else None,
+                    ),
+                )
+                conn.commit()
+
+        _with_db_retry(_write_cutoff)
+    return scores, cutoff
+
+
+def _read_leaderboard_stamp() -> int:
+    if not LEADERBOARD_SHARED_STAMP:
+        return 0
+
+    def _read() -> Optional[sqlite3.Row]:
+        with _get_conn() as conn:
+            return conn.execute(
+                "SELECT stamp FROM story_leaderboard_meta WHERE id = 1"
+            ).fetchone()
+
+    row = _with_db_retry(_read)
+    return int(row["stamp"]) if row else 0
+
+
+def _note_leaderboard_write(conn: sqlite3.Connection, xp: int, trust: int) -> None:
+    """
+    Invalide le classement si le score écrit (ou supprimé) peut entrer dans le
+    top N. Appelé dans la transaction de l'écriture.
+    """
+    if not LEADERBOARD_SHARED_STAMP:
+        known, cutoff = _LEADERBOARD_CACHE.lowest_cutoff()
+        if known and may_enter_leaderboard(xp, trust, cutoff):
+            _LEADERBOARD_CACHE.invalidate()
+        return
+
+    row = conn.execute(
+        "SELECT cutoff_xp, cutoff_trust FROM story_leaderboard_meta WHERE id = 1"
+    ).fetchone()
+    cutoff: Cutoff = None
+    if row is not None and row["cutoff_xp"] is not None:
+        cutoff = (int(row["cutoff_xp"]), int(row["cutoff_trust"]))
+    if may_enter_leaderboard(xp, trust, cutoff):
+        conn.execute("UPDATE story_leaderboard_meta SET stamp = stamp + 1 WHERE id = 1")
 
 
 def log_telemetry_event(player_id: str, event_type: str, payload: JsonDict) -> None:
-    """Stocke un événement de télémétrie locale non sensible."""
+    """
+    Stocke un événement de télémétrie locale non sensible.
+
+    En mode asynchrone (défaut), l'événement est confié au thread d'écriture
+    par lots et la fonction retourne sans toucher à SQLite.
+    """
+    row: TelemetryRow = (
+        player_id,
+        event_type,
+        json_codec.dumps(payload),
+        datetime.now(timezone.utc).isoformat(),
+    )
+    if TELEMETRY_ASYNC:
+        _TELEMETRY_SINK.submit(row)
+    else:
+        write_telemetry_rows([row])
+
+
+def log_telemetry_events(
+    player_id: str, events: Sequence[tuple[str, JsonDict]]
+) -> None:
+    """Stocke un lot d'événements ``(event_type, payload)`` du même joueur."""
+    created_at = datetime.now(timezone.utc).isoformat()
+    rows: list[TelemetryRow] = [
+        (player_id, event_type, json_codec.dumps(payload), created_at)
+        for event_type, payload in events
+    ]
+    if TELEMETRY_ASYNC:
+        for row in rows:
+            _TELEMETRY_SINK.submit(row)
+    else:
+        write_telemetry_rows(rows)
+
+
+def write_telemetry_rows(rows: Sequence[TelemetryRow]) -> None:
+    """Écrit un lot d'événements dans une seule transaction."""
+    if not rows:
+        return
 
     def _write() -> None:
         with _get_conn() as conn:
-            conn.execute(
+            conn.executemany(
                 """
                 INSERT INTO story_telemetry (player_id, event_type, payload_json, created_at)
                 VALUES (?, ?, ?, ?)
             """,
-                (
-                    player_id,
-                    event_type,
-                    json.dumps(payload, ensure_ascii=False),
-                    datetime.now(timezone.utc).isoformat(),
-                ),
+                rows,
             )
             conn.commit()
 
     _with_db_retry(_write)
 
 
+def flush_telemetry(timeout: float = 5.0) -> bool:
+    """Attend l'écriture des événements déjà déposés."""
+    return _TELEMETRY_SINK.flush(timeout)
+
+
+def close_telemetry(timeout: float = 5.0) -> None:
+    """Vide la file de télémétrie et arrête son thread (arrêt du worker)."""
+    _TELEMETRY_SINK.close(timeout)
+
+
+def get_telemetry_stats() -> JsonDict:
+    return {"async": TELEMETRY_ASYNC, **_TELEMETRY_SINK.stats()}
+
+
+TELEMETRY_ASYNC = _SETTINGS.telemetry_async
+_TELEMETRY_SINK = TelemetrySink(
+    writer=write_telemetry_rows,
+    max_queue=_SETTINGS.telemetry_queue_size,
+    batch_size=_SETTINGS.telemetry_batch_size,
+    flush_interval_ms=_SETTINGS.telemetry_flush_ms,
+)
+atexit.register(close_telemetry)
+
+_STATE_CACHE = PlayerStateCache(
+    flusher=_flush_cached_state,
+    max_entries=STATE_CACHE_SIZE,
+    flush_interval_ms=STATE_WRITE_BEHIND_MS,
+)
+atexit.register(close_state_cache)
+
+
+def apply_settings(settings: Settings) -> None:
+    """
+    Applique des réglages relus (SIGHUP) : TTL du classement, taille et
+    écriture différée du cache d'états, télémétrie synchrone ou non. Le
+    chemin de la base et la file de télémétrie restent ceux du démarrage.
+    """
+    global LEADERBOARD_CACHE_TTL_SECONDS, STATE_CACHE_SIZE, STATE_WRITE_BEHIND_MS
+    global TELEMETRY_ASYNC
+    LEADERBOARD_CACHE_TTL_SECONDS = settings.leaderboard_cache_ttl_seconds
+    _LEADERBOARD_CACHE.ttl_seconds = LEADERBOARD_CACHE_TTL_SECONDS
+    STATE_CACHE_SIZE = settings.state_cache_size
+    STATE_WRITE_BEHIND_MS = settings.state_write_behind_ms
+    _STATE_CACHE.configure(STATE_CACHE_SIZE, STATE_WRITE_BEHIND_MS)
+    if TELEMETRY_ASYNC and not settings.telemetry_async:
+        # Les événements déjà en file passent avant les écritures directes.
+        _TELEMETRY_SINK.flush()
+    TELEMETRY_ASYNC = settings.telemetry_async
+
+
+on_reload(apply_settings)
+
+
 # Init au chargement du module
 init_db()
@@ -0,0 +1,262 @@
+"""
+Simulateur de parties hors ligne — LUNA Hors Connexion.
+
+Joue des parties complètes de ``story.json`` en appelant directement
+``StoryEngine.apply_choice`` / ``advance_chapter`` (et, par défaut,
+``get_state_json`` après chaque transition, comme une requête) :
+
+    python scripts/simulate_story.py --mode random --runs 500 --seed 1
+    python scripts/simulate_story.py --mode coverage
+
+- ``random`` : choix tirés au hasard (graine fixe → parties reproductibles) ;
+- ``coverage`` : une partie par transition atteignable (chaque choix de
+  chaque scène, chaque fin de chapitre) et par scène finale, précédée du plus
+  court chemin vers la scène puis terminée par le premier choix. Le graphe
+  contient des boucles : énumérer tous les chemins n'est pas borné.
+
+Le rapport donne transitions/s, blocs mémoire retenus par transition
+(``sys.getallocatedblocks`` après ramasse-miettes) et la répartition des fins.
+Les tests ``benchmark`` de ``tests/test_story_simulator.py`` s'appuient dessus.
+"""
+
+import argparse
+import gc
+import random
+import sys
+import time
+from collections import Counter, deque
+from collections.abc import Iterable, Sequence
+from typing import Any, NamedTuple, Optional
+
+from core import json_codec
+from core.story_engine import StoryEngine
+from core.story_graph import Scene, StoryGraph
+
+JsonDict = dict[str, Any]
+PlayerState = dict[str, Any]
+
+# Garde-fou contre une boucle sans sortie dans l'histoire.
+MAX_STEPS = 500
+
+# Transition : (scène, id du choix) ; id None = advance_chapter.
+Action = tuple[str, Optional[str]]
+
+
+class SimulationError(RuntimeError):
+    """Partie bloquée : scène inconnue, impasse ou budget d'étapes dépassé."""
+
+
+class Playthrough(NamedTuple):
+    state: PlayerState
+    ending: str
+    transitions: int
+
+
+class SimulationReport(NamedTuple):
+    mode: str
+    playthroughs: int
+    transitions: int
+    seconds: float
+    retained_blocks: int
+    endings: dict[str, int]
+
+    @property
+    def transitions_per_second(self) -> float:
+        return self.transitions / self.seconds if self.seconds > 0 else 0.0
+
+    @property
+    def blocks_per_transition(self) -> float:
+        return self.retained_blocks / self.transitions if self.transitions else 0.0
+
+    def as_dict(self) -> JsonDict:
+        return {
+            "mode": self.mode,
+            "playthroughs": self.playthroughs,
+            "transitions": self.transitions,
+            "seconds": round(self.seconds, 4),
+            "transitions_per_second": round(self.transitions_per_second, 1),
+            "retained_blocks_per_transition": round(self.blocks_per_transition, 3),
+            "endings": dict(sorted(self.endings.items())),
+        }
+
+
+# ── Parties ───────────────────────────────────────────────────────────────
+
+
+def _next_action(
+    scene: Scene, rng: Optional[random.Random], visits: dict[str, int]
+) -> Action:
+    if scene.choices:
+        if rng is not None:
+            return scene.id, rng.choice(scene.choices).id
+        # Premier choix, puis le suivant à chaque retour dans la scène : sort
+        # des boucles de l'histoire sans hasard.
+        seen = visits.get(scene.id, 0)
+        visits[scene.id] = seen + 1
+        return scene.id, scene.choices[seen % len(scene.choices)].id
+    if scene.is_chapter_end:
+        return scene.id, None
+    raise SimulationError(f"Impasse sur la scène {scene.id}")
+
+
+def play(
+    engine: StoryEngine,
+    prefix: Sequence[Action] = (),
+    rng: Optional[random.Random] = None,
+    render: bool = True,
+    max_steps: int = MAX_STEPS,
+) -> Playthrough:
+    """
+    Joue une partie depuis un état neuf : ``prefix`` d'abord, puis des choix
+    aléatoires (``rng``) ou le premier choix, jusqu'à une scène finale.
+    """
+    graph = engine.get_story_graph()
+    state = engine.new_player_state()
+    visits: dict[str, int] = {}
+    pending = deque(prefix)
+    for step in range(max_steps):
+        scene_id = str(state["current_scene"])
+        scene = graph.scenes.get(scene_id)
+        if scene is None:
+            raise SimulationError(f"Scène inconnue {scene_id}")
+        if scene.is_ending_final:
+            return Playthrough(state, _ending_key(scene), step)
+
+        action = pending.popleft() if pending else _next_action(scene, rng, visits)
+        if action[0] != scene_id:
+            raise SimulationError(f"Préfixe désynchronisé : {action} sur {scene_id}")
+        if action[1] is None:
+            result = engine.advance_chapter(state, scene_id)
+        else:
+            result = engine.apply_choice(state, scene_id, action[1])
+        if not result.get("success"):
+            raise SimulationError(f"{action} refusé : {result.get('error')}")
+        if render:
+            engine.get_state_json(state)
+    raise SimulationError(f"Partie sans fin après {max_steps} transitions")
+
+
+def _ending_key(scene: Scene) -> str:
+    return scene.ending_id or scene.position.chapter_id
+
+
+def _successors(graph: StoryGraph, scene: Scene) -> list[tuple[Action, str]]:
+    if scene.choices:
+        return [
+            ((scene.id, choice.id), choice.next_scene)
+            for choice in scene.choices
+            if choice.next_scene
+        ]
+    chapter = graph.chapters.get(scene.next_chapter or "")
+    if scene.is_chapter_end and chapter and chapter.first_scene_id:
+        return [((scene.id, None), chapter.first_scene_id)]
+    return []
+
+
+def coverage_plans(graph: StoryGraph) -> list[tuple[Action, ...]]:
+    """
+    Préfixes couvrant chaque transition atteignable et chaque scène finale :
+    plus court chemin jusqu'à la scène (parcours en largeur), plus la
+    transition elle-même.
+    """
+    first_chapter = next(iter(graph.chapters.values()), None)
+    start = first_chapter.first_scene_id if first_chapter else None
+    if start is None or start not in graph.scenes:
+        return []
+
+    paths: dict[str, tuple[Action, ...]] = {start: ()}
+    to_visit = deque([start])
+    plans: list[tuple[Action, ...]] = []
+    while to_visit:
+        scene = graph.scenes[to_visit.popleft()]
+        path = paths[scene.id]
+        if scene.is_ending_final:
+            plans.append(path)
+            continue
+        for action, target in _successors(graph, scene):
+            plans.append(path + (action,))
+            if target in graph.scenes and target not in paths:
+                paths[target] = path + (action,)
+                to_visit.append(target)
+    return plans
+
+
+# ── Mesure ────────────────────────────────────────────────────────────────
+
+
+def run_playthroughs(
+    engine: StoryEngine,
+    plans: Iterable[Sequence[Action]],
+    rng: Optional[random.Random] = None,
+    render: bool = True,
+) -> tuple[int, int, Counter[str]]:
+    """Joue chaque préfixe de ``plans`` ; (parties, transitions, fins)."""
+    endings: Counter[str] = Counter()
+    playthroughs = transitions = 0
+    for prefix in plans:
+        played = play(engine, prefix, rng, render)
+        playthroughs += 1
+        transitions += played.transitions
+        endings[played.ending] += 1
+    return playthroughs, transitions, endings
+
+
+def simulate(
+    engine: StoryEngine,
+    mode: str = "random",
+    runs: int = 200,
+    seed: int = 0,
+    render: bool = True,
+) -> SimulationReport:
+    if mode == "random":
+        plans: list[tuple[Action, ...]] = [()] * runs
+        rng: Optional[random.Random] = random.Random(seed)
+    elif mode == "coverage":
+        plans = coverage_plans(engine.get_story_graph())
+        rng = None
+    else:
+        raise ValueError(f"unknown simulation mode {mode!r}")
+
+    gc.collect()
+    blocks_before = sys.getallocatedblocks()
+    started = time.perf_counter()
+    playthroughs, transitions, endings = run_playthroughs(engine, plans, rng, render)
+    seconds = time.perf_counter() - started
+    gc.collect()
+    return SimulationReport(
+        mode=mode,
+        playthroughs=playthroughs,
+        transitions=transitions,
+        seconds=seconds,
+        retained_blocks=max(sys.getallocatedblocks() - blocks_before, 0),
+        endings=dict(endings),
+    )
+
+
+# ── Commande ──────────────────────────────────────────────────────────────
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="simulate_story.py",
+        description="Joue des parties hors ligne et mesure le moteur narratif.",
+    )
+    parser.add_argument("--mode", choices=["random", "coverage"], default="random")
+    parser.add_argument("--runs", type=int, default=200, help="parties (random)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--no-render",
+        action="store_true",
+        help="ne pas encoder l'état JSON après chaque transition",
+    )
+    args = parser.parse_args(argv)
+
+    try:
+        report = simulate(
+            StoryEngine(), args.mode, args.runs, args.seed, not args.no_render
+        )
+    except SimulationError as exc:
+        print(f"simulation interrompue : {exc}", file=sys.stderr)
+        return 1
+    print(json_codec.dumps(report.as_dict()))
+    return 0
@@ -0,0 +1,209 @@
+"""
+Écriture asynchrone de la télémétrie — LUNA Hors Connexion.
+
+Les événements sont déposés dans une file bornée puis écrits par lots, dans
+une seule transaction, par un thread d'arrière-plan : la requête HTTP ne paie
+jamais le commit SQLite. Si la file est pleine, l'événement est abandonné
+(et compté) plutôt que de bloquer le joueur.
+"""
+
+import logging
+import os
+import queue
+import threading
+import time
+from collections.abc import Callable, Sequence
+from typing import Any, Optional, Union, cast
+
+logger = logging.getLogger(__name__)
+
+JsonDict = dict[str, Any]
+TelemetryRow = tuple[str, str, str, str]  # player_id, event_type, payload, date
+BatchWriter = Callable[[Sequence[TelemetryRow]], None]
+
+
+class _FlushRequest:
+    __slots__ = ("done",)
+
+    def __init__(self) -> None:
+        self.done = threading.Event()
+
+
+_STOP = object()
+_QueueItem = Union[TelemetryRow, _FlushRequest, object]
+
+
+class TelemetrySink:
+    """
+    File bornée + thread d'écriture par lots.
+
+    Un lot part dès ``batch_size`` événements ou ``flush_interval_ms`` après
+    le premier événement du lot. Le thread ne démarre qu'au premier envoi :
+    avec gunicorn ``preload_app``, il naît donc dans le worker, pas dans le
+    processus maître.
+    """
+
+    def __init__(
+        self,
+        writer: BatchWriter,
+        max_queue: int = 10_000,
+        batch_size: int = 200,
+        flush_interval_ms: int = 500,
+    ) -> None:
+        self._writer = writer
+        self._max_queue = max(1, max_queue)
+        self._batch_size = max(1, batch_size)
+        self._flush_interval = max(1, flush_interval_ms) / 1000
+        self._lock = threading.Lock()
+        self._reset_process_state()
+        if hasattr(os, "register_at_fork"):
+            os.register_at_fork(after_in_child=self._reset_process_state)
+
+    def _reset_process_state(self) -> None:
+        self._queue: queue.Queue[_QueueItem] = queue.Queue(maxsize=self._max_queue)
+        self._thread: Optional[threading.Thread] = None
+        self._closed = False
+        self._submitted = 0
+        self._written = 0
+        self._dropped = 0
+        self._batches = 0
+        self._write_errors = 0
+
+    def submit(self, row: TelemetryRow) -> bool:
+        """Dépose un événement sans bloquer. Retourne False s'il est abandonné."""
+        if self._closed:
+            with self._lock:
+                self._dropped += 1
+            return False
+        self._ensure_started()
+        try:
+            self._queue.put_nowait(row)
+        except queue.Full:
+            with self._lock:
+                self._dropped += 1
+            return False
+        with self._lock:
+            self._submitted += 1
+        return True
+
+    def flush(self, timeout: float = 5.0) -> bool:
+        """Attend l'écriture de tout ce qui a été déposé avant l'appel."""
+        thread = self._thread
+        if thread is None or not thread.is_alive():
+            self._drain_synchronously()
+            return True
+        request = _FlushRequest()
+        try:
+            self._queue.put(request, timeout=timeout)
+        except queue.Full:
+            return False
+        return request.done.wait(timeout)
+
+    def close(self, timeout: float = 5.0) -> None:
+        """Vide la file puis arrête le thread (arrêt du worker)."""
+        if self._closed:
+            return
+        self._closed = True
+        thread = self._thread
+        if thread is not None and thread.is_alive():
+            try:
+                self._queue.put(_STOP, timeout=timeout)
+            except queue.Full:
+                pass
+            thread.join(timeout)
+        self._drain_synchronously()
+
+    def stats(self) -> JsonDict:
+        with self._lock:
+            return {
+                "queued": self._queue.qsize(),
+                "max_queue": self._max_queue,
+                "submitted": self._submitted,
+                "written": self._written,
+                "dropped": self._dropped,
+                "batches": self._batches,
+                "write_errors": self._write_errors,
+            }
+
+    def _ensure_started(self) -> None:
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(
+                target=self._run, name="telemetry-sink", daemon=True
+            )
+            self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            item = self._queue.get()
+            if item is _STOP:
+                return
+            batch: list[TelemetryRow] = []
+            flush_requests: list[_FlushRequest] = []
+            stop = self._collect(item, batch, flush_requests)
+            self._write(batch)
+            for request in flush_requests:
+                request.done.set()
+            if stop:
+                return
+
+    def _collect(
+        self,
+        first: _QueueItem,
+        batch: list[TelemetryRow],
+        flush_requests: list[_FlushRequest],
+    ) -> bool:
+        """Remplit ``batch`` jusqu'à la taille ou l'échéance du lot."""
+        deadline = time.monotonic() + self._flush_interval
+        item: _QueueItem = first
+        while True:
+            if item is _STOP:
+                return True
+            if isinstance(item, _FlushRequest):
+                # Un flush explicite n'attend pas l'échéance du lot.
+                flush_requests.append(item)
+                return False
+            batch.append(cast(TelemetryRow, item))
+            if len(batch) >= self._batch_size:
+                return False
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            try:
+                item = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                return False
+
+    def _drain_synchronously(self) -> None:
+        batch: list[TelemetryRow] = []
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if isinstance(item, _FlushRequest):
+                item.done.set()
+            elif item is not _STOP:
+                batch.append(cast(TelemetryRow, item))
+            if len(batch) >= self._batch_size:
+                self._write(batch)
+                batch = []
+        self._write(batch)
+
+    def _write(self, batch: list[TelemetryRow]) -> None:
+        if not batch:
+            return
+        try:
+            self._writer(batch)
+        except Exception as exc:  # le thread ne doit jamais mourir
+            with self._lock:
+                self._write_errors += 1
+                self._dropped += len(batch)
+            logger.warning("Telemetry batch of %s events dropped: %s", len(batch), exc)
+            return
+        with self._lock:
+            self._written += len(batch)
+            self._batches += 1
@@ -0,0 +1,23 @@
+# Configuration Gunicorn ASGI pour Arkalia Quest
+# gunicorn -c gunicorn.asgi.conf.py asgi:app  (pip install -e .[asgi])
+#
+# Reprend gunicorn.conf.py (bind, logs, limites, hooks d'arrêt) et remplace
+# les workers sync par des workers uvicorn : chaque worker sert ses
+# connexions depuis une boucle asyncio et exécute Flask dans un pool de
+# STORY_ASGI_THREADS threads (a2wsgi, derrière core/asgi_bridge.py). Une
+# attente de verrou SQLite n'immobilise plus qu'un thread : moins de
+# processus suffisent.
+
+import multiprocessing
+import os
+import runpy
+
+_base = runpy.run_path(
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "gunicorn.conf.py")
+)
+globals().update({k: v for k, v in _base.items() if not k.startswith("_")})
+
+worker_class = "uvicorn_worker.UvicornWorker"
+workers = multiprocessing.cpu_count() + 1
+# STORY_ASGI_THREADS / STORY_ASGI_MAX_PENDING : lus dans l'environnement de
+# l'opérateur (config/settings.py), pas fixés ici.
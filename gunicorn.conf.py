@@ -7,8 +7,9 @@ import os
 # Configuration de base
 bind = f"0.0.0.0:{os.getenv('PORT', '5001')}"
 workers = multiprocessing.cpu_count() * 2 + 1
+# Un processus par requête en cours. Variantes : gunicorn.gthread.conf.py
+# (threads), gunicorn.asgi.conf.py (uvicorn).
 worker_class = "sync"
-worker_connections = 1000
 
 # Gestion des requêtes
 max_requests = 1000
@@ -35,12 +36,11 @@ limit_request_field_size = 8190
 raw_env = [
     "FLASK_ENV=production",
     "PYTHONPATH=/app",
+    # Une seule limite de débit pour tous les workers (fichier mmap dans
+    # /dev/shm, comme worker_tmp_dir).
+    "STORY_RATE_LIMIT_BACKEND=shared",
 ]
 
-# Optimisations pour les jeux éducatifs
-worker_class = "sync"
-worker_connections = 1000
-
 
 # Configuration des processus
 def when_ready(server):
@@ -59,5 +59,23 @@ def post_fork(server, worker):
     server.log.info("✅ Worker %s démarré", worker.pid)
 
 
+def post_worker_init(worker):
+    from config.settings import install_sighup_reload
+
+    # Le worker remet SIGHUP à son défaut après le fork (preload_app) :
+    # réinstaller le rechargement des réglages (kill -HUP <pid du worker>).
+    install_sighup_reload()
+
+
+def worker_exit(server, worker):
+    from core.story_save import close_connections, close_state_cache, close_telemetry
+
+    # Écrire les états joueurs et la télémétrie en attente avant de fermer
+    # les connexions SQLite.
+    close_state_cache()
+    close_telemetry()
+    close_connections()
+
+
 def worker_abort(worker):
     worker.log.info("⚠️ Worker %s interrompu", worker.pid)
@@ -0,0 +1,23 @@
+# Configuration Gunicorn gthread pour Arkalia Quest
+# gunicorn -c gunicorn.gthread.conf.py app:app
+#
+# Reprend gunicorn.conf.py et sert GUNICORN_THREADS requêtes par processus :
+# moteur narratif, limite de débit et story_save sont sûrs entre threads
+# (voir docs/ARCHITECTURE.md, section Concurrence). Moins de processus pour
+# autant de joueurs : le moteur, les caches et le code ne sont chargés
+# qu'une fois par worker.
+
+import multiprocessing
+import os
+import runpy
+
+_base = runpy.run_path(
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "gunicorn.conf.py")
+)
+globals().update({k: v for k, v in _base.items() if not k.startswith("_")})
+
+worker_class = "gthread"
+workers = multiprocessing.cpu_count() + 1
+threads = int(os.getenv("GUNICORN_THREADS", "8"))
+# Connexions ouvertes par worker (keep-alive compris) ; gthread la respecte.
+worker_connections = 1000
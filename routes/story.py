@@ -8,48 +8,54 @@ POST /api/story/reset        → remettre à zéro
 GET  /api/story/summary      → résumé de sauvegarde (pour l'accueil)
 POST /api/story/name         → enregistrer le prénom du joueur
 GET  /api/story/leaderboard  → classement local des joueurs
+POST /api/story/telemetry       → événement de télémétrie
+POST /api/story/telemetry/batch → lot d'événements de télémétrie
 """
 
-import os
 import re
 import time
 import unicodedata
-from collections import defaultdict, deque
 from typing import Optional, cast
 from uuid import UUID
 
-from flask import Blueprint, current_app, jsonify, make_response, request
+from flask import (
+    Blueprint,
+    Response,
+    current_app,
+    has_app_context,
+    jsonify,
+    make_response,
+    request,
+)
 
+from config.settings import Settings, get_settings
+from core import json_codec
+from core.player_sets import IdSet
+from core.rate_limit import create_rate_limiter
 from core.story_engine import get_story_engine
 from core.story_save import (
     JsonDict,
+    StateConflictError,
     delete_state,
     generate_player_id,
-    get_leaderboard,
+    get_leaderboard_snapshot,
     get_save_summary,
-    load_state,
+    load_state_versioned,
     log_telemetry_event,
+    log_telemetry_events,
     save_state,
+    stage_state,
 )
 
 story_bp = Blueprint("story", __name__, url_prefix="/api/story")
 
 COOKIE_NAME = "luna_player_id"
 COOKIE_MAX_AGE = 60 * 60 * 24 * 365  # 1 an
-RATE_LIMIT_WINDOW_SECONDS = 60
-RATE_LIMIT_MAX_POSTS = 60
-_POST_RATE_LIMIT: dict[str, deque[float]] = defaultdict(deque)
-
-
-def _cleanup_rate_limit_buckets(now: float, window_seconds: int) -> None:
-    stale_keys: list[str] = []
-    for ip, bucket in _POST_RATE_LIMIT.items():
-        while bucket and (now - bucket[0]) > window_seconds:
-            bucket.popleft()
-        if not bucket:
-            stale_keys.append(ip)
-    for ip in stale_keys:
-        _POST_RATE_LIMIT.pop(ip, None)
+TELEMETRY_BATCH_MAX_EVENTS = 50
+TELEMETRY_BATCH_MAX_BYTES = 64 * 1024
+# Endpoints de télémétrie : compteurs et budget distincts des actions de jeu.
+_TELEMETRY_ENDPOINTS = {"story.telemetry_event", "story.telemetry_batch"}
+_POST_RATE_LIMIT = create_rate_limiter()
 
 
 # ── Helpers ───────────────────────────────────────────────────────────────
@@ -71,17 +77,28 @@ def _is_valid_player_id(value: str) -> bool:
         return False
 
 
-def _get_player_state(player_id: str) -> JsonDict:
+def _get_player_state(player_id: str) -> tuple[JsonDict, int]:
+    """Retourne (état, version), en créant une sauvegarde neuve au besoin."""
     engine = get_story_engine()
-    state = load_state(player_id)
-    if not state:
-        state = engine.new_player_state()
-        save_state(player_id, state)
-    return state
+    loaded = load_state_versioned(player_id)
+    if loaded and loaded[0]:
+        return loaded
+    state = engine.new_player_state()
+    version = save_state(player_id, state)
+    return state, version
 
 
 def _json_with_cookie(data: JsonDict, player_id: str, is_new: bool):
-    resp = make_response(jsonify(data))
+    return _with_player_cookie(make_response(jsonify(data)), player_id, is_new)
+
+
+def _raw_json_with_cookie(body: str, player_id: str, is_new: bool):
+    """Comme ``_json_with_cookie`` pour un corps déjà encodé en JSON."""
+    resp = current_app.response_class(body, mimetype="application/json")
+    return _with_player_cookie(resp, player_id, is_new)
+
+
+def _with_player_cookie(resp: Response, player_id: str, is_new: bool) -> Response:
     if is_new:
         secure_cookie = bool(
             cast(dict[str, object], current_app.config).get(
@@ -121,6 +138,34 @@ def _read_json_payload() -> tuple[JsonDict, Optional[tuple[JsonDict, int]]]:
     return cast(JsonDict, payload), None
 
 
+def _read_client_version(
+    payload: JsonDict,
+) -> tuple[Optional[int], Optional[tuple[JsonDict, int]]]:
+    """Version d'état vue par le client (optionnelle) pour détecter un conflit."""
+    value = payload.get("version")
+    if value is None:
+        return None, None
+    if isinstance(value, bool) or not isinstance(value, int):
+        return None, (
+            {"success": False, "error": "version doit être un entier"},
+            400,
+        )
+    return value, None
+
+
+def _conflict_response():
+    return (
+        jsonify(
+            {
+                "success": False,
+                "error": "Ta partie a avancé ailleurs (autre onglet ?). Rechargement…",
+                "conflict": True,
+            }
+        ),
+        409,
+    )
+
+
 def _require_string_field(
     payload: JsonDict, field_name: str
 ) -> tuple[Optional[str], Optional[tuple[JsonDict, int]]]:
@@ -141,20 +186,16 @@ def _require_string_field(
 def _enforce_post_rate_limit() -> Optional[tuple[JsonDict, int]]:
     if request.method != "POST":
         return None
-    if request.path.endswith("/telemetry"):
-        return None
 
     key = request.remote_addr or "unknown"
     now = time.monotonic()
     window_seconds, max_posts = _get_rate_limit_config()
-    _cleanup_rate_limit_buckets(now, window_seconds)
-
-    bucket = _POST_RATE_LIMIT[key]
-
-    while bucket and (now - bucket[0]) > window_seconds:
-        bucket.popleft()
-
-    if len(bucket) >= max_posts:
+    if request.endpoint in _TELEMETRY_ENDPOINTS:
+        # Le tampon client envoie plus souvent que le joueur ne clique : la
+        # télémétrie a son propre plafond et n'entame pas celui du jeu.
+        key = f"telemetry:{key}"
+        max_posts = _get_settings().telemetry_rate_limit_max_posts
+    if not _POST_RATE_LIMIT.hit(key, now, window_seconds, max_posts):
         current_app.logger.warning(
             "Story API rate limit hit for IP=%s path=%s",
             key,
@@ -167,8 +208,6 @@ def _enforce_post_rate_limit() -> Optional[tuple[JsonDict, int]]:
             },
             429,
         )
-
-    bucket.append(now)
     return None
 
 
@@ -203,9 +242,12 @@ def get_state():
     try:
         engine = get_story_engine()
         player_id, is_new = _get_or_create_player_id()
-        player_state = _get_player_state(player_id)
-        state = engine.get_state(player_state)
-        return _json_with_cookie({"success": True, **state}, player_id, is_new)
+        player_state, version = _get_player_state(player_id)
+        # Fragment de scène pré-encodé + champs du joueur (voir get_state_json).
+        body = engine.get_state_json(
+            player_state, {"success": True, "version": version}
+        )
+        return _raw_json_with_cookie(body, player_id, is_new)
     except Exception as e:
         return _internal_error("state", e)
 
@@ -222,51 +264,45 @@ def guard_post_rate_limit():
     return None
 
 
-def _get_rate_limit_config() -> tuple[int, int]:
-    def _read_env_int(name: str, default: int) -> int:
-        raw_value = os.environ.get(name)
-        if raw_value is None:
-            return default
-        try:
-            return int(raw_value)
-        except ValueError:
-            current_app.logger.warning(
-                "Invalid %s value %r, falling back to default=%s",
-                name,
-                raw_value,
-                default,
-            )
-            return default
+def _get_settings() -> Settings:
+    # Réglages de l'application qui sert la requête ; hors requête (tâches de
+    # maintenance, tests), ceux du processus.
+    if has_app_context():
+        settings = current_app.extensions.get("luna_settings")
+        if settings is not None:
+            return cast(Settings, settings)
+    return get_settings()
 
-    window_seconds = max(
-        1,
-        _read_env_int("STORY_RATE_LIMIT_WINDOW_SECONDS", RATE_LIMIT_WINDOW_SECONDS),
-    )
-    max_posts = max(
-        1,
-        _read_env_int("STORY_RATE_LIMIT_MAX_POSTS", RATE_LIMIT_MAX_POSTS),
-    )
-    return window_seconds, max_posts
+
+def _get_rate_limit_config() -> tuple[int, int]:
+    settings = _get_settings()
+    return settings.rate_limit_window_seconds, settings.rate_limit_max_posts
 
 
 def reset_story_rate_limit() -> None:
-    _POST_RATE_LIMIT.clear()
+    """Vide les compteurs ; les réglages (fenêtre, plafond) ne sont pas relus."""
+    _POST_RATE_LIMIT.reset()
 
 
 def cleanup_story_rate_limit(now: Optional[float] = None) -> None:
     current_now = time.monotonic() if now is None else now
     window_seconds, _ = _get_rate_limit_config()
-    _cleanup_rate_limit_buckets(current_now, window_seconds)
+    _POST_RATE_LIMIT.cleanup(current_now, window_seconds)
 
 
 def seed_story_rate_limit_bucket(ip: str, timestamp: float) -> None:
-    _POST_RATE_LIMIT[ip].append(timestamp)
+    window_seconds, _ = _get_rate_limit_config()
+    _POST_RATE_LIMIT.record(ip, timestamp, window_seconds)
 
 
 def has_story_rate_limit_bucket(ip: str) -> bool:
     return ip in _POST_RATE_LIMIT
 
 
+def get_story_rate_limit_stats() -> JsonDict:
+    return _POST_RATE_LIMIT.stats()
+
+
 # ── POST /api/story/choice ────────────────────────────────────────────────
 
 
@@ -286,27 +322,39 @@ def apply_choice():
         body, code = choice_error
         return jsonify(body), code
 
+    client_version, version_error = _read_client_version(data)
+    if version_error:
+        body, code = version_error
+        return jsonify(body), code
+
     assert scene_id is not None
     assert choice_id is not None
 
     try:
         engine = get_story_engine()
         player_id, is_new = _get_or_create_player_id()
-        player_state = _get_player_state(player_id)
+        player_state, version = _get_player_state(player_id)
+        if client_version is not None and client_version != version:
+            return _conflict_response()
 
         result = engine.apply_choice(player_state, scene_id, choice_id)
         if not result.get("success"):
             return jsonify(result), 400
 
-        save_state(player_id, player_state)
-        new_state = engine.get_state(player_state)
-
-        return _json_with_cookie(
-            {
-                "success": True,
-                "choice_result": result,
-                "next_state": new_state,
-            },
+        # Écriture différée : les clics rapides d'un même chapitre sont
+        # regroupés ; /advance (fin de chapitre) et /reset écrivent tout de suite.
+        try:
+            new_version = stage_state(player_id, player_state, version)
+        except StateConflictError:
+            return _conflict_response()
+        next_state = engine.get_state_json(player_state, {"version": new_version})
+
+        return _raw_json_with_cookie(
+            '{"success":true,"choice_result":'
+            + json_codec.dumps(result)
+            + ',"next_state":'
+            + next_state
+            + "}",
             player_id,
             is_new,
         )
@@ -330,26 +378,36 @@ def advance_chapter():
         body, code = scene_error
         return jsonify(body), code
 
+    client_version, version_error = _read_client_version(data)
+    if version_error:
+        body, code = version_error
+        return jsonify(body), code
+
     assert scene_id is not None
 
     try:
         engine = get_story_engine()
         player_id, is_new = _get_or_create_player_id()
-        player_state = _get_player_state(player_id)
+        player_state, version = _get_player_state(player_id)
+        if client_version is not None and client_version != version:
+            return _conflict_response()
 
         result = engine.advance_chapter(player_state, scene_id)
         if not result.get("success"):
             return jsonify(result), 400
 
-        save_state(player_id, player_state)
-        new_state = engine.get_state(player_state)
-
-        return _json_with_cookie(
-            {
-                "success": True,
-                "advance_result": result,
-                "next_state": new_state,
-            },
+        try:
+            new_version = save_state(player_id, player_state, version)
+        except StateConflictError:
+            return _conflict_response()
+        next_state = engine.get_state_json(player_state, {"version": new_version})
+
+        return _raw_json_with_cookie(
+            '{"success":true,"advance_result":'
+            + json_codec.dumps(result)
+            + ',"next_state":'
+            + next_state
+            + "}",
             player_id,
             is_new,
         )
@@ -397,13 +455,27 @@ def set_name():
     if not any(ch.isalnum() for ch in name):
         return jsonify({"success": False, "error": "Prénom invalide"}), 400
 
+    client_version, version_error = _read_client_version(data)
+    if version_error:
+        body, code = version_error
+        return jsonify(body), code
+
     try:
         player_id, is_new = _get_or_create_player_id()
-        player_state = _get_player_state(player_id)
+        player_state, version = _get_player_state(player_id)
+        if client_version is not None and client_version != version:
+            return _conflict_response()
         player_state["player_name"] = name
-        save_state(player_id, player_state)
+        # Compare-and-swap : un renommage ne doit pas écraser un /choice ou un
+        # /advance écrit entre la lecture et l'écriture.
+        try:
+            new_version = save_state(player_id, player_state, version)
+        except StateConflictError:
+            return _conflict_response()
         return _json_with_cookie(
-            {"success": True, "player_name": name}, player_id, is_new
+            {"success": True, "player_name": name, "version": new_version},
+            player_id,
+            is_new,
         )
     except Exception as e:
         return _internal_error("name", e)
@@ -412,13 +484,23 @@ def set_name():
 # ── GET /api/story/summary ────────────────────────────────────────────────
 
 
+def _scene_progress(scene_id: str) -> JsonDict:
+    """Rang de la scène dans son chapitre (index précalculé du moteur)."""
+    position = get_story_engine().get_scene_position(scene_id)
+    if position is None:
+        return {"scene_index": None, "scene_total": None}
+    return {"scene_index": position.scene_index, "scene_total": position.scene_total}
+
+
 @story_bp.route("/summary", methods=["GET"])
 def get_summary():
     """Résumé de sauvegarde pour la page d'accueil."""
     try:
         player_id, is_new = _get_or_create_player_id()
         summary = get_save_summary(player_id)
-        if not summary:
+        if summary:
+            summary.update(_scene_progress(str(summary["current_scene"])))
+        else:
             summary = {"exists": False}
         return _json_with_cookie({"success": True, **summary}, player_id, is_new)
     except Exception as e:
@@ -430,10 +512,21 @@ def get_summary():
 
 @story_bp.route("/leaderboard", methods=["GET"])
 def leaderboard_view():
-    """Classement local — top 10 joueurs par XP."""
+    """Classement local — top 10 joueurs par XP (mis en cache, revalidable par ETag)."""
     try:
-        scores = get_leaderboard(limit=10)
-        return jsonify({"success": True, "scores": scores})
+        snapshot = get_leaderboard_snapshot(limit=10)
+        if request.if_none_match.contains(snapshot.etag):
+            resp = current_app.response_class(status=304)
+        else:
+            resp = current_app.response_class(
+                b'{"success":true,"scores":' + snapshot.scores_json + b"}",
+                mimetype="application/json",
+            )
+        resp.set_etag(snapshot.etag)
+        # no-cache (et non no-store) : le navigateur garde la réponse mais la
+        # revalide à chaque visite via If-None-Match.
+        resp.headers["Cache-Control"] = "no-cache"
+        return resp
     except Exception as e:
         return _internal_error("leaderboard", e)
 
@@ -473,7 +566,7 @@ FLAG_LABELS = {
 def _build_luna_journal(state: JsonDict, name: str) -> str:
     """Génère un texte de journal LUNA personnalisé selon les flags et la confiance."""
     trust = state.get("luna_trust", 50)
-    flags = set(state.get("flags", []))
+    flags = IdSet(state, "flags")
     chapters = len(state.get("chapters_completed", []))
     endings = cast(list[str], state.get("endings_unlocked", []))
     player = name or "joueur"
@@ -554,7 +647,7 @@ def get_journal():
                 {"success": True, "journal": None, "moments": []}, player_id, is_new
             )
 
-        state = _get_player_state(player_id)
+        state, _ = _get_player_state(player_id)
         name = summary.get("player_name") or ""
         journal_text = _build_luna_journal(state, name)
 
@@ -570,6 +663,7 @@ def get_journal():
                 "moments": moments,
                 "player_name": name,
                 "luna_trust": state.get("luna_trust", 50),
+                **_scene_progress(str(summary["current_scene"])),
             },
             player_id,
             is_new,
@@ -579,38 +673,51 @@ def get_journal():
         return _internal_error("journal", e)
 
 
-@story_bp.route("/telemetry", methods=["POST"])
-def telemetry_event():
-    """Capture locale d'événements gameplay non sensibles."""
-    data, error = _read_json_payload()
-    if error:
-        body, code = error
-        return jsonify(body), code
-
+def _validate_telemetry_event(
+    data: JsonDict,
+) -> tuple[Optional[tuple[str, JsonDict]], Optional[str]]:
+    """Valide et assainit un événement. Retourne ((type, payload), erreur)."""
     event_type = str(data.get("event_type") or "").strip()
     payload_raw: object = data.get("payload", {})
     if not event_type:
-        return jsonify({"success": False, "error": "event_type requis"}), 400
+        return None, "event_type requis"
     if len(event_type) > 64:
-        return jsonify({"success": False, "error": "event_type trop long"}), 400
+        return None, "event_type trop long"
     if not isinstance(payload_raw, dict):
-        return jsonify({"success": False, "error": "payload invalide"}), 400
+        return None, "payload invalide"
     payload = cast(JsonDict, payload_raw)
 
     # Limite défensive pour éviter les payloads trop volumineux.
     if len(payload) > 20:
-        return jsonify({"success": False, "error": "payload trop volumineux"}), 400
+        return None, "payload trop volumineux"
+
+    safe_payload = {
+        "scene_id": _sanitize_telemetry_value(payload.get("scene_id")),
+        "chapter_id": _sanitize_telemetry_value(payload.get("chapter_id")),
+        "choice_id": _sanitize_telemetry_value(payload.get("choice_id")),
+        "ending_id": _sanitize_telemetry_value(payload.get("ending_id")),
+        "ui": _sanitize_telemetry_value(payload.get("ui")),
+        "value": _sanitize_telemetry_value(payload.get("value")),
+    }
+    return (event_type, safe_payload), None
+
+
+@story_bp.route("/telemetry", methods=["POST"])
+def telemetry_event():
+    """Capture locale d'événements gameplay non sensibles."""
+    data, error = _read_json_payload()
+    if error:
+        body, code = error
+        return jsonify(body), code
+
+    event, event_error = _validate_telemetry_event(data)
+    if event_error:
+        return jsonify({"success": False, "error": event_error}), 400
+    assert event is not None
+    event_type, safe_payload = event
 
     try:
         player_id, is_new = _get_or_create_player_id()
-        safe_payload = {
-            "scene_id": _sanitize_telemetry_value(payload.get("scene_id")),
-            "chapter_id": _sanitize_telemetry_value(payload.get("chapter_id")),
-            "choice_id": _sanitize_telemetry_value(payload.get("choice_id")),
-            "ending_id": _sanitize_telemetry_value(payload.get("ending_id")),
-            "ui": _sanitize_telemetry_value(payload.get("ui")),
-            "value": _sanitize_telemetry_value(payload.get("value")),
-        }
         try:
             log_telemetry_event(player_id, event_type, safe_payload)
         except Exception as exc:
@@ -618,3 +725,53 @@ def telemetry_event():
         return _json_with_cookie({"success": True}, player_id, is_new)
     except Exception as e:
         return _internal_error("telemetry", e)
+
+
+@story_bp.route("/telemetry/batch", methods=["POST"])
+def telemetry_batch():
+    """
+    Lot d'événements (tampon client, navigator.sendBeacon à la fermeture).
+
+    Les événements invalides sont ignorés et comptés dans ``rejected`` ;
+    les autres sont écrits ensemble.
+    """
+    if (request.content_length or 0) > TELEMETRY_BATCH_MAX_BYTES:
+        return jsonify({"success": False, "error": "lot trop volumineux"}), 413
+
+    data, error = _read_json_payload()
+    if error:
+        body, code = error
+        return jsonify(body), code
+
+    raw_events: object = data.get("events")
+    if not isinstance(raw_events, list):
+        return jsonify({"success": False, "error": "events requis"}), 400
+    events_list = cast(list[object], raw_events)
+    if len(events_list) > TELEMETRY_BATCH_MAX_EVENTS:
+        return jsonify({"success": False, "error": "trop d'événements"}), 400
+
+    events: list[tuple[str, JsonDict]] = []
+    rejected = 0
+    for raw_event in events_list:
+        if not isinstance(raw_event, dict):
+            rejected += 1
+            continue
+        event, _ = _validate_telemetry_event(cast(JsonDict, raw_event))
+        if event is None:
+            rejected += 1
+            continue
+        events.append(event)
+
+    try:
+        player_id, is_new = _get_or_create_player_id()
+        try:
+            log_telemetry_events(player_id, events)
+        except Exception as exc:
+            current_app.logger.warning("Telemetry batch write skipped: %s", exc)
+        return _json_with_cookie(
+            {"success": True, "accepted": len(events), "rejected": rejected},
+            player_id,
+            is_new,
+        )
+    except Exception as e:
+        return _internal_error("telemetry_batch", e)
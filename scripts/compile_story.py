@@ -0,0 +1,17 @@
+#!/usr/bin/env python3
+"""
+Valide data/story.json et écrit le cache compilé lu au démarrage des workers.
+
+    python scripts/compile_story.py           # build
+    python scripts/compile_story.py --check   # validation seule (CI)
+"""
+
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from core.story_compiler import main  # noqa: E402
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,18 @@
+#!/usr/bin/env python3
+"""
+Énumère l'espace d'états de data/story.json : fins et secrets atteignables,
+avec leurs plages de confiance.
+
+    python scripts/explore_story.py
+    python scripts/explore_story.py --strict   # CI
+"""
+
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from core.story_explorer import main  # noqa: E402
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,324 @@
+#!/usr/bin/env python3
+"""
+Test de charge HTTP — LUNA Hors Connexion.
+
+Mesure la capacité en concurrence d'un ou plusieurs déploiements, par
+exemple workers ``sync`` contre passerelle ASGI :
+
+    gunicorn -c gunicorn.conf.py -b 127.0.0.1:5001 app:app
+    gunicorn -c gunicorn.asgi.conf.py -b 127.0.0.1:5002 asgi:app
+    python scripts/load_test.py --url http://127.0.0.1:5001 \\
+        --url http://127.0.0.1:5002 --concurrency 8,32,128 --duration 10
+
+Chaque client virtuel ouvre une connexion keep-alive, garde son cookie
+joueur et alterne une lecture (les ``--path``, ``GET /api/story/state`` par
+défaut) et un coup de jeu : ``POST /api/story/choice`` (premier choix de la
+scène), ``/advance`` en fin de chapitre, ``/reset`` en fin de partie, avec
+la ``version`` du dernier état reçu — le chemin d'écriture (cache d'états,
+compare-and-swap, SQLite) est mesuré avec les lectures. ``--read-only``
+retire les coups de jeu. Pour chaque niveau de concurrence : requêtes/s,
+latences p50/p95/p99, statuts HTTP et erreurs de connexion. La capacité
+d'une cible est le plus haut niveau sans erreur (ni 5xx) dont le p95 tient
+dans ``--p95-budget-ms``.
+
+Les POST de jeu passent par la limite de débit par IP : depuis une seule
+machine, relever ``STORY_RATE_LIMIT_MAX_POSTS`` sur la cible, sinon ils
+répondent vite 429.
+"""
+
+import argparse
+import http.client
+import sys
+import threading
+import time
+from collections import Counter
+from collections.abc import Sequence
+from pathlib import Path
+from typing import Any, NamedTuple, Optional
+from urllib.parse import urlsplit
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from core import json_codec  # noqa: E402
+
+JsonDict = dict[str, Any]
+
+DEFAULT_PATHS = ("/api/story/state",)
+
+
+class LoadResult(NamedTuple):
+    url: str
+    concurrency: int
+    seconds: float
+    statuses: dict[int, int]
+    errors: int
+    writes: int
+    latencies_ms: list[float]
+
+    @property
+    def requests(self) -> int:
+        return sum(self.statuses.values())
+
+    @property
+    def requests_per_second(self) -> float:
+        return self.requests / self.seconds if self.seconds > 0 else 0.0
+
+    @property
+    def failures(self) -> int:
+        return self.errors + sum(
+            count for status, count in self.statuses.items() if status >= 500
+        )
+
+    def percentile(self, fraction: float) -> float:
+        if not self.latencies_ms:
+            return 0.0
+        ordered = sorted(self.latencies_ms)
+        return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+    def as_dict(self) -> JsonDict:
+        return {
+            "url": self.url,
+            "concurrency": self.concurrency,
+            "requests": self.requests,
+            "requests_per_second": round(self.requests_per_second, 1),
+            "p50_ms": round(self.percentile(0.50), 2),
+            "p95_ms": round(self.percentile(0.95), 2),
+            "p99_ms": round(self.percentile(0.99), 2),
+            "statuses": {str(k): v for k, v in sorted(self.statuses.items())},
+            "errors": self.errors,
+            "writes": self.writes,
+        }
+
+
+class _Client(threading.Thread):
+    def __init__(
+        self,
+        host: str,
+        port: Optional[int],
+        paths: Sequence[str],
+        api_prefix: str,
+        deadline: float,
+        timeout: float,
+        play: bool,
+    ) -> None:
+        super().__init__(daemon=True)
+        self.host = host
+        self.port = port
+        self.paths = paths
+        self.api_prefix = api_prefix
+        self.deadline = deadline
+        self.timeout = timeout
+        self.play = play
+        self.cookie = ""
+        # Dernier état de jeu reçu (scène, choix, version) ; None : à relire.
+        self.state: Optional[JsonDict] = None
+        self.statuses: Counter[int] = Counter()
+        self.errors = 0
+        self.writes = 0
+        self.latencies_ms: list[float] = []
+
+    def run(self) -> None:
+        conn: Optional[http.client.HTTPConnection] = None
+        turn = 0
+        while time.monotonic() < self.deadline:
+            if conn is None:
+                conn = http.client.HTTPConnection(
+                    self.host, self.port, timeout=self.timeout
+                )
+            # Un tour sur deux : coup de jeu (ou relecture de l'état).
+            is_move = self.play and turn % 2 == 1
+            if is_move:
+                method, path, payload = self._next_move()
+            else:
+                method, path, payload = (
+                    "GET",
+                    self.paths[turn // 2 % len(self.paths)],
+                    None,
+                )
+            turn += 1
+            headers = {"Cookie": self.cookie} if self.cookie else {}
+            body: Optional[bytes] = None
+            if payload is not None:
+                headers["Content-Type"] = "application/json"
+                body = json_codec.dumps(payload).encode()
+            started = time.perf_counter()
+            try:
+                conn.request(method, path, body=body, headers=headers)
+                response = conn.getresponse()
+                data = response.read()
+            except (OSError, http.client.HTTPException):
+                self.errors += 1
+                conn.close()
+                conn = None
+                continue
+            self.latencies_ms.append((time.perf_counter() - started) * 1000)
+            self.statuses[response.status] += 1
+            self.writes += method == "POST"
+            cookie = response.getheader("Set-Cookie")
+            if cookie and not self.cookie:
+                self.cookie = cookie.split(";", 1)[0]
+            if is_move:
+                self._follow(path, response.status, data)
+        if conn is not None:
+            conn.close()
+
+    def _next_move(self) -> tuple[str, str, Optional[JsonDict]]:
+        """Coup de jeu tiré du dernier état reçu, ou relecture de l'état."""
+        state = self.state
+        if state is None:
+            return "GET", self.api_prefix + "/state", None
+        scene = {"scene_id": state.get("scene_id"), "version": state.get("version")}
+        if state.get("is_chapter_end"):
+            return "POST", self.api_prefix + "/advance", scene
+        choices = state.get("choices") or []
+        if choices:
+            choice = {**scene, "choice_id": choices[0].get("id")}
+            return "POST", self.api_prefix + "/choice", choice
+        return "POST", self.api_prefix + "/reset", None
+
+    def _follow(self, path: str, status: int, data: bytes) -> None:
+        """Garde l'état renvoyé ; un refus (409, 429…) impose de le relire."""
+        self.state = None
+        if status != 200:
+            return
+        try:
+            body = json_codec.loads(data)
+        except ValueError:
+            return
+        if not isinstance(body, dict):
+            return
+        if path == self.api_prefix + "/state":
+            self.state = body
+        elif isinstance(body.get("next_state"), dict):
+            self.state = body["next_state"]
+
+
+def run_load(
+    url: str,
+    concurrency: int,
+    duration: float,
+    paths: Sequence[str] = DEFAULT_PATHS,
+    timeout: float = 10.0,
+    play: bool = True,
+) -> LoadResult:
+    """
+    ``concurrency`` clients enchaînent des requêtes pendant ``duration`` s ;
+    avec ``play``, une sur deux est un coup de jeu.
+    """
+    target = urlsplit(url)
+    if target.scheme != "http" or not target.hostname:
+        raise ValueError(f"URL http:// attendue : {url!r}")
+    prefix = target.path.rstrip("/")
+    started = time.monotonic()
+    clients = [
+        _Client(
+            target.hostname,
+            target.port,
+            [prefix + path for path in paths],
+            prefix + "/api/story",
+            started + duration,
+            timeout,
+            play,
+        )
+        for _ in range(max(1, concurrency))
+    ]
+    for client in clients:
+        client.start()
+    for client in clients:
+        client.join()
+    statuses: Counter[int] = Counter()
+    latencies: list[float] = []
+    for client in clients:
+        statuses.update(client.statuses)
+        latencies.extend(client.latencies_ms)
+    return LoadResult(
+        url=url,
+        concurrency=len(clients),
+        seconds=time.monotonic() - started,
+        statuses=dict(statuses),
+        errors=sum(client.errors for client in clients),
+        writes=sum(client.writes for client in clients),
+        latencies_ms=latencies,
+    )
+
+
+def capacity(results: Sequence[LoadResult], p95_budget_ms: float) -> int:
+    """Plus haut niveau de concurrence sans échec et sous le budget p95."""
+    passing = [
+        r.concurrency
+        for r in results
+        if r.requests and not r.failures and r.percentile(0.95) <= p95_budget_ms
+    ]
+    return max(passing, default=0)
+
+
+# ── Commande ──────────────────────────────────────────────────────────────
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="load_test.py",
+        description="Capacité en concurrence d'un ou plusieurs déploiements.",
+    )
+    parser.add_argument(
+        "--url",
+        action="append",
+        required=True,
+        help="cible http://hote:port (répétable pour comparer)",
+    )
+    parser.add_argument(
+        "--concurrency",
+        default="1,8,32,64",
+        help="niveaux de concurrence, séparés par des virgules",
+    )
+    parser.add_argument("--duration", type=float, default=5.0, help="s par niveau")
+    parser.add_argument(
+        "--path",
+        action="append",
+        help=f"chemins GET joués en boucle (défaut {DEFAULT_PATHS[0]})",
+    )
+    parser.add_argument(
+        "--read-only",
+        action="store_true",
+        help="lectures seules, sans POST /choice ni /advance",
+    )
+    parser.add_argument("--timeout", type=float, default=10.0)
+    parser.add_argument("--p95-budget-ms", type=float, default=500.0)
+    args = parser.parse_args(argv)
+
+    try:
+        levels = [int(level) for level in args.concurrency.split(",") if level]
+    except ValueError:
+        parser.error("--concurrency : entiers séparés par des virgules")
+    paths = args.path or list(DEFAULT_PATHS)
+
+    report: list[JsonDict] = []
+    try:
+        for url in args.url:
+            results = [
+                run_load(
+                    url,
+                    level,
+                    args.duration,
+                    paths,
+                    args.timeout,
+                    play=not args.read_only,
+                )
+                for level in levels
+            ]
+            report.append(
+                {
+                    "url": url,
+                    "capacity": capacity(results, args.p95_budget_ms),
+                    "levels": [result.as_dict() for result in results],
+                }
+            )
+    except ValueError as exc:
+        print(f"test de charge interrompu : {exc}", file=sys.stderr)
+        return 1
+    print(json_codec.dumps(report))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,17 @@
+#!/usr/bin/env python3
+"""
+Joue des parties hors ligne de data/story.json et mesure le moteur narratif.
+
+    python scripts/simulate_story.py --mode random --runs 500 --seed 1
+    python scripts/simulate_story.py --mode coverage
+"""
+
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from core.story_simulator import main  # noqa: E402
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -65,6 +65,12 @@ let _endingHideBadgeTimerId = null;
 const TELEMETRY_DEDUPE_MS = 900;
 const TELEMETRY_MAX_SIGNATURES = 200;
 const _telemetryRecent = new Map();
+let _stateVersion        = null;  // version de sauvegarde vue par ce client (409 si dépassée)
+const TELEMETRY_BATCH_URL = "/api/story/telemetry/batch";
+const TELEMETRY_FLUSH_MS = 5000;
+const TELEMETRY_BATCH_MAX = 25; // ≤ TELEMETRY_BATCH_MAX_EVENTS côté serveur
+let _telemetryBuffer = [];
+let _telemetryFlushTimerId = null;
 
 // Labels lisibles pour les flags — côté client
 const FLAG_LABELS_JS = {
@@ -424,6 +430,7 @@ async function loadCurrentState() {
 function renderState(state) {
   hideBootOverlay();
   _advanceLocked = false;
+  if (typeof state.version === "number") _stateVersion = state.version;
 
   // Réinitialiser les flags du chapitre si on change de chapitre
   if (state.chapter_id !== _currentChapterId) {
@@ -892,7 +899,13 @@ async function handleChoice(sceneId, choiceId, btnEl) {
 
   try {
     postTelemetry("choice_selected", { scene_id: sceneId, choice_id: choiceId, chapter_id: _currentChapterId });
-    const data = await apiPost("/api/story/choice", { scene_id: sceneId, choice_id: choiceId });
+    const data = await apiPost("/api/story/choice", { scene_id: sceneId, choice_id: choiceId, version: _stateVersion });
+    if (data.conflict) {
+      // Partie modifiée ailleurs (autre onglet, double clic) : resynchroniser.
+      showMomentToast(data.error);
+      await loadCurrentState();
+      return;
+    }
     if (!data.success) {
       restoreChoicesAfterFailure(sceneId, btnEl);
       showError(data.error || "Erreur lors du choix.");
@@ -1146,8 +1159,13 @@ function setupAdvanceButton() {
 
     try {
       // Utilise directement _currentSceneId — pas besoin d'un second appel API
-      const data = await apiPost("/api/story/advance", { scene_id: _currentSceneId });
+      const data = await apiPost("/api/story/advance", { scene_id: _currentSceneId, version: _stateVersion });
 
+      if (data.conflict) {
+        showMomentToast(data.error);
+        await loadCurrentState();
+        return;
+      }
       if (!data.success) {
         showError(data.error || "Impossible d'avancer.");
         DOM.advanceBtn.disabled = false;
@@ -2375,21 +2393,50 @@ function postTelemetry(eventType, payload = {}) {
     if (oldestKey) _telemetryRecent.delete(oldestKey);
   }
 
-  // Fire-and-forget: pas bloquant pour l'UX.
-  fetch("/api/story/telemetry", {
-    method: "POST",
-    headers: { "Content-Type": "application/json" },
-    credentials: "same-origin",
-    body: JSON.stringify({ event_type: eventType, payload }),
-  }).catch(() => {});
+  // Tampon local : un seul POST par lot, pas bloquant pour l'UX.
+  _telemetryBuffer.push({ event_type: eventType, payload });
+  if (_telemetryBuffer.length >= TELEMETRY_BATCH_MAX) {
+    flushTelemetry();
+  } else if (_telemetryFlushTimerId === null) {
+    _telemetryFlushTimerId = setTimeout(flushTelemetry, TELEMETRY_FLUSH_MS);
+  }
+}
+
+function flushTelemetry({ useBeacon = false } = {}) {
+  if (_telemetryFlushTimerId !== null) {
+    clearTimeout(_telemetryFlushTimerId);
+    _telemetryFlushTimerId = null;
+  }
+  while (_telemetryBuffer.length) {
+    const events = _telemetryBuffer.splice(0, TELEMETRY_BATCH_MAX);
+    const body = JSON.stringify({ events });
+    // sendBeacon survit à la fermeture de l'onglet ; le Blob porte le
+    // Content-Type JSON exigé par l'API.
+    if (useBeacon && navigator.sendBeacon
+        && navigator.sendBeacon(TELEMETRY_BATCH_URL, new Blob([body], { type: "application/json" }))) {
+      continue;
+    }
+    fetch(TELEMETRY_BATCH_URL, {
+      method: "POST",
+      headers: { "Content-Type": "application/json" },
+      credentials: "same-origin",
+      keepalive: true,
+      body,
+    }).catch(() => {});
+  }
 }
 
 // ── Nettoyage audio lors de la sortie de page ────────────────────────────
 document.addEventListener("visibilitychange", () => {
-  if (document.hidden) stopAmbientDrone(500);
+  if (document.hidden) {
+    flushTelemetry({ useBeacon: true });
+    stopAmbientDrone(500);
+  }
   else if (_sfxEnabled && _ambientAtmo) startAmbientDrone(_ambientAtmo);
 });
 
+window.addEventListener("pagehide", () => flushTelemetry({ useBeacon: true }));
+
 // ── Service Worker (PWA) ──────────────────────────────────────────────────
 if ("serviceWorker" in navigator) {
   window.addEventListener("load", () => {
@@ -16,6 +16,7 @@ from routes import story as story_routes
 sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
 
 from app import create_app
+from config.settings import reload_settings
 
 COOKIE_NAME = "luna_player_id"
 
@@ -28,6 +29,14 @@ def client() -> Generator[FlaskClient, None, None]:
         yield c
 
 
+@pytest.fixture(autouse=True)
+def _restore_settings() -> Generator[None, None, None]:
+    # create_app() et les tests de limite relisent les réglages du processus,
+    # partagés par toutes les applications : revenir à l'environnement.
+    yield
+    reload_settings()
+
+
 def json_obj(resp: Any) -> dict[str, Any]:
     return cast(dict[str, Any], resp.get_json())
 
@@ -185,6 +194,7 @@ class TestApplyChoice:
     def test_rate_limit_returns_429_and_retry_after(self, client: FlaskClient) -> None:
         os.environ["STORY_RATE_LIMIT_WINDOW_SECONDS"] = "60"
         os.environ["STORY_RATE_LIMIT_MAX_POSTS"] = "1"
+        reload_settings()
         story_routes.reset_story_rate_limit()
         try:
             first = client.post(
@@ -207,6 +217,7 @@ class TestApplyChoice:
     ) -> None:
         os.environ["STORY_RATE_LIMIT_WINDOW_SECONDS"] = "invalide"
         os.environ["STORY_RATE_LIMIT_MAX_POSTS"] = "oops"
+        reload_settings()
         story_routes.reset_story_rate_limit()
         try:
             first = client.post(
@@ -224,6 +235,7 @@ class TestApplyChoice:
 
     def test_rate_limit_cleanup_removes_stale_buckets(self) -> None:
         os.environ["STORY_RATE_LIMIT_WINDOW_SECONDS"] = "60"
+        reload_settings()
         story_routes.reset_story_rate_limit()
         now = 1000.0
         try:
@@ -237,6 +249,59 @@ class TestApplyChoice:
             story_routes.reset_story_rate_limit()
 
 
+# ─────────────────────────────────────────────
+# Concurrence optimiste (version d'état)
+# ─────────────────────────────────────────────
+
+
+class TestStateVersioning:
+    def test_state_exposes_version(self, client: FlaskClient) -> None:
+        data = json_obj(client.get("/api/story/state"))
+        assert isinstance(data["version"], int)
+
+    def test_choice_with_current_version_bumps_it(self, client: FlaskClient) -> None:
+        client.post("/api/story/reset")
+        version = json_obj(client.get("/api/story/state"))["version"]
+        r = client.post(
+            "/api/story/choice",
+            json={"scene_id": "s0_0", "choice_id": "c0_0_a", "version": version},
+        )
+        assert r.status_code == 200
+        assert json_obj(r)["next_state"]["version"] > version
+
+    def test_stale_version_returns_409(self, client: FlaskClient) -> None:
+        client.post("/api/story/reset")
+        version = json_obj(client.get("/api/story/state"))["version"]
+        client.post(
+            "/api/story/choice",
+            json={"scene_id": "s0_0", "choice_id": "c0_0_a", "version": version},
+        )
+        # Double clic : même choix avec la version déjà consommée.
+        r = client.post(
+            "/api/story/choice",
+            json={"scene_id": "s0_0", "choice_id": "c0_0_a", "version": version},
+        )
+        data = json_obj(r)
+        assert r.status_code == 409
+        assert data["conflict"] is True
+
+    def test_concurrent_write_returns_409(
+        self, client: FlaskClient, monkeypatch: pytest.MonkeyPatch
+    ) -> None:
+        def conflicting_stage(player_id: str, *_: Any) -> int:
+            raise story_routes.StateConflictError(player_id, 0)
+
+        monkeypatch.setattr(story_routes, "stage_state", conflicting_stage)
+        r = client.post(
+            "/api/story/choice", json={"scene_id": "s0_0", "choice_id": "c0_0_a"}
+        )
+        assert r.status_code == 409
+
+    def test_non_integer_version_returns_400(self, client: FlaskClient) -> None:
+        r = client.post("/api/story/advance", json={"scene_id": "s0_0", "version": "3"})
+        assert r.status_code == 400
+
+
 # ─────────────────────────────────────────────
 # POST /api/story/name
 # ─────────────────────────────────────────────
@@ -287,6 +352,37 @@ class TestSetName:
         assert r.status_code == 200
         assert data["player_name"] == "Athalia"
 
+    def test_stale_client_version_returns_409(self, client: FlaskClient) -> None:
+        state = json_obj(client.get("/api/story/state"))
+        r = client.post(
+            "/api/story/name", json={"name": "Ada", "version": state["version"] - 1}
+        )
+        assert r.status_code == 409
+        assert json_obj(r)["conflict"] is True
+
+    def test_rename_racing_a_choice_does_not_overwrite_it(
+        self, client: FlaskClient, monkeypatch: pytest.MonkeyPatch
+    ) -> None:
+        from core.story_save import load_state, stage_state
+
+        client.get("/api/story/state")
+        real_load = story_routes.load_state_versioned
+
+        def _load_then_choice(player_id: str) -> Any:
+            loaded = real_load(player_id)
+            assert loaded is not None
+            # Un /choice d'un autre onglet passe entre la lecture et l'écriture.
+            stage_state(player_id, {**loaded[0], "xp": 999}, loaded[1])
+            return loaded
+
+        monkeypatch.setattr(story_routes, "load_state_versioned", _load_then_choice)
+        r = client.post("/api/story/name", json={"name": "Ada"})
+        assert r.status_code == 409
+        player_id = client.get_cookie(COOKIE_NAME)
+        assert player_id is not None
+        saved = load_state(player_id.value)
+        assert saved is not None and saved["xp"] == 999
+
 
 # ─────────────────────────────────────────────
 # GET /api/story/summary
@@ -319,6 +415,16 @@ class TestGetSummary:
         assert "secrets_found" in data
         assert "secrets_total" in data
 
+    def test_scene_progress_uses_engine_position(self, client: FlaskClient) -> None:
+        from core.story_engine import get_story_engine
+
+        client.get("/api/story/state")
+        data = json_obj(client.get("/api/story/summary"))
+        position = get_story_engine().get_scene_position(data["current_scene"])
+        assert position is not None
+        assert data["scene_index"] == position.scene_index
+        assert data["scene_total"] == position.scene_total
+
     def test_empty_summary_returns_exists_false_on_fresh_client(self) -> None:
         fresh_app = create_app()
         fresh_app.config["TESTING"] = True
@@ -375,6 +481,8 @@ class TestGetJournal:
         assert data["journal"] is not None
         assert len(data["moments"]) >= 2
         assert data["player_name"] == "Tester"
+        assert data["scene_index"] >= 1
+        assert data["scene_total"] >= data["scene_index"]
 
     def test_journal_is_none_on_fresh_client(self) -> None:
         fresh_app = create_app()
@@ -454,9 +562,24 @@ class TestAdvance:
 class TestPages:
     def test_health_page(self, client: FlaskClient) -> None:
         r = client.get("/health")
-        data = json_obj(r)
         assert r.status_code == 200
-        assert data["status"] == "ok"
+        assert json_obj(r) == {"status": "ok"}
+
+    def test_stats_endpoint_is_disabled_by_default(self, client: FlaskClient) -> None:
+        assert client.get("/health/stats").status_code == 404
+
+    def test_stats_endpoint_is_loopback_only(
+        self, client: FlaskClient, monkeypatch: pytest.MonkeyPatch
+    ) -> None:
+        monkeypatch.setenv("APP_STATS_ENDPOINT", "1")
+        reload_settings()
+        r = client.get("/health/stats")
+        assert r.status_code == 200
+        assert {"db_pool", "rate_limit", "state_cache"} <= set(json_obj(r))
+        remote = client.get(
+            "/health/stats", environ_base={"REMOTE_ADDR": "203.0.113.7"}
+        )
+        assert remote.status_code == 404
 
     def test_index_page(self, client: FlaskClient) -> None:
         r = client.get("/")
@@ -686,3 +809,95 @@ class TestTelemetry:
         data = json_obj(r)
         assert r.status_code == 200
         assert data["success"] is True
+
+
+class TestTelemetryBatch:
+    def test_accepts_batch_and_counts_rejected_events(
+        self, client: FlaskClient, monkeypatch: pytest.MonkeyPatch
+    ) -> None:
+        captured: list[list[tuple[str, dict[str, Any]]]] = []
+
+        def fake_log(player_id: str, events: list[tuple[str, dict[str, Any]]]) -> None:
+            captured.append(list(events))
+
+        monkeypatch.setattr(story_routes, "log_telemetry_events", fake_log)
+        r = client.post(
+            "/api/story/telemetry/batch",
+            json={
+                "events": [
+                    {"event_type": "scene_viewed", "payload": {"scene_id": "s0_0"}},
+                    {"event_type": "", "payload": {}},
+                    "not-an-event",
+                    {"event_type": "ui", "payload": {"value": "x" * 500}},
+                ]
+            },
+        )
+        data = json_obj(r)
+        assert r.status_code == 200
+        assert data == {"success": True, "accepted": 2, "rejected": 2}
+        assert len(captured) == 1
+        assert [event_type for event_type, _ in captured[0]] == ["scene_viewed", "ui"]
+        assert captured[0][1][1]["value"] == "x" * 128
+
+    def test_rejects_missing_events_list(self, client: FlaskClient) -> None:
+        r = client.post("/api/story/telemetry/batch", json={"events": "nope"})
+        assert r.status_code == 400
+
+    def test_rejects_too_many_events(self, client: FlaskClient) -> None:
+        events = [{"event_type": "scene_viewed", "payload": {}}] * (
+            story_routes.TELEMETRY_BATCH_MAX_EVENTS + 1
+        )
+        r = client.post("/api/story/telemetry/batch", json={"events": events})
+        assert r.status_code == 400
+
+    def test_rejects_oversized_body(self, client: FlaskClient) -> None:
+        r = client.post(
+            "/api/story/telemetry/batch",
+            data="x" * (story_routes.TELEMETRY_BATCH_MAX_BYTES + 1),
+            content_type="application/json",
+        )
+        assert r.status_code == 413
+
+    def test_batch_has_its_own_rate_limit_budget(
+        self, client: FlaskClient, monkeypatch: pytest.MonkeyPatch
+    ) -> None:
+        monkeypatch.setenv("STORY_RATE_LIMIT_MAX_POSTS", "1")
+        monkeypatch.setenv("STORY_TELEMETRY_RATE_LIMIT_MAX_POSTS", "3")
+        monkeypatch.setattr(story_routes, "log_telemetry_events", lambda *_: None)
+        reload_settings()
+        story_routes.reset_story_rate_limit()
+        try:
+            statuses = [
+                client.post("/api/story/telemetry/batch", json={"events": []})
+                for _ in range(4)
+            ]
+            assert [r.status_code for r in statuses] == [200, 200, 200, 429]
+            assert statuses[-1].headers.get("Retry-After") == "60"
+            # Le budget du jeu reste intact.
+            choice = client.post(
+                "/api/story/choice", json={"scene_id": "s0_0", "choice_id": "c0_0_a"}
+            )
+            assert choice.status_code in {200, 400}
+        finally:
+            monkeypatch.delenv("STORY_RATE_LIMIT_MAX_POSTS")
+            monkeypatch.delenv("STORY_TELEMETRY_RATE_LIMIT_MAX_POSTS")
+            story_routes.reset_story_rate_limit()
+
+
+class TestLeaderboardCaching:
+    def test_leaderboard_sets_etag_and_revalidation_header(
+        self, client: FlaskClient
+    ) -> None:
+        r = client.get("/api/story/leaderboard")
+        assert r.status_code == 200
+        assert r.headers.get("ETag")
+        assert r.headers.get("Cache-Control") == "no-cache"
+
+    def test_leaderboard_returns_304_when_etag_matches(
+        self, client: FlaskClient
+    ) -> None:
+        first = client.get("/api/story/leaderboard")
+        etag = first.headers["ETag"]
+        second = client.get("/api/story/leaderboard", headers={"If-None-Match": etag})
+        assert second.status_code == 304
+        assert second.data == b""
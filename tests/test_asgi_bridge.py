@@ -0,0 +1,181 @@
+"""
+Tests de la passerelle ASGI (core/asgi_bridge.py).
+"""
+
+import asyncio
+import json
+import threading
+from typing import Any, Optional
+
+import pytest
+
+pytest.importorskip("a2wsgi")  # dépendance optionnelle (.[asgi])
+
+from app import create_app  # noqa: E402
+from core.asgi_bridge import AsgiBridge  # noqa: E402
+
+Message = dict[str, Any]
+
+
+def _scope(path: str, method: str = "GET", **extra: Any) -> dict[str, Any]:
+    scope: dict[str, Any] = {
+        "type": "http",
+        "http_version": "1.1",
+        "method": method,
+        "scheme": "http",
+        "path": path,
+        "query_string": b"",
+        "root_path": "",
+        "headers": [(b"host", b"testserver")],
+        "client": ("10.0.0.1", 4242),
+        "server": ("testserver", 80),
+    }
+    scope.update(extra)
+    return scope
+
+
+async def _call(
+    bridge: AsgiBridge,
+    scope: dict[str, Any],
+    body: bytes = b"",
+    messages: Optional[list[Message]] = None,
+) -> tuple[int, dict[bytes, bytes], bytes]:
+    sent: list[Message] = []
+    bodies = messages or [{"type": "http.request", "body": body, "more_body": False}]
+
+    async def receive() -> Message:
+        return bodies.pop(0) if bodies else {"type": "http.disconnect"}
+
+    async def send(message: Message) -> None:
+        sent.append(message)
+
+    await bridge(scope, receive, send)
+    start = sent[0]
+    payload = b"".join(m.get("body", b"") for m in sent[1:])
+    return start["status"], dict(start["headers"]), payload
+
+
+def _gated_app(gate: threading.Barrier) -> Any:
+    def app(environ: dict[str, Any], start_response: Any) -> list[bytes]:
+        gate.wait(timeout=5)
+        start_response("200 OK", [("Content-Type", "text/plain")])
+        return [b"ok"]
+
+    return app
+
+
+class TestAsgiBridge:
+    def test_serves_flask_app(self) -> None:
+        bridge = AsgiBridge(create_app().wsgi_app, max_threads=2)
+        status, headers, body = asyncio.run(_call(bridge, _scope("/health")))
+        assert status == 200
+        assert headers[b"content-type"] == b"application/json"
+        assert json.loads(body)["status"] == "ok"
+
+    def test_post_body_and_cookie_reach_flask(self) -> None:
+        bridge = AsgiBridge(create_app().wsgi_app, max_threads=2)
+        scope = _scope(
+            "/api/story/name",
+            method="POST",
+            headers=[(b"content-type", b"application/json")],
+        )
+        status, headers, body = asyncio.run(
+            _call(bridge, scope, json.dumps({"name": "Ada"}).encode())
+        )
+        assert status == 200
+        assert json.loads(body)["success"] is True
+        assert b"luna_player_id=" in headers[b"set-cookie"]
+
+    def test_blocking_calls_run_concurrently_in_pool(self) -> None:
+        # Les deux requêtes ne se terminent que si elles tournent en même temps.
+        bridge = AsgiBridge(_gated_app(threading.Barrier(2)), max_threads=2)
+
+        async def _both() -> list[Any]:
+            return await asyncio.gather(
+                _call(bridge, _scope("/a")), _call(bridge, _scope("/b"))
+            )
+
+        assert [status for status, _, _ in asyncio.run(_both())] == [200, 200]
+
+    def test_rejects_beyond_pool_and_queue(self) -> None:
+        gate = threading.Barrier(2)
+        bridge = AsgiBridge(_gated_app(gate), max_threads=1, max_pending=0)
+
+        async def _overload() -> tuple[Any, Any]:
+            first = asyncio.ensure_future(_call(bridge, _scope("/slow")))
+            await asyncio.sleep(0.05)
+            second = await _call(bridge, _scope("/extra"))
+            await asyncio.get_running_loop().run_in_executor(None, gate.wait, 5)
+            return await first, second
+
+        first, second = asyncio.run(_overload())
+        assert first[0] == 200
+        assert second[0] == 503
+        assert second[1][b"retry-after"] == b"1"
+        assert bridge.stats()["rejected"] == 1
+
+    def test_oversized_body_is_rejected_before_wsgi(self) -> None:
+        bridge = AsgiBridge(_gated_app(threading.Barrier(1)), max_body_bytes=4)
+        status, _, _ = asyncio.run(_call(bridge, _scope("/", "POST"), b"12345"))
+        assert status == 413
+
+    def test_lifespan_starts_and_stops_pool(self) -> None:
+        bridge = AsgiBridge(_gated_app(threading.Barrier(1)))
+        messages = [{"type": "lifespan.startup"}, {"type": "lifespan.shutdown"}]
+        sent: list[Message] = []
+
+        async def receive() -> Message:
+            return messages.pop(0)
+
+        async def send(message: Message) -> None:
+            sent.append(message)
+
+        asyncio.run(bridge({"type": "lifespan"}, receive, send))
+        assert [m["type"] for m in sent] == [
+            "lifespan.startup.complete",
+            "lifespan.shutdown.complete",
+        ]
+
+    def test_chunked_body_reaches_flask(self) -> None:
+        bridge = AsgiBridge(create_app().wsgi_app, max_threads=2)
+        scope = _scope(
+            "/api/story/name",
+            method="POST",
+            headers=[
+                (b"content-type", b"application/json"),
+                (b"transfer-encoding", b"chunked"),
+            ],
+        )
+        messages: list[Message] = [
+            {"type": "http.request", "body": b'{"name":', "more_body": True},
+            {"type": "http.request", "body": b' "Ada"}', "more_body": False},
+        ]
+        status, _, body = asyncio.run(_call(bridge, scope, messages=messages))
+        assert status == 200
+        assert json.loads(body)["success"] is True
+
+    def test_disconnect_during_body_is_not_dispatched(self) -> None:
+        called: list[bool] = []
+
+        def app(environ: dict[str, Any], start_response: Any) -> list[bytes]:
+            called.append(True)
+            start_response("200 OK", [])
+            return [b""]
+
+        bridge = AsgiBridge(app)
+        sent: list[Message] = []
+        messages: list[Message] = [
+            {"type": "http.request", "body": b'{"name": "A', "more_body": True},
+            {"type": "http.disconnect"},
+        ]
+
+        async def receive() -> Message:
+            return messages.pop(0)
+
+        async def send(message: Message) -> None:
+            sent.append(message)
+
+        asyncio.run(bridge(_scope("/api/story/name", "POST"), receive, send))
+        assert called == []
+        assert sent == []
+        assert bridge.stats()["aborted"] == 1
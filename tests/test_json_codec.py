@@ -0,0 +1,112 @@
+"""
+Tests du codec JSON partagé et de son fournisseur Flask.
+
+Les tests ``benchmark`` comparent les backends sur des charges réelles
+(réponse ``get_state`` et état sauvegardé) :
+
+    python -m pytest tests/test_json_codec.py --benchmark-only
+"""
+
+import json
+from collections.abc import Callable
+from datetime import datetime, timezone
+from typing import Any
+
+import pytest
+
+from app import create_app
+from core import json_codec
+from core.json_codec import CodecJSONProvider, JsonCodec
+from core.story_engine import StoryEngine
+
+BACKENDS = ["json"] + (["orjson"] if json_codec.orjson is not None else [])
+
+
+def _played_state(engine: StoryEngine) -> dict[str, Any]:
+    state = engine.new_player_state()
+    state["player_name"] = "Ada"
+    engine.apply_choice(state, "s0_0", "c0_0_a")
+    state["previous_endings"] = ["ending_a", "ending_c"]
+    return state
+
+
+@pytest.fixture(scope="module")
+def payloads() -> dict[str, Any]:
+    engine = StoryEngine()
+    state = _played_state(engine)
+    return {
+        "get_state": {"success": True, **engine.get_state(state), "version": 7},
+        "save": state,
+    }
+
+
+class TestJsonCodec:
+    @pytest.mark.parametrize("backend", BACKENDS)
+    def test_round_trip_is_compact_utf8(self, backend: str) -> None:
+        codec = JsonCodec(backend)
+        value = {"dialogue": "Tu réponds ?", "flags": ["a"], "xp": 3}
+        encoded = codec.dumps(value)
+        assert encoded == '{"dialogue":"Tu réponds ?","flags":["a"],"xp":3}'
+        assert codec.loads(encoded) == value
+        assert codec.loads(codec.dumps_bytes(value)) == value
+
+    @pytest.mark.parametrize("backend", BACKENDS)
+    def test_values_outside_orjson_fall_back_to_stdlib(self, backend: str) -> None:
+        codec = JsonCodec(backend)
+        assert json.loads(codec.dumps({1: 2**70})) == {"1": 2**70}
+
+    @pytest.mark.parametrize("backend", BACKENDS)
+    def test_invalid_input_raises_json_decode_error(self, backend: str) -> None:
+        with pytest.raises(json.JSONDecodeError):
+            JsonCodec(backend).loads("{oops")
+
+    def test_unknown_backend_is_rejected(self) -> None:
+        with pytest.raises(ValueError):
+            JsonCodec("simdjson")
+
+
+class TestCodecJSONProvider:
+    def test_app_uses_codec_provider(self) -> None:
+        app = create_app()
+        assert isinstance(app.json, CodecJSONProvider)
+
+    def test_jsonify_keeps_flask_defaults(self) -> None:
+        app = create_app()
+        app.debug = False
+        when = datetime(2026, 1, 1, tzinfo=timezone.utc)
+        with app.app_context():
+            resp = app.json.response({"b": 1, "a": "é", "when": when})
+        assert resp.mimetype == "application/json"
+        assert resp.get_data(as_text=True) == (
+            '{"a":"é","b":1,"when":"Thu, 01 Jan 2026 00:00:00 GMT"}\n'
+        )
+
+
+@pytest.mark.performance
+class TestJsonCodecBenchmark:
+    @pytest.mark.parametrize("backend", BACKENDS)
+    @pytest.mark.parametrize("payload", ["get_state", "save"])
+    def test_encode(
+        self,
+        benchmark: Callable[..., Any],
+        payloads: dict[str, Any],
+        backend: str,
+        payload: str,
+    ) -> None:
+        codec = JsonCodec(backend)
+        value = payloads[payload]
+        encoded = benchmark(codec.dumps_bytes, value)
+        assert json.loads(encoded) == value
+
+    @pytest.mark.parametrize("backend", BACKENDS)
+    @pytest.mark.parametrize("payload", ["get_state", "save"])
+    def test_decode(
+        self,
+        benchmark: Callable[..., Any],
+        payloads: dict[str, Any],
+        backend: str,
+        payload: str,
+    ) -> None:
+        codec = JsonCodec(backend)
+        raw = codec.dumps_bytes(payloads[payload])
+        assert benchmark(codec.loads, raw) == payloads[payload]
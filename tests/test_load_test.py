@@ -0,0 +1,68 @@
+"""
+Tests du test de charge HTTP (scripts/load_test.py).
+"""
+
+import json
+import threading
+from collections.abc import Generator
+
+import pytest
+from werkzeug.serving import make_server
+
+from app import create_app
+from config.settings import reload_settings
+from routes import story as story_routes
+from scripts.load_test import capacity, main, run_load
+
+
+@pytest.fixture(scope="module")
+def server_url() -> Generator[str, None, None]:
+    with pytest.MonkeyPatch.context() as mp:
+        # Tous les coups de jeu viennent de 127.0.0.1 : plafond relevé
+        # (create_app relit l'environnement).
+        mp.setenv("STORY_RATE_LIMIT_MAX_POSTS", "1000000")
+        server = make_server("127.0.0.1", 0, create_app(), threaded=True)
+        story_routes.reset_story_rate_limit()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield f"http://127.0.0.1:{server.server_port}"
+    finally:
+        server.shutdown()
+        reload_settings()
+        story_routes.reset_story_rate_limit()
+
+
+class TestLoadTest:
+    def test_run_load_reports_latencies(self, server_url: str) -> None:
+        result = run_load(server_url, concurrency=2, duration=0.3)
+        assert result.requests > 0
+        assert result.statuses.get(200) == result.requests
+        assert result.errors == 0
+        assert 0 < result.percentile(0.5) <= result.percentile(0.99)
+        assert capacity([result], p95_budget_ms=10_000) == 2
+
+    def test_clients_play_choices_and_advance(self, server_url: str) -> None:
+        result = run_load(server_url, concurrency=1, duration=0.5)
+        # Un tour sur deux est un coup de jeu (ou une relecture de l'état).
+        assert result.writes > result.requests // 4
+        assert result.statuses.get(200) == result.requests
+
+    def test_read_only_sends_no_post(self, server_url: str) -> None:
+        result = run_load(server_url, concurrency=1, duration=0.2, play=False)
+        assert result.requests > 0
+        assert result.writes == 0
+
+    def test_unreachable_target_counts_errors(self) -> None:
+        result = run_load("http://127.0.0.1:9", concurrency=1, duration=0.1)
+        assert result.errors > 0
+        assert capacity([result], p95_budget_ms=10_000) == 0
+
+    def test_command_prints_capacity_per_target(
+        self, server_url: str, capsys: pytest.CaptureFixture[str]
+    ) -> None:
+        code = main(["--url", server_url, "--concurrency", "1,2", "--duration", "0.2"])
+        assert code == 0
+        report = json.loads(capsys.readouterr().out)
+        assert report[0]["url"] == server_url
+        assert [level["concurrency"] for level in report[0]["levels"]] == [1, 2]
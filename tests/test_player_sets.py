@@ -0,0 +1,42 @@
+"""
+Tests de la vue ensembliste de l'état joueur.
+"""
+
+from core.player_sets import IdSet, PlayerSets
+from core.story_engine import StoryEngine
+
+
+class TestIdSet:
+    def test_add_appends_to_the_persisted_list_once(self) -> None:
+        state = {"flags": ["a"]}
+        flags = IdSet(state, "flags")
+        assert flags.add("b") is True
+        assert flags.add("a") is False
+        assert state["flags"] == ["a", "b"]
+        assert "b" in flags and len(flags) == 2
+
+    def test_list_is_created_on_first_add_only(self) -> None:
+        state: dict[str, object] = {}
+        secrets = IdSet(state, "secrets_found")
+        assert "x" not in secrets
+        assert state == {}
+        secrets.add("x")
+        assert state == {"secrets_found": ["x"]}
+
+
+class TestPlayerSets:
+    def test_flag_mask_follows_added_flags(self) -> None:
+        bits = {"a": 1, "b": 2, "c": 4}
+        sets = PlayerSets({"flags": ["a", "inconnu"]}, bits)
+        assert sets.flag_mask == 1
+        sets.add_flag("c")
+        assert sets.has_flags(1 | 4)
+        assert not sets.has_flags(2)
+
+    def test_engine_view_matches_state_lists(self) -> None:
+        engine = StoryEngine()
+        state = engine.new_player_state()
+        engine.apply_choice(state, "s0_0", "c0_0_a")
+        sets = engine.player_sets(state)
+        assert set(sets.flags) == set(state["flags"])
+        assert len(sets.secrets) == len(state["secrets_found"])
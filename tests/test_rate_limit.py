@@ -0,0 +1,187 @@
+"""
+Tests du limiteur de débit à fenêtre glissante.
+"""
+
+import os
+import subprocess
+import sys
+import threading
+from collections.abc import Iterator
+from pathlib import Path
+
+import pytest
+
+from core.rate_limit import (
+    ShardedRateLimiter,
+    SharedMemoryRateLimiter,
+    create_rate_limiter,
+)
+
+
+class TestSlidingWindow:
+    def test_limit_applies_within_a_window(self) -> None:
+        limiter = ShardedRateLimiter()
+        assert [limiter.hit("ip", 0.5, 60, 3) for _ in range(4)] == [
+            True,
+            True,
+            True,
+            False,
+        ]
+
+    def test_previous_window_is_weighted_by_overlap(self) -> None:
+        limiter = ShardedRateLimiter()
+        for _ in range(10):
+            limiter.hit("ip", 59.0, 60, 10)
+        # 15 s dans la fenêtre suivante : 10 × 0,75 = 7,5 encore comptés.
+        allowed = sum(limiter.hit("ip", 75.0, 60, 10) for _ in range(10))
+        assert allowed == 3
+
+    def test_counter_expires_after_two_windows(self) -> None:
+        limiter = ShardedRateLimiter()
+        for _ in range(5):
+            limiter.hit("ip", 10.0, 60, 5)
+        assert limiter.hit("ip", 11.0, 60, 5) is False
+        assert limiter.hit("ip", 130.0, 60, 5) is True
+
+    def test_rejected_requests_are_not_counted(self) -> None:
+        limiter = ShardedRateLimiter()
+        limiter.hit("ip", 0.0, 60, 1)
+        for _ in range(20):
+            limiter.hit("ip", 1.0, 60, 1)
+        # Fenêtre suivante à mi-parcours : 1 × 0,5 < 1.
+        assert limiter.hit("ip", 90.0, 60, 1) is True
+
+
+class TestCleanupAndMemory:
+    def test_cleanup_drops_stale_keys_only(self) -> None:
+        limiter = ShardedRateLimiter()
+        limiter.record("old", 1.0, 60)
+        limiter.record("fresh", 990.0, 60)
+        limiter.cleanup(1000.0, 60)
+        assert "old" not in limiter
+        assert "fresh" in limiter
+
+    def test_requests_sweep_their_shard_lazily(self) -> None:
+        limiter = ShardedRateLimiter(shards=1)
+        limiter.record("old", 1.0, 60)
+        limiter.hit("new", 500.0, 60, 10)
+        assert "old" not in limiter
+
+    def test_key_count_is_bounded_under_flood(self) -> None:
+        limiter = ShardedRateLimiter(shards=4, max_keys=100)
+        for n in range(10_000):
+            limiter.hit(f"10.0.{n // 256}.{n % 256}", 1.0, 60, 5)
+        stats = limiter.stats()
+        assert len(limiter) <= 100
+        assert stats["evictions"] >= 9_900
+
+    def test_concurrent_hits_respect_the_limit(self) -> None:
+        limiter = ShardedRateLimiter()
+        allowed: list[bool] = []
+        lock = threading.Lock()
+
+        def _worker() -> None:
+            for _ in range(50):
+                ok = limiter.hit("shared", 1.0, 60, 100)
+                with lock:
+                    allowed.append(ok)
+
+        threads = [threading.Thread(target=_worker) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert sum(allowed) == 100
+
+
+@pytest.fixture
+def shared(tmp_path: Path) -> Iterator[SharedMemoryRateLimiter]:
+    limiter = SharedMemoryRateLimiter(str(tmp_path / "rl"), shards=4, max_keys=64)
+    yield limiter
+    limiter.close()
+
+
+class TestSharedMemoryBackend:
+    def test_same_semantics_as_memory_backend(
+        self, shared: SharedMemoryRateLimiter
+    ) -> None:
+        assert [shared.hit("ip", 0.5, 60, 2) for _ in range(3)] == [
+            True,
+            True,
+            False,
+        ]
+        assert shared.hit("ip", 130.0, 60, 2) is True
+
+    def test_state_is_shared_between_instances(
+        self, shared: SharedMemoryRateLimiter
+    ) -> None:
+        other = SharedMemoryRateLimiter(shared.path, shards=4, max_keys=64)
+        try:
+            shared.hit("ip", 1.0, 60, 2)
+            other.hit("ip", 1.0, 60, 2)
+            assert shared.hit("ip", 1.0, 60, 2) is False
+        finally:
+            other.close()
+
+    def test_cleanup_and_reset(self, shared: SharedMemoryRateLimiter) -> None:
+        shared.record("old", 1.0, 60)
+        shared.record("fresh", 990.0, 60)
+        shared.cleanup(1000.0, 60)
+        assert "old" not in shared and "fresh" in shared
+        shared.reset()
+        assert len(shared) == 0
+
+    def test_table_size_is_fixed_under_flood(
+        self, shared: SharedMemoryRateLimiter
+    ) -> None:
+        size = os.path.getsize(shared.path)
+        for n in range(2_000):
+            shared.hit(f"ip-{n}", 1.0, 60, 5)
+        assert os.path.getsize(shared.path) == size
+        assert len(shared) <= shared.stats()["max_keys"]
+
+    def test_limit_holds_across_processes(self, tmp_path: Path) -> None:
+        path = str(tmp_path / "rl")
+        SharedMemoryRateLimiter(path, shards=4, max_keys=64).close()
+        code = (
+            "import sys\n"
+            "from core.rate_limit import SharedMemoryRateLimiter\n"
+            "rl = SharedMemoryRateLimiter(sys.argv[1], shards=4, max_keys=64)\n"
+            "print(sum(rl.hit('shared', 1.0, 60, 100) for _ in range(50)))\n"
+        )
+        root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        workers = [
+            subprocess.Popen(
+                [sys.executable, "-c", code, path],
+                cwd=root,
+                stdout=subprocess.PIPE,
+                text=True,
+            )
+            for _ in range(4)
+        ]
+        allowed = sum(int(worker.communicate(timeout=60)[0]) for worker in workers)
+        assert allowed == 100
+
+
+class TestBackendSelection:
+    def test_memory_is_the_default(self) -> None:
+        assert isinstance(create_rate_limiter({}), ShardedRateLimiter)
+
+    def test_shared_backend_from_env(self, tmp_path: Path) -> None:
+        limiter = create_rate_limiter(
+            {
+                "STORY_RATE_LIMIT_BACKEND": "shared",
+                "STORY_RATE_LIMIT_SHM_PATH": str(tmp_path / "rl"),
+            }
+        )
+        assert isinstance(limiter, SharedMemoryRateLimiter)
+        limiter.close()
+
+    def test_unusable_shared_path_falls_back_to_memory(self, tmp_path: Path) -> None:
+        limiter = create_rate_limiter(
+            {
+                "STORY_RATE_LIMIT_BACKEND": "shared",
+                "STORY_RATE_LIMIT_SHM_PATH": str(tmp_path / "absent" / "rl"),
+            }
+        )
+        assert isinstance(limiter, ShardedRateLimiter)
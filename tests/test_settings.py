@@ -0,0 +1,147 @@
+"""
+Tests des réglages typés de l'application (config/settings.py).
+"""
+
+import os
+import signal
+import time
+from collections.abc import Callable, Generator
+from pathlib import Path
+
+import pytest
+
+from app import create_app
+from config import settings as settings_module
+from config.settings import (
+    Settings,
+    install_sighup_reload,
+    load_settings,
+    on_reload,
+    reload_settings,
+)
+from core import story_save
+from routes import story as story_routes
+
+
+def _wait_for(predicate: Callable[[], bool], timeout: float = 5.0) -> None:
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < deadline, "réglages non rechargés"
+        time.sleep(0.01)
+
+
+@pytest.fixture(autouse=True)
+def _restore_settings() -> Generator[None, None, None]:
+    yield
+    reload_settings()
+
+
+class TestLoadSettings:
+    def test_empty_environment_gives_defaults(self) -> None:
+        assert load_settings({}) == Settings()
+
+    def test_values_are_parsed_and_clamped(self) -> None:
+        settings = load_settings(
+            {
+                "STORY_RATE_LIMIT_WINDOW_SECONDS": "0",
+                "STORY_RATE_LIMIT_MAX_POSTS": "5",
+                "APP_MAX_CONTENT_LENGTH_BYTES": "10",
+                "STORY_DB_PATH": "/tmp/luna.db",
+                "STORY_LEADERBOARD_CACHE_TTL_SECONDS": "2.5",
+                "STORY_TELEMETRY_ASYNC": "off",
+            }
+        )
+        assert settings.rate_limit_window_seconds == 1
+        assert settings.rate_limit_max_posts == 5
+        assert settings.max_content_length_bytes == 1024
+        assert settings.db_path == "/tmp/luna.db"
+        assert settings.leaderboard_cache_ttl_seconds == 2.5
+        assert settings.telemetry_async is False
+
+    def test_invalid_values_fall_back_with_one_warning_each(
+        self, caplog: pytest.LogCaptureFixture
+    ) -> None:
+        settings = load_settings(
+            {"STORY_STATE_CACHE_SIZE": "many", "STORY_TELEMETRY_FLUSH_MS": "soon"}
+        )
+        assert settings.state_cache_size == Settings().state_cache_size
+        assert settings.telemetry_flush_ms == Settings().telemetry_flush_ms
+        assert len(caplog.records) == 2
+
+    def test_settings_file_overrides_environment(self, tmp_path: Path) -> None:
+        path = tmp_path / "luna.env"
+        path.write_text(
+            "# surcharge\nSTORY_RATE_LIMIT_MAX_POSTS='7'\n\nIGNORED\n",
+            encoding="utf-8",
+        )
+        settings = load_settings(
+            {"APP_SETTINGS_FILE": str(path), "STORY_RATE_LIMIT_MAX_POSTS": "3"}
+        )
+        assert settings.rate_limit_max_posts == 7
+
+    def test_missing_settings_file_keeps_environment(self, tmp_path: Path) -> None:
+        settings = load_settings(
+            {
+                "APP_SETTINGS_FILE": str(tmp_path / "absent.env"),
+                "STORY_RATE_LIMIT_MAX_POSTS": "3",
+            }
+        )
+        assert settings.rate_limit_max_posts == 3
+
+
+class TestReload:
+    def test_reload_notifies_listeners(self) -> None:
+        seen: list[Settings] = []
+        on_reload(seen.append)
+        try:
+            reloaded = reload_settings({"STORY_RATE_LIMIT_MAX_POSTS": "9"})
+        finally:
+            settings_module._LISTENERS.remove(seen.append)
+        assert seen == [reloaded]
+        assert settings_module.get_settings().rate_limit_max_posts == 9
+
+    @pytest.mark.skipif(not hasattr(signal, "SIGHUP"), reason="SIGHUP indisponible")
+    def test_sighup_reloads_running_app(
+        self, monkeypatch: pytest.MonkeyPatch, tmp_path: Path
+    ) -> None:
+        previous = signal.getsignal(signal.SIGHUP)
+        path = tmp_path / "luna.env"
+        path.write_text("STORY_RATE_LIMIT_MAX_POSTS=60\n", encoding="utf-8")
+        monkeypatch.setenv("APP_SETTINGS_FILE", str(path))
+        try:
+            app = create_app()
+            assert install_sighup_reload() is True
+            path.write_text(
+                "STORY_RATE_LIMIT_MAX_POSTS=1\nAPP_MAX_CONTENT_LENGTH_BYTES=2048\n",
+                encoding="utf-8",
+            )
+            os.kill(os.getpid(), signal.SIGHUP)
+            _wait_for(lambda: app.config["MAX_CONTENT_LENGTH"] == 2048)
+            with app.test_request_context():
+                assert story_routes._get_rate_limit_config()[1] == 1
+        finally:
+            signal.signal(signal.SIGHUP, previous)
+
+    @pytest.mark.skipif(not hasattr(signal, "SIGHUP"), reason="SIGHUP indisponible")
+    def test_sighup_while_state_cache_lock_is_held(
+        self, monkeypatch: pytest.MonkeyPatch
+    ) -> None:
+        # Le rechargement passe par PlayerStateCache.configure (verrou non
+        # réentrant) : exécuté dans le gestionnaire, il bloquerait ce thread.
+        previous = signal.getsignal(signal.SIGHUP)
+        try:
+            app = create_app()
+            assert install_sighup_reload() is True
+            monkeypatch.setenv("APP_MAX_CONTENT_LENGTH_BYTES", "4096")
+            with story_save._STATE_CACHE._lock:
+                os.kill(os.getpid(), signal.SIGHUP)
+                # Le gestionnaire a rendu la main : le thread de rechargement
+                # a relu les réglages et attend le verrou pour les appliquer.
+                _wait_for(
+                    lambda: settings_module.get_settings().max_content_length_bytes
+                    == 4096
+                )
+                assert app.config["MAX_CONTENT_LENGTH"] != 4096
+            _wait_for(lambda: app.config["MAX_CONTENT_LENGTH"] == 4096)
+        finally:
+            signal.signal(signal.SIGHUP, previous)
@@ -0,0 +1,334 @@
+"""
+Tests du cache des états joueurs et de l'écriture différée.
+"""
+
+import sqlite3
+import threading
+import time
+from collections.abc import Generator
+from typing import Any
+
+import pytest
+
+from core import story_save
+from core.state_cache import PlayerStateCache, StateConflictError
+
+
+def _point_db_to_temp(tmp_path: Any) -> None:
+    story_save.DB_PATH = str(tmp_path / "luna_saves_test.db")
+    story_save.init_db()
+
+
+def _db_row(player_id: str) -> sqlite3.Row:
+    with sqlite3.connect(story_save.DB_PATH) as conn:
+        conn.row_factory = sqlite3.Row
+        return conn.execute(
+            "SELECT version, lease_owner, lease_until, state_json "
+            "FROM story_saves WHERE player_id = ?",
+            (player_id,),
+        ).fetchone()
+
+
+class _RecordingFlusher:
+    def __init__(self, conflict: bool = False) -> None:
+        self.calls: list[tuple[str, dict[str, Any], int, int]] = []
+        self.conflict = conflict
+
+    def __call__(
+        self,
+        player_id: str,
+        state: dict[str, Any],
+        version: int,
+        flushed_version: int,
+        db_path: str,
+    ) -> bool:
+        self.calls.append((player_id, state, version, flushed_version))
+        return not self.conflict
+
+
+class TestPlayerStateCache:
+    def test_staged_states_are_coalesced_into_one_write(self) -> None:
+        flusher = _RecordingFlusher()
+        cache = PlayerStateCache(flusher, flush_interval_ms=60_000)
+        cache.store("p1", {"xp": 0}, 1, "db", lease_until=time.time() + 120)
+        for xp in range(1, 6):
+            assert cache.stage("p1", {"xp": xp}, "db") == 1 + xp
+        cache.flush()
+        assert flusher.calls == [("p1", {"xp": 5}, 6, 1)]
+        entry = cache.lookup("p1", "db")
+        assert entry is not None
+        assert entry.version == entry.flushed_version == 6
+        assert entry.dirty_since is None
+
+    def test_stage_requires_a_lease_covering_the_window(self) -> None:
+        cache = PlayerStateCache(_RecordingFlusher(), flush_interval_ms=1000)
+        cache.store("p1", {"xp": 0}, 1, "db", lease_until=time.time() + 0.5)
+        assert cache.stage("p1", {"xp": 1}, "db") is None
+        assert cache.stage("unknown", {"xp": 1}, "db") is None
+
+    def test_shared_or_disabled_cache_never_stages(self) -> None:
+        cache = PlayerStateCache(_RecordingFlusher(), flush_interval_ms=1000)
+        cache.store("p1", {"xp": 0}, 1, "db", lease_until=time.time() + 60)
+        cache.mark_shared("p1")
+        assert cache.stage("p1", {"xp": 1}, "db") is None
+
+        disabled = PlayerStateCache(_RecordingFlusher(), flush_interval_ms=0)
+        disabled.store("p1", {"xp": 0}, 1, "db", lease_until=time.time() + 60)
+        assert disabled.stage("p1", {"xp": 1}, "db") is None
+
+    def test_conflict_drops_the_entry(self) -> None:
+        cache = PlayerStateCache(_RecordingFlusher(conflict=True), flush_interval_ms=1)
+        cache.store("p1", {"xp": 0}, 1, "db", lease_until=time.time() + 60)
+        assert cache.stage("p1", {"xp": 1}, "db") == 2
+        cache.flush()
+        assert cache.lookup("p1", "db") is None
+        assert cache.stats()["conflicts"] == 1
+
+    def test_background_thread_flushes_after_the_window(self) -> None:
+        flusher = _RecordingFlusher()
+        cache = PlayerStateCache(flusher, flush_interval_ms=20)
+        cache.store("p1", {"xp": 0}, 1, "db", lease_until=time.time() + 60)
+        cache.stage("p1", {"xp": 1}, "db")
+        deadline = time.monotonic() + 2
+        while not flusher.calls and time.monotonic() < deadline:
+            time.sleep(0.01)
+        cache.close()
+        assert flusher.calls == [("p1", {"xp": 1}, 2, 1)]
+
+    def test_lru_evicts_clean_entries_only(self) -> None:
+        cache = PlayerStateCache(_RecordingFlusher(), max_entries=2)
+        cache.store("dirty", {"xp": 0}, 1, "db", lease_until=time.time() + 60)
+        cache.stage("dirty", {"xp": 1}, "db")
+        cache.store("a", {}, 1, "db")
+        cache.store("b", {}, 1, "db")
+        assert cache.lookup("dirty", "db") is not None
+        assert cache.lookup("a", "db") is None
+        assert cache.lookup("b", "db") is not None
+
+    def test_loaded_state_never_replaces_newer_or_pending_entry(self) -> None:
+        cache = PlayerStateCache(_RecordingFlusher(), flush_interval_ms=60_000)
+        cache.store("p1", {"xp": 0}, 1, "db", lease_until=time.time() + 120)
+        cache.stage("p1", {"xp": 1}, "db")
+        assert cache.store_loaded("p1", {"xp": 0}, 1, "db") is False
+        cache.discard_clean("p1")
+        entry = cache.lookup("p1", "db")
+        assert entry is not None and entry.state == {"xp": 1}
+        cache.flush()
+        cache.discard_clean("p1")
+        assert cache.lookup("p1", "db") is None
+        assert cache.store_loaded("p1", {"xp": 1}, 2, "db") is True
+
+    def test_configure_shrinks_cache_and_disables_write_behind(self) -> None:
+        cache = PlayerStateCache(_RecordingFlusher(), max_entries=4)
+        for pid in ("a", "b", "c"):
+            cache.store(pid, {}, 1, "db", lease_until=time.time() + 60)
+        cache.configure(max_entries=1, flush_interval_ms=0)
+        assert cache.stats()["entries"] == 1
+        assert cache.lookup("c", "db") is not None
+        assert cache.stage("c", {"xp": 1}, "db") is None
+
+
+class TestStorySaveWriteBehind:
+    @pytest.fixture(autouse=True)
+    def _write_behind(self) -> Generator[None, None, None]:
+        # Désactivée par défaut (routage non collant) : activée comme le
+        # ferait STORY_STATE_WRITE_BEHIND_MS=500.
+        cache = story_save._STATE_CACHE
+        cache.configure(cache.max_entries, 500)
+        yield
+        cache.flush()
+        cache.configure(cache.max_entries, story_save.STATE_WRITE_BEHIND_MS)
+
+    def test_burst_of_choices_costs_two_writes(self, tmp_path: Any) -> None:
+        _point_db_to_temp(tmp_path)
+        story_save.save_state("burst", {"xp": 0})
+        for xp in range(1, 11):
+            story_save.stage_state("burst", {"xp": xp})
+        assert story_save.load_state("burst") == {"xp": 10}
+
+        story_save.flush_states()
+        row = _db_row("burst")
+        # Une écriture par version logique, mais seulement trois en base :
+        # save_state, prise du bail, puis une seule écriture différée.
+        assert row["version"] == 11
+        assert row["lease_owner"] == story_save._lease_owner()
+        assert story_save._decode_state(row["state_json"]) == {"xp": 10}
+
+    def test_loaded_state_is_a_copy(self, tmp_path: Any) -> None:
+        _point_db_to_temp(tmp_path)
+        story_save.save_state("copy", {"flags": ["a"]})
+        loaded = story_save.load_state("copy")
+        assert loaded is not None
+        loaded["flags"].append("b")
+        assert story_save.load_state("copy") == {"flags": ["a"]}
+
+    def test_write_by_another_worker_is_detected(self, tmp_path: Any) -> None:
+        _point_db_to_temp(tmp_path)
+        story_save.save_state("drift", {"xp": 1})
+        assert story_save.load_state("drift") == {"xp": 1}
+        with sqlite3.connect(story_save.DB_PATH) as conn:
+            conn.execute(
+                "UPDATE story_saves SET state_json = ?, version = version + 1 "
+                "WHERE player_id = ?",
+                ('{"xp": 7}', "drift"),
+            )
+        assert story_save.load_state("drift") == {"xp": 7}
+        entry = story_save._STATE_CACHE.lookup("drift", story_save.DB_PATH)
+        assert entry is not None and entry.shared
+
+        # Routage non collant : ce joueur repasse en écriture immédiate.
+        story_save.stage_state("drift", {"xp": 8})
+        assert _db_row("drift")["lease_owner"] is None
+
+    def test_foreign_lease_is_waited_for(self, tmp_path: Any) -> None:
+        _point_db_to_temp(tmp_path)
+        story_save.save_state("leased", {"xp": 1})
+        story_save._STATE_CACHE.discard("leased")
+        with sqlite3.connect(story_save.DB_PATH) as conn:
+            conn.execute(
+                "UPDATE story_saves SET lease_owner = ?, lease_until = ? "
+                "WHERE player_id = ?",
+                ("other-worker", time.time() + 0.1, "leased"),
+            )
+        before = story_save.get_state_cache_stats()["lease_waits"]
+        assert story_save.load_state("leased") == {"xp": 1}
+        assert story_save.get_state_cache_stats()["lease_waits"] > before
+
+    def test_reset_discards_pending_state(self, tmp_path: Any) -> None:
+        _point_db_to_temp(tmp_path)
+        story_save.save_state("reset", {"xp": 0})
+        story_save.stage_state("reset", {"xp": 1})
+        story_save.stage_state("reset", {"xp": 2, "endings_unlocked": ["ending_a"]})
+        story_save.delete_state("reset")
+        story_save.flush_states()
+        reloaded = story_save.load_state("reset")
+        assert reloaded is not None
+        assert reloaded["xp"] == 0
+        assert reloaded["previous_endings"] == ["ending_a"]
+
+    def test_reset_waits_for_lease_outside_write_lock(self, tmp_path: Any) -> None:
+        _point_db_to_temp(tmp_path)
+        story_save.save_state("reset-leased", {"xp": 1})
+        story_save._STATE_CACHE.discard("reset-leased")
+        with sqlite3.connect(story_save.DB_PATH) as conn:
+            conn.execute(
+                "UPDATE story_saves SET lease_owner = ?, lease_until = ? "
+                "WHERE player_id = ?",
+                ("other-worker", time.time() + 0.5, "reset-leased"),
+            )
+        reset = threading.Thread(target=story_save.delete_state, args=("reset-leased",))
+        reset.start()
+        time.sleep(0.1)
+        # Les autres écritures du processus ne patientent pas derrière le reset.
+        write_lock = story_save._STATE_CACHE.write_lock_for("reset-leased")
+        acquired = write_lock.acquire(timeout=0.05)
+        if acquired:
+            write_lock.release()
+        reset.join(5)
+        assert acquired
+        assert story_save.load_state("reset-leased") is None
+
+    def test_held_write_lock_does_not_block_other_players(self, tmp_path: Any) -> None:
+        _point_db_to_temp(tmp_path)
+        cache = story_save._STATE_CACHE
+        blocked = "player-b"
+        free = next(
+            f"player-a{i}"
+            for i in range(1000)
+            if cache.write_lock_for(f"player-a{i}") is not cache.write_lock_for(blocked)
+        )
+        story_save.stage_state(free, {"xp": 1})
+        story_save.stage_state(blocked, {"xp": 1})
+        held, release = threading.Event(), threading.Event()
+
+        def _hold() -> None:
+            # Écriture de B bloquée (busy_timeout, par exemple).
+            with cache.write_lock_for(blocked):
+                held.set()
+                release.wait(5)
+
+        def _write_free() -> None:
+            story_save.save_state(free, {"xp": 2})
+            cache.flush(free)
+
+        holder = threading.Thread(target=_hold)
+        holder.start()
+        try:
+            assert held.wait(5)
+            writer = threading.Thread(target=_write_free)
+            writer.start()
+            writer.join(2)
+            assert not writer.is_alive()
+        finally:
+            release.set()
+            holder.join(5)
+        story_save.flush_states()
+        assert story_save.load_state(free) == {"xp": 2}
+        assert story_save.load_state(blocked) == {"xp": 1}
+
+    def test_reset_rereads_state_written_after_its_read(
+        self, tmp_path: Any, monkeypatch: pytest.MonkeyPatch
+    ) -> None:
+        _point_db_to_temp(tmp_path)
+        story_save.save_state("reset-race", {"xp": 1})
+        real_load = story_save.load_state_versioned
+        reads: list[int] = []
+
+        def _load_then_race(player_id: str) -> Any:
+            loaded = real_load(player_id)
+            reads.append(1)
+            if len(reads) == 1:
+                # Un autre onglet débloque une fin entre la lecture et le verrou.
+                story_save.save_state(player_id, {"endings_unlocked": ["ending_b"]})
+            return loaded
+
+        monkeypatch.setattr(story_save, "load_state_versioned", _load_then_race)
+        story_save.delete_state("reset-race")
+        assert len(reads) == 2
+        reloaded = real_load("reset-race")
+        assert reloaded is not None
+        assert reloaded[0]["previous_endings"] == ["ending_b"]
+
+
+class TestOptimisticConcurrency:
+    def test_stale_expected_version_is_rejected(self, tmp_path: Any) -> None:
+        _point_db_to_temp(tmp_path)
+        version = story_save.save_state("cas", {"xp": 0})
+        assert story_save.save_state("cas", {"xp": 1}, version) == version + 1
+        with pytest.raises(StateConflictError):
+            story_save.save_state("cas", {"xp": 99}, version)
+        assert story_save.load_state("cas") == {"xp": 1}
+
+    def test_staged_write_checks_the_logical_version(self, tmp_path: Any) -> None:
+        _point_db_to_temp(tmp_path)
+        version = story_save.save_state("cas-staged", {"xp": 0})
+        first = story_save.stage_state("cas-staged", {"xp": 1}, version)
+        second = story_save.stage_state("cas-staged", {"xp": 2}, first)
+        assert second == first + 1
+        loaded = story_save.load_state_versioned("cas-staged")
+        assert loaded == ({"xp": 2}, second)
+        with pytest.raises(StateConflictError):
+            story_save.stage_state("cas-staged", {"xp": 3}, first)
+
+    def test_write_by_another_worker_conflicts(self, tmp_path: Any) -> None:
+        _point_db_to_temp(tmp_path)
+        version = story_save.save_state("cas-worker", {"xp": 0})
+        with sqlite3.connect(story_save.DB_PATH) as conn:
+            conn.execute(
+                "UPDATE story_saves SET version = version + 1 WHERE player_id = ?",
+                ("cas-worker",),
+            )
+        with pytest.raises(StateConflictError):
+            story_save.save_state("cas-worker", {"xp": 5}, version)
+
+    def test_flush_keeps_db_version_equal_to_logical_version(
+        self, tmp_path: Any
+    ) -> None:
+        _point_db_to_temp(tmp_path)
+        version = story_save.save_state("cas-flush", {"xp": 0})
+        for xp in range(1, 4):
+            version = story_save.stage_state("cas-flush", {"xp": xp}, version)
+        story_save.flush_states()
+        assert _db_row("cas-flush")["version"] == version
+        story_save._STATE_CACHE.discard("cas-flush")
+        assert story_save.load_state_versioned("cas-flush") == ({"xp": 3}, version)
@@ -0,0 +1,123 @@
+"""
+Tests de l'encodage compact de l'état joueur.
+"""
+
+import json
+import sqlite3
+from typing import Any
+
+import pytest
+
+from core import story_save
+from core.state_codec import decode_state, encode_state, is_encoded_state
+from core.story_compiler import STORY_PATH, codec_issues, load_compiled_story
+from core.story_engine import SECRET_RULES, get_story_engine
+
+
+def _point_db_to_temp(tmp_path: Any) -> None:
+    story_save.DB_PATH = str(tmp_path / "luna_saves_test.db")
+    story_save.init_db()
+
+
+def _played_state() -> dict[str, Any]:
+    state = get_story_engine().new_player_state()
+    state.update(
+        {
+            "current_chapter": "chapitre_3",
+            "current_scene": "s3_4",
+            "luna_trust": 72,
+            "xp": 340,
+            "flags": ["accepted_chapter_0", "looked_at_pandora", "tried_nexus"],
+            "chapters_completed": ["chapitre_0", "chapitre_1", "chapitre_2"],
+            "last_luna_reaction": "Tu as vu juste. Ça me fait peur — et ça me rassure.",
+            "player_name": "Zoé",
+            "previous_endings": ["ending_b"],
+            "secrets_found": ["pandora-scout"],
+        }
+    )
+    return state
+
+
+class TestStateCodec:
+    def test_round_trip_of_a_played_state(self) -> None:
+        state = _played_state()
+        encoded = encode_state(state)
+        assert is_encoded_state(encoded)
+        assert decode_state(encoded) == state
+
+    def test_every_story_id_is_interned(self) -> None:
+        graph = load_compiled_story(STORY_PATH, cache_path=None).graph
+        assert codec_issues(graph, [rule.id for rule in SECRET_RULES]) == []
+
+    def test_encoding_is_smaller_than_json(self) -> None:
+        state = _played_state()
+        assert len(encode_state(state)) < len(json.dumps(state, ensure_ascii=False)) / 2
+
+    def test_values_outside_the_schema_are_preserved(self) -> None:
+        state = {
+            "xp": "not-a-number",
+            "luna_trust": True,
+            "flags": ["accepted_chapter_0", "flag_from_a_newer_story"],
+            "threat_level": 2**40,
+            "custom": {"nested": [1, 2]},
+        }
+        decoded = decode_state(encode_state(state))
+        assert decoded == state
+        assert decoded["luna_trust"] is True
+
+    def test_large_payload_is_compressed(self) -> None:
+        state = {"last_luna_reaction": "LUNA " * 200}
+        compressed = encode_state(state, compress_min_bytes=256)
+        plain = encode_state(state, compress_min_bytes=0)
+        assert len(compressed) < len(plain)
+        assert decode_state(compressed) == decode_state(plain) == state
+
+    @pytest.mark.parametrize(
+        "raw",
+        [
+            b"LQS",
+            b"LQS\x02\x00\x00\x00",
+            b"LQS\x01\x00\x01\x00\x05ab",
+            b"LQS\x01\x01xx",
+        ],
+    )
+    def test_corrupt_payload_raises_value_error(self, raw: bytes) -> None:
+        with pytest.raises(ValueError):
+            decode_state(raw)
+
+
+class TestStorySaveCodec:
+    def test_save_state_writes_compact_blob(self, tmp_path: Any) -> None:
+        _point_db_to_temp(tmp_path)
+        state = _played_state()
+        story_save.save_state("codec", state)
+        with sqlite3.connect(story_save.DB_PATH) as conn:
+            raw = conn.execute(
+                "SELECT state_json FROM story_saves WHERE player_id = ?", ("codec",)
+            ).fetchone()[0]
+        assert is_encoded_state(raw)
+        story_save._STATE_CACHE.discard("codec")
+        assert story_save.load_state("codec") == state
+
+    def test_legacy_json_rows_are_read_transparently(self, tmp_path: Any) -> None:
+        _point_db_to_temp(tmp_path)
+        state = _played_state()
+        with sqlite3.connect(story_save.DB_PATH) as conn:
+            conn.execute(
+                "INSERT INTO story_saves (player_id, state_json, updated_at) "
+                "VALUES (?, ?, ?)",
+                ("legacy-json", json.dumps(state), "2026-01-01T00:00:00+00:00"),
+            )
+        assert story_save.load_state("legacy-json") == state
+        summary = story_save.get_save_summary("legacy-json")
+        assert summary is not None and summary["xp"] == 340
+
+    def test_corrupt_blob_loads_as_missing(self, tmp_path: Any) -> None:
+        _point_db_to_temp(tmp_path)
+        with sqlite3.connect(story_save.DB_PATH) as conn:
+            conn.execute(
+                "INSERT INTO story_saves (player_id, state_json, updated_at) "
+                "VALUES (?, ?, ?)",
+                ("bad-blob", b"LQS\x01\x00\xff", "2026-01-01T00:00:00+00:00"),
+            )
+        assert story_save.load_state("bad-blob") is None
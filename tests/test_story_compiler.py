@@ -0,0 +1,214 @@
+"""
+Tests de la validation de story.json et du cache compilé.
+"""
+
+import hashlib
+import json
+import pickle
+from pathlib import Path
+from typing import Any
+
+import pytest
+
+from core import story_compiler
+from core.story_compiler import (
+    STORY_PATH,
+    compile_story_source,
+    load_compiled_story,
+    main,
+    validate_story,
+    write_compiled_story,
+)
+from core.story_engine import StoryEngine
+from core.story_graph import compile_story
+
+_FLAG = "accepted_chapter_0"
+
+
+def _story(**overrides: Any) -> dict[str, Any]:
+    story: dict[str, Any] = {
+        # Identifiants de l'histoire livrée : internés par core/state_codec.py.
+        "chapters": [
+            {
+                "id": "chapitre_0",
+                "scenes": [
+                    {
+                        "id": "a",
+                        "choices": [
+                            {"id": "x", "next_scene": "b", "flags": [_FLAG]},
+                        ],
+                    },
+                    {"id": "b", "is_chapter_end": True, "next_chapter": "chapitre_1"},
+                ],
+            },
+            {"id": "chapitre_1", "scenes": [{"id": "z", "is_ending_final": True}]},
+        ],
+        "endings": {
+            "ending_a": {"unlock_condition": {"flags": [_FLAG], "min_trust": 10}}
+        },
+    }
+    story.update(overrides)
+    return story
+
+
+def _codes(story: dict[str, Any]) -> set[str]:
+    return {issue.code for issue in validate_story(story, compile_story(story))}
+
+
+def _write_story(path: Path, story: dict[str, Any]) -> str:
+    path.write_text(json.dumps(story), encoding="utf-8")
+    return str(path)
+
+
+class TestValidateStory:
+    def test_shipped_story_has_no_errors(self) -> None:
+        compiled = load_compiled_story(STORY_PATH, cache_path=None)
+        assert compiled.errors == ()
+
+    def test_valid_story_has_no_issue(self) -> None:
+        assert _codes(_story()) == set()
+
+    def test_dangling_references_are_errors(self) -> None:
+        story = _story()
+        scenes = story["chapters"][0]["scenes"]
+        scenes[0]["choices"][0]["next_scene"] = "nulle_part"
+        scenes[1]["next_chapter"] = "c9"
+        codes = _codes(story)
+        assert {"dangling_next_scene", "dangling_next_chapter"} <= codes
+
+    def test_chapter_without_end_is_an_error(self) -> None:
+        story = _story()
+        story["chapters"][1]["scenes"][0]["is_ending_final"] = False
+        assert "chapter_without_end" in _codes(story)
+
+    def test_ending_needing_an_unset_flag_is_an_error(self) -> None:
+        story = _story(
+            endings={"ending_a": {"unlock_condition": {"flags": ["jamais"]}}}
+        )
+        assert "unreachable_ending" in _codes(story)
+
+    def test_unreachable_scene_is_a_warning(self) -> None:
+        story = _story()
+        story["chapters"][1]["scenes"].append({"id": "orpheline"})
+        issues = validate_story(story, compile_story(story))
+        orphan = [i for i in issues if i.code == "unreachable_scene"]
+        assert len(orphan) == 1 and orphan[0].severity == "warning"
+
+
+class TestCompiledCache:
+    def test_cache_is_reused_when_source_is_unchanged(
+        self, tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+    ) -> None:
+        story_path = _write_story(tmp_path / "story.json", _story())
+        cache_path = str(tmp_path / "story.pickle")
+        with open(story_path, "rb") as f:
+            write_compiled_story(compile_story_source(f.read()), cache_path)
+
+        def _fail(raw: bytes) -> Any:
+            raise AssertionError("story recompiled despite a valid cache")
+
+        monkeypatch.setattr(story_compiler, "compile_story_source", _fail)
+        compiled = load_compiled_story(story_path, cache_path)
+        assert set(compiled.graph.scenes) == {"a", "b", "z"}
+
+    def test_cache_is_ignored_when_source_changes(self, tmp_path: Path) -> None:
+        story_path = tmp_path / "story.json"
+        cache_path = str(tmp_path / "story.pickle")
+        _write_story(story_path, _story())
+        write_compiled_story(compile_story_source(story_path.read_bytes()), cache_path)
+
+        story = _story()
+        story["chapters"][1]["scenes"][0]["id"] = "omega"
+        _write_story(story_path, story)
+        compiled = load_compiled_story(str(story_path), cache_path)
+        assert "omega" in compiled.graph.scenes
+
+    def test_corrupt_cache_falls_back_to_json(self, tmp_path: Path) -> None:
+        story_path = _write_story(tmp_path / "story.json", _story())
+        cache_path = tmp_path / "story.pickle"
+        cache_path.write_bytes(b"not a pickle")
+        compiled = load_compiled_story(story_path, str(cache_path))
+        assert "a" in compiled.graph.scenes
+
+    def test_cache_round_trips_the_compiled_story(self, tmp_path: Path) -> None:
+        story_path = _write_story(tmp_path / "story.json", _story())
+        cache_path = str(tmp_path / "story.pickle")
+        with open(story_path, "rb") as f:
+            compiled = compile_story_source(f.read())
+        write_compiled_story(compiled, cache_path)
+        assert load_compiled_story(story_path, cache_path) == compiled
+
+    def test_body_is_not_decoded_when_header_does_not_match(
+        self, tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+    ) -> None:
+        story_path = _write_story(tmp_path / "story.json", _story())
+        cache_path = str(tmp_path / "story.pickle")
+        write_compiled_story(compile_story_source(b"{}"), cache_path)
+
+        def _fail(*args: Any, **kwargs: Any) -> Any:
+            raise AssertionError("cache body decoded before its key was checked")
+
+        monkeypatch.setattr(story_compiler._GraphUnpickler, "load", _fail)
+        compiled = load_compiled_story(story_path, cache_path)
+        assert "a" in compiled.graph.scenes
+
+    def test_forged_cache_cannot_call_arbitrary_code(self, tmp_path: Path) -> None:
+        story_path = _write_story(tmp_path / "story.json", _story())
+        marker = tmp_path / "executed"
+
+        class _Payload:
+            def __reduce__(self) -> Any:
+                return (Path.touch, (marker,))
+
+        # En-tête valide (clé de story.json), corps pickle malveillant.
+        raw = Path(story_path).read_bytes()
+        header = story_compiler._cache_header(hashlib.sha256(raw).hexdigest())
+        cache_path = tmp_path / "story.pickle"
+        cache_path.write_bytes(header + pickle.dumps(_Payload()))
+
+        compiled = load_compiled_story(story_path, str(cache_path))
+        assert not marker.exists()
+        assert "a" in compiled.graph.scenes
+
+    def test_engine_loads_from_compiled_story(self) -> None:
+        compiled = load_compiled_story(STORY_PATH, cache_path=None)
+        engine = StoryEngine(compiled)
+        assert engine.source_hash == compiled.source_hash
+        assert engine.get_story_graph() is compiled.graph
+
+
+class TestCompileCommand:
+    def test_build_writes_cache(self, tmp_path: Path) -> None:
+        output = tmp_path / "story.pickle"
+        assert main(["--output", str(output)]) == 0
+        assert output.exists()
+        cached = load_compiled_story(STORY_PATH, str(output))
+        assert (
+            cached.source_hash
+            == compile_story_source(Path(STORY_PATH).read_bytes()).source_hash
+        )
+
+    def test_invalid_story_fails_without_writing(self, tmp_path: Path) -> None:
+        story = _story(
+            endings={"ending_a": {"unlock_condition": {"flags": ["jamais"]}}}
+        )
+        story_path = _write_story(tmp_path / "story.json", story)
+        output = tmp_path / "story.pickle"
+        assert main(["--story", story_path, "--output", str(output)]) == 1
+        assert not output.exists()
+
+    def test_strict_mode_fails_on_warnings(self, tmp_path: Path) -> None:
+        story = _story()
+        story["chapters"][1]["scenes"].append({"id": "orpheline"})
+        story_path = _write_story(tmp_path / "story.json", story)
+        assert main(["--story", story_path, "--check"]) == 0
+        assert main(["--story", story_path, "--check", "--strict"]) == 1
+
+    def test_check_fails_on_an_uninterned_story_id(
+        self, tmp_path: Path, capsys: pytest.CaptureFixture[str]
+    ) -> None:
+        story = _story()
+        story["chapters"][0]["scenes"][0]["choices"][0]["flags"].append("tout_neuf")
+        story_path = _write_story(tmp_path / "story.json", story)
+        assert main(["--story", story_path, "--check"]) == 1
+        assert "[uninterned_id] tout_neuf" in capsys.readouterr().err
@@ -6,21 +6,44 @@ et la cohérence du score de confiance.
 
 # pyright: reportPrivateUsage=false
 
+import copy
+import functools
 import json
 import os
+import shutil
 import statistics
 import sys
+import time
 from typing import Any, Optional, cast
 
 import pytest
 
 sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
 
-from core.story_engine import StoryEngine
+from core.story_compiler import InvalidStoryError, load_compiled_story
+from core.story_engine import (
+    ENDING_NAMES,
+    SECRET_RULES,
+    STORY_PATH,
+    StoryEngine,
+    StoryEngineRegistry,
+)
+from core.story_graph import compile_story, parse_dialogue
 
 PlayerState = dict[str, Any]
 
 
+@functools.lru_cache(maxsize=1)
+def _raw_scenes() -> dict[str, dict[str, Any]]:
+    """Scènes brutes de story.json, telles que le compilateur les a lues."""
+    story = load_compiled_story(STORY_PATH, cache_path=None).story
+    return {
+        scene["id"]: scene
+        for chapter in story["chapters"]
+        for scene in chapter["scenes"]
+    }
+
+
 @pytest.fixture
 def engine() -> StoryEngine:
     return StoryEngine()
@@ -176,26 +199,22 @@ class TestApplyChoice:
     def test_choice_with_malformed_numeric_values_does_not_crash(
         self, engine: StoryEngine
     ) -> None:
+        story = copy.deepcopy(engine._story)
+        scene = next(
+            s for c in story["chapters"] for s in c["scenes"] if s["id"] == "s0_0"
+        )
+        target = cast(list[dict[str, Any]], scene["choices"])[0]
+        target["trust_delta"] = "not-an-int"
+        target["xp"] = {"bad": "value"}
+        target["flags"] = "not-a-list"
+        engine._graph = compile_story(story)
+
         state = engine.new_player_state()
-        scene = engine._scenes_index["s0_0"]
-        choices = cast(list[dict[str, Any]], scene["choices"])
-        target = choices[0]
-        old_trust = target.get("trust_delta")
-        old_xp = target.get("xp")
-        old_flags = target.get("flags")
-        try:
-            target["trust_delta"] = "not-an-int"
-            target["xp"] = {"bad": "value"}
-            target["flags"] = "not-a-list"
-            result = engine.apply_choice(state, "s0_0", str(target["id"]))
-            assert result["success"] is True
-            assert isinstance(result["trust_delta"], int)
-            assert isinstance(result["xp_gained"], int)
-            assert isinstance(result["flags_added"], list)
-        finally:
-            target["trust_delta"] = old_trust
-            target["xp"] = old_xp
-            target["flags"] = old_flags
+        result = engine.apply_choice(state, "s0_0", str(target["id"]))
+        assert result["success"] is True
+        assert result["trust_delta"] == 0
+        assert result["xp_gained"] == 0
+        assert result["flags_added"] == []
 
 
 class TestAdvanceChapter:
@@ -240,6 +259,272 @@ class TestAdvanceChapter:
             assert "chapitre_0" in state["chapters_completed"]
 
 
+class TestStoryGraph:
+    def test_every_raw_scene_is_compiled(self, engine: StoryEngine) -> None:
+        graph = engine.get_story_graph()
+        story = load_compiled_story(STORY_PATH, cache_path=None).story
+        assert set(graph.scenes) == set(_raw_scenes())
+        assert set(graph.chapters) == {c["id"] for c in story["chapters"]}
+
+    def test_scene_position_matches_chapter_order(self, engine: StoryEngine) -> None:
+        graph = engine.get_story_graph()
+        for chapter in graph.chapters.values():
+            for index, scene_id in enumerate(chapter.scene_ids, start=1):
+                position = engine.get_scene_position(scene_id)
+                assert position == (chapter.id, index, len(chapter.scene_ids))
+                assert graph.scenes[scene_id].position is position
+
+    def test_unknown_scene_has_no_position(self, engine: StoryEngine) -> None:
+        assert engine.get_scene_position("scene_inexistante") is None
+
+    def test_get_state_uses_precomputed_position(self, engine: StoryEngine) -> None:
+        state = engine.new_player_state()
+        state["current_chapter"] = "chapitre_6"
+        state["current_scene"] = "s6_3"
+        position = engine.get_scene_position("s6_3")
+        assert position is not None
+        current = engine.get_state(state)
+        assert (current["scene_index"], current["scene_total"]) == (
+            position.scene_index,
+            position.scene_total,
+        )
+
+    def test_choice_references_are_resolved(self, engine: StoryEngine) -> None:
+        graph = engine.get_story_graph()
+        choice = graph.scenes["s0_0"].choices[0]
+        assert graph.scenes["s0_0"].choices_by_id[choice.id] is choice
+        assert choice.next_scene in graph.scenes
+        assert choice.next_chapter == graph.positions[choice.next_scene].chapter_id
+        assert isinstance(choice.flags, tuple)
+
+    def test_compiled_objects_are_immutable(self, engine: StoryEngine) -> None:
+        scene = engine.get_story_graph().scenes["s0_0"]
+        with pytest.raises(AttributeError):
+            scene.dialogue = "modifié"  # type: ignore[misc]
+
+    def test_defaults_are_applied_at_compile_time(self) -> None:
+        graph = compile_story(
+            {
+                "chapters": [
+                    {
+                        "id": "c",
+                        "title": "C",
+                        "scenes": [
+                            {
+                                "id": "s",
+                                "next_chapter": "absent",
+                                "choices": [{"id": "x", "next_scene": "ailleurs"}],
+                            }
+                        ],
+                    }
+                ]
+            }
+        )
+        scene = graph.scenes["s"]
+        assert scene.luna_emotion == "neutre"
+        assert graph.chapters["c"].atmosphere == "dark"
+        assert scene.next_chapter_title == ""
+        assert scene.choices[0].next_chapter is None
+        assert graph.total_chapters == 7
+
+
+class TestDialogueTemplates:
+    @pytest.mark.parametrize("name", ["", "Ada"])
+    def test_template_matches_plain_substitution(
+        self, engine: StoryEngine, name: str
+    ) -> None:
+        for scene in engine.get_story_graph().scenes.values():
+            expected = scene.dialogue.replace("{name}", name).replace(
+                "{{joueur}}", name or "joueur"
+            )
+            assert scene.dialogue_template.render(name) == expected
+
+    def test_parse_dialogue_splits_slots(self) -> None:
+        template = parse_dialogue("Salut {name}, {{joueur}}.")
+        assert template.chunks == ("Salut ", ", ", ".")
+        assert template.render("") == "Salut , joueur."
+        assert template.render("Ada") == "Salut Ada, Ada."
+
+    @pytest.mark.parametrize(
+        "previous", [["ending_a"], ["ending_a", "ending_b"], ["ending_c", "x", 3]]
+    )
+    def test_memory_is_inserted_before_the_last_lines(
+        self, engine: StoryEngine, previous: list[Any]
+    ) -> None:
+        state = engine.new_player_state()
+        state["player_name"] = "Ada"
+        state["previous_endings"] = previous
+        dialogue = str(engine.get_state(state)["dialogue"])
+
+        raw = engine.get_story_graph().scenes["s0_0"].dialogue
+        lines = raw.replace("{{joueur}}", "Ada").rstrip().split("\n")
+        known = [e for e in previous if e in ENDING_NAMES]
+        memory = engine._memory_line(known, "Ada")
+        lines.insert(max(len(lines) - 2, 1), str(memory))
+        assert dialogue == "\n".join(lines)
+
+    def test_opening_dialogues_are_cached(self, engine: StoryEngine) -> None:
+        state = engine.new_player_state()
+        state["previous_endings"] = ["ending_b"]
+        first = engine.get_state(state)["dialogue"]
+        hits_before = engine._render_opening.cache_info().hits
+        assert engine.get_state(state)["dialogue"] == first
+        assert engine._render_opening.cache_info().hits == hits_before + 1
+
+
+class TestStateJson:
+    def test_encoded_state_matches_get_state(self, engine: StoryEngine) -> None:
+        state = engine.new_player_state()
+        state["player_name"] = "Ada"
+        engine.apply_choice(state, "s0_0", "c0_0_a")
+        encoded = json.loads(engine.get_state_json(state, {"version": 4}))
+        assert encoded == {**engine.get_state(state), "version": 4}
+
+    def test_scene_fragment_is_encoded_once(self, engine: StoryEngine) -> None:
+        first = engine.new_player_state()
+        second = engine.new_player_state()
+        second["xp"] = 120
+        engine.get_state_json(first)
+        misses = engine._scene_fragment.cache_info().misses
+        payload = json.loads(engine.get_state_json(second))
+        assert engine._scene_fragment.cache_info().misses == misses
+        assert payload["xp"] == 120
+
+    def test_unknown_scene_is_still_encoded(self, engine: StoryEngine) -> None:
+        state = engine.new_player_state()
+        state["current_scene"] = "scene_inexistante"
+        payload = json.loads(engine.get_state_json(state, {"version": 1}))
+        assert payload["error"] == "Scène introuvable"
+        assert payload["version"] == 1
+
+
+class TestFlagIndex:
+    def test_flags_get_distinct_bits(self, engine: StoryEngine) -> None:
+        bits = engine.get_story_graph().flag_bits
+        assert len(set(bits.values())) == len(bits)
+        assert all(bit & (bit - 1) == 0 for bit in bits.values())
+
+    def test_masks_match_flag_lists(self, engine: StoryEngine) -> None:
+        graph = engine.get_story_graph()
+        bits = graph.flag_bits
+        for scene in graph.scenes.values():
+            for choice in scene.choices:
+                assert choice.flags_mask == sum({bits[f] for f in choice.flags})
+        for ending in graph.endings:
+            assert ending.required_mask == sum({bits[f] for f in ending.required_flags})
+
+    def test_flag_points_to_the_secrets_it_can_unlock(
+        self, engine: StoryEngine
+    ) -> None:
+        indexed = {
+            flag: {SECRET_RULES[i].id for i in rules}
+            for flag, rules in engine._secrets_by_flag.items()
+        }
+        assert indexed["nexus_helped"] == {"double-agent"}
+        assert "ending_a_path" not in indexed
+
+    def test_secret_is_checked_when_one_of_its_flags_is_added(
+        self, engine: StoryEngine
+    ) -> None:
+        state = engine.new_player_state()
+        state["flags"] = ["listened_to_corp"]
+        state["current_chapter"] = "chapitre_6"
+        result = engine.apply_choice(state, "s6_1d", "c6_1d_a")
+        assert "double-agent" in result["secrets_unlocked"]
+
+    def test_unrelated_choice_does_not_recheck_flag_secrets(
+        self, engine: StoryEngine
+    ) -> None:
+        state = engine.new_player_state()
+        state["flags"] = ["listened_to_corp", "nexus_helped"]
+        result = engine.apply_choice(state, "s0_0", "c0_0_b")
+        assert "double-agent" not in result["secrets_unlocked"]
+
+    def test_ending_unlocks_from_mask(self, engine: StoryEngine) -> None:
+        ending = engine.get_story_graph().endings[0]
+        state = engine.new_player_state()
+        state["flags"] = list(ending.required_flags)
+        state["luna_trust"] = max(ending.min_trust, 0)
+        engine._check_endings(state)
+        assert ending.id in state["endings_unlocked"]
+
+        state = engine.new_player_state()
+        state["flags"] = list(ending.required_flags[:-1])
+        state["luna_trust"] = 100
+        engine._check_endings(state)
+        if ending.required_flags:
+            assert ending.id not in state["endings_unlocked"]
+
+
+class TestStoryEngineRegistry:
+    @staticmethod
+    def _copy_story(tmp_path: Any) -> Any:
+        path = tmp_path / "story.json"
+        shutil.copyfile(STORY_PATH, path)
+        return path
+
+    @staticmethod
+    def _rewrite(path: Any, mutate: Any) -> None:
+        story = json.loads(path.read_text(encoding="utf-8"))
+        mutate(story)
+        path.write_text(json.dumps(story), encoding="utf-8")
+        # mtime_ns peut ne pas bouger sur un système de fichiers grossier.
+        os.utime(path, ns=(time.time_ns(), time.time_ns() + 1_000_000_000))
+
+    @staticmethod
+    def _rename_first_chapter(story: dict[str, Any]) -> None:
+        story["chapters"][0]["title"] = "Titre modifié"
+
+    def test_change_is_picked_up_in_background(self, tmp_path: Any) -> None:
+        path = self._copy_story(tmp_path)
+        registry = StoryEngineRegistry(str(path), poll_interval=0.01)
+        before = registry.current()
+        self._rewrite(path, self._rename_first_chapter)
+
+        deadline = time.monotonic() + 5
+        while registry.version < 2 and time.monotonic() < deadline:
+            time.sleep(0.02)
+            registry.current()
+        after = registry.current()
+        assert after is not before
+        assert after.get_chapter_info("chapitre_0")["title"] == "Titre modifié"  # type: ignore[index]
+        # Le moteur déjà obtenu (requête en cours) n'est pas modifié.
+        assert before.get_chapter_info("chapitre_0")["title"] != "Titre modifié"  # type: ignore[index]
+
+    def test_invalid_story_is_not_swapped_in(self, tmp_path: Any) -> None:
+        path = self._copy_story(tmp_path)
+        registry = StoryEngineRegistry(str(path), poll_interval=0)
+        before = registry.current()
+
+        def _break(story: dict[str, Any]) -> None:
+            story["chapters"][0]["scenes"][0]["choices"][0]["next_scene"] = "absente"
+
+        self._rewrite(path, _break)
+        registry.reload()
+        assert registry.current() is before
+        assert registry.stats()["reload_errors"] == 1
+
+    def test_invalid_story_is_refused_at_first_load(self, tmp_path: Any) -> None:
+        path = self._copy_story(tmp_path)
+
+        def _break(story: dict[str, Any]) -> None:
+            story["chapters"][0]["scenes"][0]["choices"][0]["next_scene"] = "absente"
+
+        self._rewrite(path, _break)
+        registry = StoryEngineRegistry(str(path), poll_interval=0)
+        with pytest.raises(InvalidStoryError, match="absente"):
+            registry.current()
+
+    def test_touch_without_change_keeps_engine(self, tmp_path: Any) -> None:
+        path = self._copy_story(tmp_path)
+        registry = StoryEngineRegistry(str(path), poll_interval=0)
+        before = registry.current()
+        os.utime(path, ns=(time.time_ns(), time.time_ns() + 1_000_000_000))
+        registry.reload()
+        assert registry.current() is before
+        assert registry.version == 1
+
+
 # ─────────────────────────────────────────────
 # Tests des 3 chemins narratifs (fins)
 # ─────────────────────────────────────────────
@@ -283,7 +568,7 @@ def _simulate_run_core(
             scene_id = str(current["scene_id"])
             scene_visits[scene_id] = scene_visits.get(scene_id, 0) + 1
 
-            raw_scene = engine._scenes_index[scene_id]
+            raw_scene = _raw_scenes()[scene_id]
             raw_choices = cast(list[dict[str, Any]], raw_scene.get("choices", []))
             ordered_raw_choices = [
                 c
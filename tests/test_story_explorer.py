@@ -0,0 +1,101 @@
+"""
+Tests de l'exploration de l'espace d'états de l'histoire.
+"""
+
+import json
+import random
+from typing import Any
+
+import pytest
+
+from core.story_compiler import compile_story_source
+from core.story_engine import SECRET_RULES, StoryEngine
+from core.story_explorer import explore, main
+from core.story_simulator import play
+
+
+def _engine(story: dict[str, Any]) -> StoryEngine:
+    return StoryEngine(compile_story_source(json.dumps(story).encode()))
+
+
+def _story() -> dict[str, Any]:
+    return {
+        "chapters": [
+            {
+                "id": "chapitre_0",
+                "scenes": [
+                    {
+                        "id": "s0_0",
+                        "choices": [
+                            {
+                                "id": "x",
+                                "next_scene": "b",
+                                "trust_delta": 20,
+                                "flags": ["f"],
+                            },
+                            {"id": "y", "next_scene": "b", "trust_delta": -10},
+                        ],
+                    },
+                    {"id": "b", "is_chapter_end": True, "next_chapter": "fin"},
+                ],
+            },
+            {"id": "fin", "scenes": [{"id": "z", "is_ending_final": True}]},
+        ],
+        "endings": {"e": {"unlock_condition": {"flags": ["f"], "min_trust": 60}}},
+    }
+
+
+@pytest.fixture(scope="module")
+def report() -> Any:
+    return explore(StoryEngine())
+
+
+class TestExploreShippedStory:
+    def test_every_ending_and_secret_is_reachable(self, report: Any) -> None:
+        assert report.unreachable_endings == ()
+        assert report.unreachable_secrets == ()
+        assert set(report.secrets) == {rule.id for rule in SECRET_RULES}
+
+    def test_trust_thresholds_bound_the_ranges(self, report: Any) -> None:
+        assert report.secrets["perfect-trust"][0] >= 95
+        engine = StoryEngine()
+        for ending in engine.get_story_graph().endings:
+            low, high = report.endings_unlocked[ending.id]
+            assert ending.min_trust <= low <= high <= 100
+
+    def test_random_playthroughs_stay_within_reported_ranges(self, report: Any) -> None:
+        engine = StoryEngine()
+        rng = random.Random(7)
+        for _ in range(150):
+            played = play(engine, rng=rng, render=False)
+            low, high = report.final_scenes[played.ending]
+            assert low <= int(played.state["luna_trust"]) <= high
+
+    def test_state_space_stays_small(self, report: Any) -> None:
+        assert report.states < 5_000
+
+
+class TestExploreSyntheticStory:
+    def test_ranges_follow_each_branch(self) -> None:
+        result = explore(_engine(_story()))
+        assert result.endings_unlocked == {"e": (70, 70)}
+        assert result.final_scenes == {"fin": (40, 70)}
+
+    def test_trust_below_threshold_makes_ending_unreachable(self) -> None:
+        story = _story()
+        story["endings"]["e"]["unlock_condition"]["min_trust"] = 80
+        result = explore(_engine(story))
+        assert result.unreachable_endings == ("e",)
+
+    def test_state_budget_is_enforced(self) -> None:
+        with pytest.raises(RuntimeError):
+            explore(_engine(_story()), max_states=1)
+
+
+class TestExploreCommand:
+    def test_strict_mode_passes_on_shipped_story(
+        self, capsys: pytest.CaptureFixture[str]
+    ) -> None:
+        assert main(["--strict"]) == 0
+        output = json.loads(capsys.readouterr().out)
+        assert output["unreachable_endings"] == []
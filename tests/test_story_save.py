@@ -3,6 +3,7 @@ Tests de robustesse de la couche de sauvegarde SQLite.
 """
 
 import sqlite3
+import threading
 from typing import Any
 from unittest.mock import patch
 
@@ -120,6 +121,8 @@ class TestStorySaveRobustness:
                 ),
             )
             conn.commit()
+        # Lignes brutes : colonnes du classement matérialisées par la migration.
+        story_save.init_db()
 
         board = story_save.get_leaderboard(limit=10)
         assert len(board) == 1
@@ -147,6 +150,8 @@ class TestStorySaveRobustness:
                     ),
                 )
             conn.commit()
+        # Lignes brutes : colonnes du classement matérialisées par la migration.
+        story_save.init_db()
 
         board = story_save.get_leaderboard(limit=5)
         assert len(board) == 5
@@ -175,6 +180,8 @@ class TestStorySaveRobustness:
                 ),
             )
             conn.commit()
+        # Lignes brutes : colonnes du classement matérialisées par la migration.
+        story_save.init_db()
 
         board = story_save.get_leaderboard(limit=10)
         assert len(board) == 2
@@ -199,6 +206,8 @@ class TestStorySaveRobustness:
                     ),
                 )
             conn.commit()
+        # Lignes brutes : colonnes du classement matérialisées par la migration.
+        story_save.init_db()
 
         board = story_save.get_leaderboard(limit=10)
         assert len(board) == 10
@@ -231,3 +240,224 @@ class TestStorySaveRobustness:
         assert summary["luna_trust"] == 80
         assert summary["xp"] == 120
         assert summary["flags"] == ["ok"]
+
+
+class TestConnectionPool:
+    def test_connection_is_reused_across_operations(self, tmp_path: Any) -> None:
+        _point_db_to_temp(tmp_path)
+        before = story_save.get_pool_stats()
+        story_save.save_state("pool-player", {"current_scene": "s0_0"})
+        story_save.load_state("pool-player")
+        story_save.load_state("pool-player")
+        after = story_save.get_pool_stats()
+        assert after["opened"] - before["opened"] <= 1
+        assert after["reused"] - before["reused"] >= 2
+        assert after["size"] >= 1
+
+    def test_pool_reopens_connection_when_db_path_changes(self, tmp_path: Any) -> None:
+        _point_db_to_temp(tmp_path / "first")
+        story_save.save_state("pool-a", {"current_scene": "s0_0"})
+        _point_db_to_temp(tmp_path / "second")
+        assert story_save.load_state("pool-a") is None
+        story_save.save_state("pool-b", {"current_scene": "s0_1"})
+        loaded = story_save.load_state("pool-b")
+        assert loaded is not None
+        assert loaded["current_scene"] == "s0_1"
+
+    def test_each_thread_gets_its_own_connection(self, tmp_path: Any) -> None:
+        _point_db_to_temp(tmp_path)
+        seen: list[int] = []
+
+        def worker() -> None:
+            with story_save._get_conn() as conn:
+                seen.append(id(conn))
+
+        threads = [threading.Thread(target=worker) for _ in range(3)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert len(set(seen)) == 3
+
+    def test_pool_is_reset_in_forked_child(self, tmp_path: Any) -> None:
+        _point_db_to_temp(tmp_path)
+        story_save.load_state("fork-player")
+        inherited = list(story_save._POOL._connections.values())
+        assert inherited
+        story_save._POOL._reset_process_state()
+        for pooled in inherited:
+            pooled.conn.close()
+        stats = story_save.get_pool_stats()
+        assert stats["size"] == 0
+        assert stats["opened"] == 0
+        assert story_save.load_state("fork-player") is None
+
+
+class TestStorageProfile:
+    def test_init_db_enables_wal_by_default(self, tmp_path: Any) -> None:
+        _point_db_to_temp(tmp_path)
+        with sqlite3.connect(story_save.DB_PATH) as conn:
+            mode = conn.execute("PRAGMA journal_mode").fetchone()[0]
+        assert str(mode).lower() == "wal"
+
+    def test_pooled_connection_applies_profile_pragmas(self, tmp_path: Any) -> None:
+        _point_db_to_temp(tmp_path)
+        with story_save._get_conn() as conn:
+            synchronous = conn.execute("PRAGMA synchronous").fetchone()[0]
+            busy_timeout = conn.execute("PRAGMA busy_timeout").fetchone()[0]
+        assert synchronous == 1  # NORMAL
+        assert busy_timeout == story_save.STORAGE_PROFILE.busy_timeout_ms
+
+    def test_load_storage_profile_reads_env_overrides(self) -> None:
+        profile = story_save.load_storage_profile(
+            {
+                "STORY_DB_PROFILE": "legacy",
+                "STORY_DB_BUSY_TIMEOUT_MS": "1500",
+                "STORY_DB_SYNCHRONOUS": "normal",
+            }
+        )
+        assert profile.name == "legacy"
+        assert profile.journal_mode == "DELETE"
+        assert profile.synchronous == "NORMAL"
+        assert profile.busy_timeout_ms == 1500
+
+    def test_load_storage_profile_ignores_invalid_values(self) -> None:
+        profile = story_save.load_storage_profile(
+            {
+                "STORY_DB_PROFILE": "inconnu",
+                "STORY_DB_JOURNAL_MODE": "WAL; DROP TABLE story_saves",
+                "STORY_DB_MMAP_SIZE_BYTES": "beaucoup",
+            }
+        )
+        default = story_save.STORAGE_PROFILES["production"]
+        assert profile.journal_mode == default.journal_mode
+        assert profile.mmap_size_bytes == default.mmap_size_bytes
+
+
+class TestMaterializedLeaderboard:
+    def test_save_state_materializes_leaderboard_columns(self, tmp_path: Any) -> None:
+        _point_db_to_temp(tmp_path)
+        story_save.save_state(
+            "materialized",
+            {
+                "player_name": "Athalia",
+                "xp": 140,
+                "luna_trust": 66,
+                "chapters_completed": ["chapitre_0", "chapitre_1"],
+                "endings_unlocked": ["ending_a"],
+            },
+        )
+        with sqlite3.connect(story_save.DB_PATH) as conn:
+            row = conn.execute(
+                "SELECT xp, luna_trust, chapters_done, endings_json, display_name "
+                "FROM story_saves WHERE player_id = ?",
+                ("materialized",),
+            ).fetchone()
+        assert row == (140, 66, 2, '["ending_a"]', "Ath***")
+
+    def test_init_db_backfills_legacy_rows(self, tmp_path: Any) -> None:
+        story_save.DB_PATH = str(tmp_path / "legacy.db")
+        with sqlite3.connect(story_save.DB_PATH) as conn:
+            conn.execute(
+                "CREATE TABLE story_saves (player_id TEXT PRIMARY KEY, "
+                "state_json TEXT NOT NULL, updated_at TEXT NOT NULL)"
+            )
+            conn.execute(
+                "INSERT INTO story_saves VALUES (?, ?, ?)",
+                (
+                    "legacy-player",
+                    '{"player_name":"Bo","xp":90,"luna_trust":40}',
+                    "2026-01-01T00:00:00+00:00",
+                ),
+            )
+            conn.commit()
+
+        story_save.init_db()
+
+        with sqlite3.connect(story_save.DB_PATH) as conn:
+            row = conn.execute(
+                "SELECT xp, luna_trust, display_name FROM story_saves"
+            ).fetchone()
+        assert row == (90, 40, "Bo***")
+        board = story_save.get_leaderboard(limit=10)
+        assert [entry["name"] for entry in board] == ["Bo***"]
+
+    def test_leaderboard_read_does_not_backfill(self, tmp_path: Any) -> None:
+        _point_db_to_temp(tmp_path)
+        with sqlite3.connect(story_save.DB_PATH) as conn:
+            conn.execute(
+                "INSERT INTO story_saves (player_id, state_json, updated_at) "
+                "VALUES (?, ?, ?)",
+                ("late-row", '{"xp":70}', "2026-01-01T00:00:00+00:00"),
+            )
+            conn.commit()
+
+        assert story_save.get_leaderboard(limit=10) == []
+
+        with sqlite3.connect(story_save.DB_PATH) as conn:
+            row = conn.execute(
+                "SELECT xp FROM story_saves WHERE player_id = ?", ("late-row",)
+            ).fetchone()
+        assert row == (None,)
+
+    def test_leaderboard_query_uses_index(self, tmp_path: Any) -> None:
+        _point_db_to_temp(tmp_path)
+        with sqlite3.connect(story_save.DB_PATH) as conn:
+            plan = conn.execute(
+                "EXPLAIN QUERY PLAN SELECT display_name FROM story_saves "
+                "WHERE xp <> 0 ORDER BY xp DESC, luna_trust DESC, updated_at DESC "
+                "LIMIT 10"
+            ).fetchall()
+        details = " ".join(str(row[-1]) for row in plan)
+        assert "idx_story_saves_leaderboard" in details
+        assert "TEMP B-TREE" not in details
+
+
+class TestLeaderboardCache:
+    def _seed(self, count: int) -> None:
+        for idx in range(count):
+            story_save.save_state(
+                f"cache-{idx}",
+                {"player_name": f"P{idx}", "xp": 100 + idx, "luna_trust": 50},
+            )
+
+    def test_snapshot_is_reused_until_invalidated(self, tmp_path: Any) -> None:
+        _point_db_to_temp(tmp_path)
+        story_save._LEADERBOARD_CACHE.invalidate()
+        self._seed(3)
+        first = story_save.get_leaderboard_snapshot(limit=2)
+        second = story_save.get_leaderboard_snapshot(limit=2)
+        assert second is first
+        assert [entry["xp"] for entry in first.scores] == [102, 101]
+
+    def test_save_entering_top_n_invalidates_snapshot(self, tmp_path: Any) -> None:
+        _point_db_to_temp(tmp_path)
+        story_save._LEADERBOARD_CACHE.invalidate()
+        self._seed(3)
+        first = story_save.get_leaderboard_snapshot(limit=2)
+        story_save.save_state(
+            "newcomer", {"player_name": "Nova", "xp": 500, "luna_trust": 50}
+        )
+        second = story_save.get_leaderboard_snapshot(limit=2)
+        assert second.etag != first.etag
+        assert second.scores[0]["xp"] == 500
+
+    def test_save_below_cutoff_keeps_snapshot(self, tmp_path: Any) -> None:
+        _point_db_to_temp(tmp_path)
+        story_save._LEADERBOARD_CACHE.invalidate()
+        self._seed(3)
+        first = story_save.get_leaderboard_snapshot(limit=2)
+        story_save.save_state(
+            "low-score", {"player_name": "Lowe", "xp": 5, "luna_trust": 50}
+        )
+        assert story_save.get_leaderboard_snapshot(limit=2) is first
+
+    def test_reset_of_ranked_player_invalidates_snapshot(self, tmp_path: Any) -> None:
+        _point_db_to_temp(tmp_path)
+        story_save._LEADERBOARD_CACHE.invalidate()
+        self._seed(3)
+        first = story_save.get_leaderboard_snapshot(limit=2)
+        story_save.delete_state("cache-2")
+        second = story_save.get_leaderboard_snapshot(limit=2)
+        assert [entry["xp"] for entry in second.scores] == [101, 100]
+        assert second.etag != first.etag
@@ -0,0 +1,101 @@
+"""
+Tests du simulateur de parties et benchmarks du moteur narratif.
+
+Les tests ``benchmark`` mesurent le chemin chaud du moteur (transition +
+encodage de l'état) sur des parties complètes :
+
+    python -m pytest tests/test_story_simulator.py --benchmark-only
+"""
+
+import json
+import random
+from collections.abc import Callable
+from typing import Any
+
+import pytest
+
+from core.story_engine import StoryEngine
+from core.story_simulator import (
+    SimulationError,
+    coverage_plans,
+    main,
+    play,
+    run_playthroughs,
+    simulate,
+)
+
+
+@pytest.fixture(scope="module")
+def engine() -> StoryEngine:
+    return StoryEngine()
+
+
+class TestPlaythroughs:
+    def test_random_playthroughs_are_reproducible(self, engine: StoryEngine) -> None:
+        first = play(engine, rng=random.Random(3))
+        second = play(engine, rng=random.Random(3))
+        assert first.state == second.state
+        assert first.ending == second.ending
+
+    def test_coverage_plans_take_every_reachable_choice(
+        self, engine: StoryEngine
+    ) -> None:
+        graph = engine.get_story_graph()
+        taken = {plan[-1] for plan in coverage_plans(graph) if plan}
+        for scene_id, choice_id in taken:
+            scene = graph.scenes[scene_id]
+            assert choice_id is None or choice_id in scene.choices_by_id
+        assert ("s0_0", "c0_0_a") in taken
+
+    def test_coverage_reaches_every_ending(self, engine: StoryEngine) -> None:
+        report = simulate(engine, mode="coverage")
+        assert {"ending_a", "ending_c", "ending_d"} <= set(report.endings)
+        assert report.playthroughs == len(coverage_plans(engine.get_story_graph()))
+        assert sum(report.endings.values()) == report.playthroughs
+
+    def test_desynchronised_prefix_is_reported(self, engine: StoryEngine) -> None:
+        with pytest.raises(SimulationError):
+            play(engine, prefix=[("s6_0", "c6_0_c")])
+
+    def test_unknown_mode_is_rejected(self, engine: StoryEngine) -> None:
+        with pytest.raises(ValueError):
+            simulate(engine, mode="exhaustif")
+
+
+class TestSimulationReport:
+    def test_report_counts_transitions(self, engine: StoryEngine) -> None:
+        report = simulate(engine, runs=20, seed=1)
+        assert report.playthroughs == 20
+        assert report.transitions > 20
+        assert report.transitions_per_second > 0
+        assert report.as_dict()["endings"] == dict(sorted(report.endings.items()))
+
+    def test_command_prints_json_report(
+        self, capsys: pytest.CaptureFixture[str]
+    ) -> None:
+        assert main(["--runs", "5", "--seed", "2"]) == 0
+        report = json.loads(capsys.readouterr().out)
+        assert report["playthroughs"] == 5
+        assert report["mode"] == "random"
+
+
+@pytest.mark.performance
+class TestEngineThroughputBenchmark:
+    @pytest.mark.parametrize("render", [True, False], ids=["rendered", "engine"])
+    def test_random_playthroughs(
+        self, benchmark: Callable[..., Any], engine: StoryEngine, render: bool
+    ) -> None:
+        def _run() -> tuple[int, int, Any]:
+            return run_playthroughs(engine, [()] * 20, random.Random(0), render)
+
+        playthroughs, transitions, _ = benchmark(_run)
+        assert playthroughs == 20
+        benchmark.extra_info["transitions"] = transitions
+
+    def test_coverage_playthroughs(
+        self, benchmark: Callable[..., Any], engine: StoryEngine
+    ) -> None:
+        plans = coverage_plans(engine.get_story_graph())
+        playthroughs, transitions, _ = benchmark(run_playthroughs, engine, plans)
+        assert playthroughs == len(plans)
+        benchmark.extra_info["transitions"] = transitions
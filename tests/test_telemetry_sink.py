@@ -0,0 +1,94 @@
+"""
+Tests de l'écriture asynchrone par lots de la télémétrie.
+"""
+
+import sqlite3
+import threading
+from collections.abc import Sequence
+from typing import Any
+
+from core import story_save
+from core.telemetry_sink import TelemetryRow, TelemetrySink
+
+
+def _row(idx: int) -> TelemetryRow:
+    return (f"player-{idx}", "scene_viewed", "{}", "2026-01-01T00:00:00+00:00")
+
+
+class _RecordingWriter:
+    def __init__(self) -> None:
+        self.batches: list[list[TelemetryRow]] = []
+
+    def __call__(self, rows: Sequence[TelemetryRow]) -> None:
+        self.batches.append(list(rows))
+
+
+class TestTelemetrySink:
+    def test_events_are_written_in_batches(self) -> None:
+        writer = _RecordingWriter()
+        sink = TelemetrySink(writer, batch_size=10, flush_interval_ms=5000)
+        for idx in range(25):
+            assert sink.submit(_row(idx)) is True
+        assert sink.flush() is True
+        sink.close()
+
+        assert sum(len(batch) for batch in writer.batches) == 25
+        assert max(len(batch) for batch in writer.batches) == 10
+        assert len(writer.batches) <= 4
+        assert sink.stats()["written"] == 25
+
+    def test_full_queue_drops_events_without_blocking(self) -> None:
+        release = threading.Event()
+
+        def slow_writer(rows: Sequence[TelemetryRow]) -> None:
+            release.wait(5)
+
+        sink = TelemetrySink(slow_writer, max_queue=2, batch_size=1)
+        results = [sink.submit(_row(idx)) for idx in range(20)]
+        release.set()
+        sink.close()
+
+        assert results.count(False) > 0
+        assert sink.stats()["dropped"] == results.count(False)
+
+    def test_close_flushes_pending_events(self) -> None:
+        writer = _RecordingWriter()
+        sink = TelemetrySink(writer, batch_size=100, flush_interval_ms=60_000)
+        for idx in range(5):
+            sink.submit(_row(idx))
+        sink.close()
+        assert sum(len(batch) for batch in writer.batches) == 5
+        assert sink.submit(_row(99)) is False
+
+    def test_writer_failure_is_counted_and_thread_survives(self) -> None:
+        calls: dict[str, int] = {"count": 0}
+
+        def flaky_writer(rows: Sequence[TelemetryRow]) -> None:
+            calls["count"] += 1
+            if calls["count"] == 1:
+                raise sqlite3.OperationalError("disk I/O error")
+
+        sink = TelemetrySink(flaky_writer, batch_size=1)
+        sink.submit(_row(1))
+        sink.flush()
+        sink.submit(_row(2))
+        sink.flush()
+        sink.close()
+        stats = sink.stats()
+        assert stats["write_errors"] == 1
+        assert stats["written"] == 1
+
+
+class TestStorySaveTelemetry:
+    def test_log_telemetry_event_is_persisted_after_flush(self, tmp_path: Any) -> None:
+        story_save.flush_telemetry()
+        story_save.DB_PATH = str(tmp_path / "telemetry.db")
+        story_save.init_db()
+        story_save.log_telemetry_event("player-x", "scene_viewed", {"scene_id": "s0"})
+        assert story_save.flush_telemetry() is True
+        with sqlite3.connect(story_save.DB_PATH) as conn:
+            rows = conn.execute(
+                "SELECT player_id, event_type, payload_json FROM story_telemetry"
+            ).fetchall()
+        # Encodage compact du codec partagé (core/json_codec.py).
+        assert rows == [("player-x", "scene_viewed", '{"scene_id":"s0"}')]
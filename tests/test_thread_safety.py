@@ -0,0 +1,137 @@
+"""
+Sûreté entre threads (profil gunicorn gthread) : moteur narratif, limite de
+débit et story_save partagés par plusieurs threads d'un même processus.
+"""
+
+import random
+import runpy
+import threading
+from collections.abc import Callable
+from pathlib import Path
+from typing import Any
+
+import pytest
+
+from core import story_save
+from core.rate_limit import ShardedRateLimiter, SharedMemoryRateLimiter
+from core.state_cache import StateConflictError
+from core.story_engine import StoryEngine
+from core.story_simulator import play
+
+THREADS = 8
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def _run_threads(target: Callable[[int], Any], count: int = THREADS) -> list[Any]:
+    results: list[Any] = [None] * count
+    errors: list[BaseException] = []
+    start = threading.Barrier(count)
+
+    def _worker(index: int) -> None:
+        try:
+            start.wait()
+            results[index] = target(index)
+        except BaseException as exc:  # remonté au thread principal
+            errors.append(exc)
+
+    threads = [threading.Thread(target=_worker, args=(i,)) for i in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(30)
+    assert not errors, errors
+    return results
+
+
+@pytest.fixture
+def temp_db(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(story_save, "DB_PATH", str(tmp_path / "threads.db"))
+    story_save.init_db()
+
+
+class TestSharedEngine:
+    def test_concurrent_playthroughs_match_sequential_ones(self) -> None:
+        engine = StoryEngine()
+
+        def _play(seed: int) -> tuple[Any, str]:
+            played = play(engine, rng=random.Random(seed))
+            return played.state, played.ending
+
+        expected = [_play(seed) for seed in range(THREADS)]
+        assert _run_threads(_play) == expected
+
+
+class TestSharedRateLimiter:
+    @pytest.mark.parametrize("backend", ["memory", "shared"])
+    def test_admits_exactly_the_limit(self, backend: str, tmp_path: Path) -> None:
+        limiter: Any = (
+            ShardedRateLimiter()
+            if backend == "memory"
+            else SharedMemoryRateLimiter(str(tmp_path / "rl"))
+        )
+
+        def _hammer(_: int) -> int:
+            return sum(limiter.hit("10.0.0.1", 1000.0, 60, 500) for _ in range(200))
+
+        assert sum(_run_threads(_hammer)) == 500
+
+
+@pytest.mark.usefixtures("temp_db")
+class TestStorySaveThreads:
+    def test_each_thread_gets_its_own_connection(self) -> None:
+        seen: list[int] = []
+        done = threading.Barrier(THREADS)
+
+        def _use(index: int) -> None:
+            with story_save._get_conn() as conn:
+                seen.append(id(conn))
+            story_save.save_state(f"p{index}", {"xp": index})
+            # Threads vivants jusqu'ici : aucun identifiant de connexion recyclé.
+            done.wait()
+
+        _run_threads(_use)
+        assert len(set(seen)) == THREADS
+        for index in range(THREADS):
+            assert story_save.load_state(f"p{index}") == {"xp": index}
+
+    @pytest.mark.parametrize("write", ["save_state", "stage_state"])
+    def test_compare_and_swap_loses_no_update(self, write: str) -> None:
+        writer = getattr(story_save, write)
+        story_save.save_state("shared", {"xp": 0})
+        increments = 15
+
+        def _increment(_: int) -> int:
+            conflicts = 0
+            for _ in range(increments):
+                while True:
+                    loaded = story_save.load_state_versioned("shared")
+                    assert loaded is not None
+                    state, version = loaded
+                    state["xp"] += 1
+                    try:
+                        writer("shared", state, expected_version=version)
+                        break
+                    except StateConflictError:
+                        conflicts += 1
+            return conflicts
+
+        _run_threads(_increment)
+        story_save.flush_states()
+        story_save._STATE_CACHE.discard("shared")
+        assert story_save.load_state("shared") == {"xp": THREADS * increments}
+
+
+class TestGunicornProfiles:
+    def test_sync_profile_declares_worker_class_once(self) -> None:
+        text = (ROOT / "gunicorn.conf.py").read_text(encoding="utf-8")
+        assert text.count("worker_class =") == 1
+        assert "worker_connections" not in runpy.run_path(
+            str(ROOT / "gunicorn.conf.py")
+        )
+
+    def test_gthread_profile_reuses_base_hooks(self) -> None:
+        config = runpy.run_path(str(ROOT / "gunicorn.gthread.conf.py"))
+        assert config["worker_class"] == "gthread"
+        assert config["threads"] > 1
+        assert callable(config["worker_exit"])
+        assert callable(config["post_worker_init"])